@@ -4,11 +4,13 @@ from plans.base.models import (
     AbstractBillingInfo,
     AbstractInvoice,
     AbstractOrder,
+    AbstractOutboxEmail,
     AbstractPlan,
     AbstractPlanPricing,
     AbstractPlanQuota,
     AbstractPricing,
     AbstractQuota,
+    AbstractQuotaUsage,
     AbstractRecurringUserPlan,
     AbstractUserPlan,
 )
@@ -34,6 +36,11 @@ class Order(DetailFieldMixin, AbstractOrder):
         abstract = False
 
 
+class OutboxEmail(DetailFieldMixin, AbstractOutboxEmail):
+    class Meta(AbstractOutboxEmail.Meta):
+        abstract = False
+
+
 class Plan(AbstractPlan):
     # Test existing fields can be modified
     default = models.BooleanField(
@@ -67,6 +74,11 @@ class Quota(DetailFieldMixin, AbstractQuota):
         abstract = False
 
 
+class QuotaUsage(DetailFieldMixin, AbstractQuotaUsage):
+    class Meta(AbstractQuotaUsage.Meta):
+        abstract = False
+
+
 class RecurringUserPlan(DetailFieldMixin, AbstractRecurringUserPlan):
     class Meta(AbstractRecurringUserPlan.Meta):
         abstract = False
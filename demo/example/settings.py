@@ -69,6 +69,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "plans.middleware.QuotaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -185,7 +186,9 @@ if os.environ.get("SAMPLE_APP", False):
     PLANS_PLANPRICING_MODEL = "sample_plans.PlanPricing"
     PLANS_QUOTA_MODEL = "sample_plans.Quota"
     PLANS_PLANQUOTA_MODEL = "sample_plans.PlanQuota"
+    PLANS_QUOTAUSAGE_MODEL = "sample_plans.QuotaUsage"
     PLANS_ORDER_MODEL = "sample_plans.Order"
+    PLANS_OUTBOXEMAIL_MODEL = "sample_plans.OutboxEmail"
     PLANS_INVOICE_MODEL = "sample_plans.Invoice"
     PLANS_RECURRINGUSERPLAN_MODEL = "sample_plans.RecurringUserPlan"
 
@@ -2,11 +2,13 @@ from copy import deepcopy
 
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef
 from django.http import HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from django.utils.translation import ngettext
 from ordered_model.admin import OrderedModelAdmin
 
 from plans.base.models import (
@@ -23,6 +25,7 @@ from plans.base.models import (
 )
 
 from .forms import PartialCreditNoteForm
+from .paginators import EstimatedCountPaginator
 from .signals import account_automatic_renewal
 
 Invoice = AbstractInvoice.get_concrete_model()
@@ -149,38 +152,64 @@ class BillingInfoAdmin(UserLinkMixin, admin.ModelAdmin):
     exclude = ("user",)
 
 
+def report_processed_orders(modeladmin, request, message, errors):
+    modeladmin.message_user(request, message)
+    for order_id, error in errors.items():
+        modeladmin.message_user(
+            request,
+            _("Order %(order)s could not be processed: %(error)s")
+            % {"order": order_id, "error": error},
+            level="ERROR",
+        )
+
+
 def make_order_completed(modeladmin, request, queryset):
-    for order in queryset:
-        order.complete_order()
+    processed, errors = Order.complete_orders(queryset.values_list("pk", flat=True))
+    message = ngettext(
+        "%(count)d order completed.", "%(count)d orders completed.", len(processed)
+    ) % {"count": len(processed)}
+    report_processed_orders(modeladmin, request, message, errors)
 
 
 make_order_completed.short_description = _("Make selected orders completed")
 
 
 def make_order_returned(modeladmin, request, queryset):
-    for order in queryset:
-        order.return_order()
+    processed, errors = Order.return_orders(queryset.values_list("pk", flat=True))
+    message = ngettext(
+        "%(count)d order returned.", "%(count)d orders returned.", len(processed)
+    ) % {"count": len(processed)}
+    report_processed_orders(modeladmin, request, message, errors)
 
 
 make_order_returned.short_description = _("Make selected orders returned")
 
 
 def make_order_invoice(modeladmin, request, queryset):
-    for order in queryset:
-        if (
-            Invoice.objects.filter(
-                type=Invoice.INVOICE_TYPES["INVOICE"], order=order
-            ).count()
-            == 0
-        ):
-            if not order.completed:
-                modeladmin.message_user(
-                    request,
-                    f"Order {order.id} is has no completed date, cannot create invoice.",
-                    level="ERROR",
-                )
-                continue
-            Invoice.create(order, Invoice.INVOICE_TYPES["INVOICE"])
+    invoices = Invoice.objects.filter(
+        type=Invoice.INVOICE_TYPES["INVOICE"], order=OuterRef("pk")
+    )
+    created = 0
+    for order in queryset.select_related("user").annotate(invoiced=Exists(invoices)):
+        if order.invoiced:
+            continue
+        if not order.completed:
+            modeladmin.message_user(
+                request,
+                f"Order {order.id} is has no completed date, cannot create invoice.",
+                level="ERROR",
+            )
+            continue
+        if Invoice.create(order, Invoice.INVOICE_TYPES["INVOICE"]) is not None:
+            created += 1
+    if created:
+        modeladmin.message_user(
+            request,
+            ngettext(
+                "%(count)d invoice created.", "%(count)d invoices created.", created
+            )
+            % {"count": created},
+        )
 
 
 make_order_invoice.short_description = _("Make invoices for orders")
@@ -438,7 +467,7 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
     list_filter = (
         "active",
         "expire",
-        "plan__name",
+        "plan",
         "plan__available",
         "plan__visible",
         "recurring__renewal_triggered_by",
@@ -458,7 +487,11 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
         "recurring__pricing",
     )
     list_display_links = list_display
-    list_select_related = True
+    list_select_related = ("user", "plan")
+    # Recurring columns are annotated by get_queryset()
+    date_hierarchy = "expire"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ("user_link", "created", "updated_at")
     inlines = (RecurringPlanInline,)
     actions = [
@@ -470,8 +503,21 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
         "plan",
     ]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                recurring_renewal_triggered_by=F("recurring__renewal_triggered_by"),
+                recurring_token_verified=F("recurring__token_verified"),
+                recurring_payment_provider=F("recurring__payment_provider"),
+                recurring_pricing_name=F("recurring__pricing__name"),
+                recurring_pricing_period=F("recurring__pricing__period"),
+            )
+        )
+
     def recurring__renewal_triggered_by(self, obj):
-        return obj.recurring.renewal_triggered_by
+        return obj.recurring_renewal_triggered_by
 
     recurring__renewal_triggered_by.admin_order_field = (
         "recurring__renewal_triggered_by"
@@ -479,20 +525,26 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
     recurring__renewal_triggered_by.short_description = "Renewal triggered by"
 
     def recurring__token_verified(self, obj):
-        return obj.recurring.token_verified
+        return obj.recurring_token_verified
 
     recurring__token_verified.admin_order_field = "recurring__token_verified"
     recurring__token_verified.boolean = True
     recurring__token_verified.short_description = "Renewal token verified"
 
     def recurring__payment_provider(self, obj):
-        return obj.recurring.payment_provider
+        return obj.recurring_payment_provider
 
     recurring__payment_provider.admin_order_field = "recurring__payment_provider"
     recurring__payment_provider.short_description = "Renewal payment_provider"
 
     def recurring__pricing(self, obj):
-        return obj.recurring.pricing
+        if obj.recurring_pricing_name is None:
+            return None
+        return str(
+            Pricing(
+                name=obj.recurring_pricing_name, period=obj.recurring_pricing_period
+            )
+        )
 
     recurring__pricing.admin_order_field = "recurring__pricing"
 
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 from . import conf as app_settings
 
@@ -10,3 +11,12 @@ class PlansConfig(AppConfig):
     def ready(self):
         # noinspection PyUnresolvedReferences
         import plans.listeners  # noqa
+        from plans.validators import get_counter_validators
+
+        for validator in get_counter_validators():
+            validator.connect_counter()
+
+        if getattr(settings, "PLANS_TEDB_WARM_UP", False):
+            from plans.taxation.eu import EUTaxationPolicy
+
+            EUTaxationPolicy.warm_up()
@@ -1,22 +1,24 @@
 from __future__ import unicode_literals
 
+import functools
 import logging
 import re
 import warnings
-from datetime import timedelta
+from datetime import date, timedelta
 from decimal import Decimal
 
 import stdnum.eu.vat
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
 
-from plans import utils
+from plans import catalog, plan_state, utils
 
 try:
     from django.contrib.sites.models import Site
 except RuntimeError:
     Site = None
+from django.core import mail
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.template import Context
 from django.template.base import Template
@@ -27,10 +29,15 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import pgettext_lazy
 from django_countries.fields import CountryField
 from ordered_model.models import OrderedModel
-from sequences import get_next_value
+from sequences import get_next_value, get_next_values
 from swapper import load_model
 
-from plans.contrib import get_user_language, send_template_email
+from plans.contrib import (
+    build_template_email,
+    get_user_language,
+    send_emails,
+    send_template_email,
+)
 from plans.enumeration import Enumeration
 from plans.signals import (
     account_activated,
@@ -45,6 +52,10 @@ from plans.validators import plan_validation
 
 accounts_logger = logging.getLogger("accounts")
 
+# ``AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK``, also used by the
+# partial index of task renewals
+RENEWAL_TRIGGERED_BY_TASK = 3
+
 
 class BaseMixin(models.Model):
     created = models.DateTimeField(
@@ -127,35 +138,31 @@ class AbstractPlan(BaseMixin, OrderedModel):
 
     @classmethod
     def get_default_plan(cls):
-        try:
-            return_value = cls.objects.get(default=True)
-        except cls.DoesNotExist:
-            return_value = None
-        return return_value
+        return catalog.get_default_plan()
 
     @classmethod
     def get_current_plan(cls, user):
         """Get current plan for user. If userplan is expired, get default plan"""
-        if (
-            not user
-            or user.is_anonymous
-            or not hasattr(user, "userplan")
-            or user.userplan.is_expired()
-        ):
+        user_plan = None
+        if user and not user.is_anonymous:
+            user_plan = plan_state.get_plan_state(user)
+        if user_plan is None or user_plan.is_expired():
             default_plan = cls.get_default_plan()
             if default_plan is None or not default_plan.is_free():
                 raise ValidationError(_("User plan has expired"))
             return default_plan
-        return user.userplan.plan
+        return user_plan.plan
 
     def __str__(self):
         return self.name
 
     def get_quota_dict(self):
-        return dict(self.planquota_set.values_list("quota__codename", "value"))
+        return catalog.get_quota_dict(self.pk)
 
     def is_free(self):
-        return self.planpricing_set.count() == 0
+        if self.pk is None:
+            return True
+        return catalog.is_free_plan(self.pk)
 
     is_free.boolean = True
 
@@ -249,6 +256,14 @@ class AbstractUserPlan(BaseMixin, models.Model):
         abstract = True
         verbose_name = _("User plan")
         verbose_name_plural = _("Users plans")
+        indexes = [
+            # Active accounts by expiration, for expire_account() and reminders
+            models.Index(
+                fields=["active", "expire"],
+                name="%(app_label)s_up_act_exp",
+                condition=models.Q(active=True),
+            ),
+        ]
 
     def __str__(self):
         return "%s [%s]" % (self.user, self.plan)
@@ -295,7 +310,7 @@ class AbstractUserPlan(BaseMixin, models.Model):
         """
         if not self.is_active():
             # Plans without pricings don't need to expire
-            if self.expire is None and self.plan.planpricing_set.count():
+            if self.expire is None and not self.plan.is_free():
                 self.expire = now() + timedelta(
                     days=getattr(settings, "PLANS_DEFAULT_GRACE_PERIOD", 30)
                 )
@@ -410,7 +425,7 @@ class AbstractUserPlan(BaseMixin, models.Model):
             # No account activation or extending at this point
             self.plan = plan
 
-            if self.expire is not None and not plan.planpricing_set.count():
+            if self.expire is not None and plan.is_free():
                 # Assume no expiry date for plans without pricing.
                 self.expire = None
 
@@ -619,8 +634,15 @@ class AbstractUserPlan(BaseMixin, models.Model):
             "Account '%s' [id=%d] has expired" % (self.user, self.user.pk)
         )
 
+        send_emails([self.get_expired_account_email()])
+
+        account_expired.send(sender=self, user=self.user)
+
+    def get_expired_account_email(self):
+        """builds account expiration e-mail, None if e-mails are disabled"""
+
         mail_context = {"user": self.user, "userplan": self}
-        send_template_email(
+        return build_template_email(
             [self.user.email],
             "mail/expired_account_title.txt",
             "mail/expired_account_body.txt",
@@ -628,13 +650,16 @@ class AbstractUserPlan(BaseMixin, models.Model):
             get_user_language(self.user),
         )
 
-        account_expired.send(sender=self, user=self.user)
-
     def remind_expire_soon(self):
         """reminds about soon account expiration"""
 
+        send_emails([self.get_remind_expire_email()])
+
+    def get_remind_expire_email(self):
+        """builds soon account expiration e-mail, None if e-mails are disabled"""
+
         mail_context = {"user": self.user, "userplan": self, "days": self.days_left()}
-        send_template_email(
+        return build_template_email(
             [self.user.email],
             "mail/remind_expire_title.txt",
             "mail/remind_expire_body.txt",
@@ -676,7 +701,11 @@ class AbstractRecurringUserPlan(BaseMixin, models.Model):
         [
             (1, "OTHER", pgettext_lazy("Renewal triggered by", "other")),
             (2, "USER", pgettext_lazy("Renewal triggered by", "user")),
-            (3, "TASK", pgettext_lazy("Renewal triggered by", "task")),
+            (
+                RENEWAL_TRIGGERED_BY_TASK,
+                "TASK",
+                pgettext_lazy("Renewal triggered by", "task"),
+            ),
         ]
     )
 
@@ -762,6 +791,22 @@ class AbstractRecurringUserPlan(BaseMixin, models.Model):
 
     class Meta:
         abstract = True
+        indexes = [
+            # Candidates of autorenew_account(), optionally by provider
+            models.Index(
+                fields=["renewal_triggered_by", "token_verified", "payment_provider"],
+                name="%(app_label)s_rup_renew",
+            ),
+            # Accounts renewed by the task with a verified token, by the last
+            # renewal attempt
+            models.Index(
+                fields=["user_plan", "last_renewal_attempt"],
+                name="%(app_label)s_rup_task",
+                condition=models.Q(
+                    renewal_triggered_by=RENEWAL_TRIGGERED_BY_TASK, token_verified=True
+                ),
+            ),
+        ]
 
     # TODO: has_automatic_renewal deprecated. Remove in the next major release.
     @property
@@ -949,6 +994,135 @@ class AbstractPlanQuota(BaseMixin, models.Model):
         verbose_name_plural = _("Plans quotas")
 
 
+class AbstractQuotaUsage(BaseMixin, models.Model):
+    """
+    Number of objects a user has, counted for a quota by a ``ModelCountValidator``
+    with ``use_counter = True`` instead of running ``COUNT(*)`` on every check.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("user"),
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    codename = models.CharField(_("codename"), max_length=50)
+    count = models.BigIntegerField(_("count"), default=0)
+
+    class Meta:
+        abstract = True
+        unique_together = ("user", "codename")
+        verbose_name = _("Quota usage")
+        verbose_name_plural = _("Quota usages")
+
+    def __str__(self):
+        return "%s: %s" % (self.codename, self.count)
+
+    @classmethod
+    def get_count(cls, user_id, codename, count):
+        """
+        Returns the counter value, creates the counter with ``count()`` if it doesn't exist yet.
+        """
+        value = (
+            cls.objects.filter(user_id=user_id, codename=codename)
+            .values_list("count", flat=True)
+            .first()
+        )
+        if value is None:
+            value = count()
+            cls._create(user_id, codename, value)
+        return value
+
+    @classmethod
+    def add(cls, user_id, codename, delta, count):
+        """
+        Atomically adds ``delta`` to the counter. A missing counter is created
+        with ``count()``, which already includes the change. Decrements never
+        create counters: the row may be gone with its user already.
+        """
+        counter = cls.objects.filter(user_id=user_id, codename=codename)
+        updated = counter.update(count=models.F("count") + delta, updated_at=now())
+        if updated or delta < 0:
+            return
+        if not cls._create(user_id, codename, count()):
+            # Created concurrently by a transaction which didn't see our change
+            counter.update(count=models.F("count") + delta, updated_at=now())
+
+    @classmethod
+    def _create(cls, user_id, codename, value):
+        """Creates the counter, returns False if it already exists"""
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, codename=codename, count=value)
+        except IntegrityError:
+            return False
+        return True
+
+
+class AbstractOutboxEmail(BaseMixin, models.Model):
+    """
+    Rendered e-mail waiting in the outbox (``PLANS_EMAIL_OUTBOX``), written in
+    the transaction which sends it and deleted once it is sent.
+    """
+
+    subject = models.TextField(_("subject"))
+    body = models.TextField(_("body"))
+    from_email = models.CharField(_("from e-mail"), max_length=254)
+    to = models.JSONField(_("to"), default=list)
+    cc = models.JSONField(_("cc"), default=list)
+    bcc = models.JSONField(_("bcc"), default=list)
+    reply_to = models.JSONField(_("reply to"), default=list)
+    headers = models.JSONField(_("headers"), default=dict)
+    #: ``[content, mimetype]`` pairs of ``EmailMultiAlternatives``
+    alternatives = models.JSONField(_("alternatives"), default=list)
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    next_attempt = models.DateTimeField(_("next attempt"), default=now, db_index=True)
+    last_error = models.TextField(_("last error"), blank=True)
+
+    class Meta:
+        abstract = True
+        verbose_name = _("Outbox e-mail")
+        verbose_name_plural = _("Outbox e-mails")
+
+    def __str__(self):
+        return "%s: %s" % (", ".join(self.to), self.subject)
+
+    @classmethod
+    def from_message(cls, message):
+        """Returns an unsaved row of ``EmailMessage`` without attachments"""
+        if message.attachments:
+            raise ValueError("E-mails with attachments can't be put to the outbox")
+        return cls(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email,
+            to=list(message.to),
+            cc=list(message.cc),
+            bcc=list(message.bcc),
+            reply_to=list(message.reply_to),
+            headers=message.extra_headers,
+            alternatives=[
+                [content, mimetype]
+                for content, mimetype in getattr(message, "alternatives", [])
+            ],
+        )
+
+    def to_message(self):
+        message = mail.EmailMultiAlternatives(
+            self.subject,
+            self.body,
+            self.from_email,
+            self.to,
+            self.bcc,
+            cc=self.cc,
+            reply_to=self.reply_to,
+            headers=self.headers,
+        )
+        for content, mimetype in self.alternatives:
+            message.attach_alternative(content, mimetype)
+        return message
+
+
 class AbstractOrder(BaseMixin, models.Model):
     """
     Order in this app supports only one item per order. This item is defined by
@@ -1061,6 +1235,8 @@ class AbstractOrder(BaseMixin, models.Model):
     currency = models.CharField(_("currency"), max_length=3, default="EUR")
     status = models.IntegerField(_("status"), choices=STATUS, default=STATUS.NEW)
 
+    ALL_INVOICES_ORDERING = ("issued", "issued_duplicate", "pk")
+
     def __str__(self):
         return _("Order #%(id)d") % {"id": self.id}
 
@@ -1119,33 +1295,40 @@ class AbstractOrder(BaseMixin, models.Model):
             )
             if locked is not None:
                 self.user.userplan.refresh_from_db()
-            # Snapshot the UserPlan state *before* extend_account runs so
-            # return_order can rewind by the exact number of days the
-            # extension added. extend_account/reduce_account are otherwise
-            # asymmetric for plans that were expired (or had expire=None) at
-            # completion time: extend_account jumps expire forward to
-            # ``localdate() + pricing.period`` instead of
-            # ``previous_expire + pricing.period``, while reduce_account
-            # always rewinds by exactly ``pricing.period`` days.
-            self.userplan_expire_before = self.user.userplan.expire
-            self.userplan_active_before = self.user.userplan.active
-            self.userplan_plan_before = self.user.userplan.plan
-            self.plan_extended_from = self.get_plan_extended_from()
-            status = self.user.userplan.extend_account(self.plan, self.pricing)
-            self.plan_extended_until = self.user.userplan.expire
-            order.completed = self.completed = now()
-            if status:
-                self.status = self.STATUS.COMPLETED
-            else:
-                self.status = self.STATUS.NOT_VALID
-            self.save()
-            order_completed.send(self)
-            return True
+            return self._complete_locked_order()
         else:
             return False
 
+    def _complete_locked_order(self):
+        """Completes the order, whose row and user plan row are already locked"""
+        # Snapshot the UserPlan state *before* extend_account runs so
+        # return_order can rewind by the exact number of days the
+        # extension added. extend_account/reduce_account are otherwise
+        # asymmetric for plans that were expired (or had expire=None) at
+        # completion time: extend_account jumps expire forward to
+        # ``localdate() + pricing.period`` instead of
+        # ``previous_expire + pricing.period``, while reduce_account
+        # always rewinds by exactly ``pricing.period`` days.
+        self.userplan_expire_before = self.user.userplan.expire
+        self.userplan_active_before = self.user.userplan.active
+        self.userplan_plan_before = self.user.userplan.plan
+        self.plan_extended_from = self.get_plan_extended_from()
+        status = self.user.userplan.extend_account(self.plan, self.pricing)
+        self.plan_extended_until = self.user.userplan.expire
+        self.completed = now()
+        if status:
+            self.status = self.STATUS.COMPLETED
+        else:
+            self.status = self.STATUS.NOT_VALID
+        self.save()
+        order_completed.send(self)
+        return True
+
     @transaction.atomic()
     def return_order(self):
+        self._return_order(lock_user_plan=True)
+
+    def _return_order(self, lock_user_plan):
         if self.status != self.STATUS.RETURNED:
             if self.status == self.STATUS.COMPLETED:
                 if self.pricing is not None:
@@ -1165,14 +1348,15 @@ class AbstractOrder(BaseMixin, models.Model):
                             f"plan_extended_until={self.plan_extended_until}, "
                             f"pricing.period={self.pricing.period}"
                         )
-                locked = (
-                    AbstractUserPlan.get_concrete_model()
-                    .objects.select_for_update()
-                    .filter(user=self.user)
-                    .first()
-                )
-                if locked is not None:
-                    self.user.userplan.refresh_from_db()
+                if lock_user_plan:
+                    locked = (
+                        AbstractUserPlan.get_concrete_model()
+                        .objects.select_for_update()
+                        .filter(user=self.user)
+                        .first()
+                    )
+                    if locked is not None:
+                        self.user.userplan.refresh_from_db()
                 self.user.userplan.reduce_account(self.pricing, order=self)
             elif self.status != self.STATUS.NOT_VALID:
                 raise ValueError(
@@ -1183,6 +1367,93 @@ class AbstractOrder(BaseMixin, models.Model):
                 invoice.cancel_invoice()
             self.save()
 
+    @classmethod
+    def complete_orders(cls, order_ids, chunk_size=100, progress=None):
+        """
+        Completes many orders like ``complete_order()``, see ``process_orders()``.
+        Orders which are already completed are skipped.
+        """
+        return cls.process_orders(
+            order_ids,
+            lambda order: order.completed is None and order._complete_locked_order(),
+            chunk_size,
+            progress,
+        )
+
+    @classmethod
+    def return_orders(cls, order_ids, chunk_size=100, progress=None):
+        """
+        Returns many orders like ``return_order()``, see ``process_orders()``.
+        Orders which are already returned are skipped.
+        """
+
+        def return_order(order):
+            if order.status == cls.STATUS.RETURNED:
+                return False
+            order._return_order(lock_user_plan=False)
+            return True
+
+        return cls.process_orders(order_ids, return_order, chunk_size, progress)
+
+    @classmethod
+    def process_orders(cls, order_ids, process, chunk_size=100, progress=None):
+        """
+        Calls ``process(order)`` for many orders in one transaction per chunk.
+
+        Orders of a chunk and user plans of their users are locked with one
+        ``select_for_update()`` each, always in pk order, so that concurrent
+        batches can't deadlock. Every order is processed in a savepoint; an
+        order whose processing raises an exception is rolled back and reported.
+
+        :param process: returns True if the order was processed, False if skipped
+        :param progress: called with the number of orders done so far after every chunk
+        :return: tuple ``(list of processed orders, {order pk: exception})``
+        """
+        UserPlan = AbstractUserPlan.get_concrete_model()
+        order_ids = sorted(set(order_ids))
+        processed = []
+        errors = {}
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = order_ids[start : start + chunk_size]
+            with transaction.atomic():
+                list(
+                    cls.objects.filter(pk__in=chunk)
+                    .order_by("pk")
+                    .select_for_update()
+                    .values_list("pk", flat=True)
+                )
+                orders = list(
+                    cls.objects.filter(pk__in=chunk)
+                    .order_by("pk")
+                    .select_related("user", "plan", "pricing")
+                )
+                user_plans = {
+                    user_plan.user_id: user_plan
+                    for user_plan in UserPlan.objects.filter(
+                        user_id__in={order.user_id for order in orders}
+                    )
+                    .order_by("pk")
+                    .select_for_update()
+                }
+                for order in orders:
+                    user_plan = user_plans.get(order.user_id)
+                    if user_plan is not None:
+                        # Orders of the same user share the locked user plan
+                        order.user.userplan = user_plan
+                    try:
+                        with transaction.atomic():
+                            done = process(order)
+                    except Exception as e:
+                        errors[order.pk] = e
+                        if user_plan is not None:
+                            user_plan.refresh_from_db()
+                    else:
+                        if done:
+                            processed.append(order)
+            if progress is not None:
+                progress(start + len(chunk))
+        return processed, errors
+
     def get_invoices_proforma(self):
         return AbstractInvoice.get_concrete_model().proforma.filter(order=self)
 
@@ -1193,7 +1464,23 @@ class AbstractOrder(BaseMixin, models.Model):
         return AbstractInvoice.get_concrete_model().credit_notes.filter(order=self)
 
     def get_all_invoices(self):
-        return self.invoice_set.order_by("issued", "issued_duplicate", "pk")
+        if "invoice_set" in getattr(self, "_prefetched_objects_cache", {}):
+            # Prefetched in the same order by ``prefetch_all_invoices()``
+            return self.invoice_set.all()
+        return self.invoice_set.order_by(*self.ALL_INVOICES_ORDERING)
+
+    @classmethod
+    def prefetch_all_invoices(cls, fields=None):
+        """
+        ``Prefetch`` object for ``get_all_invoices()`` of many orders, loading
+        only given invoice ``fields`` if any.
+        """
+        queryset = AbstractInvoice.get_concrete_model().objects.order_by(
+            *cls.ALL_INVOICES_ORDERING
+        )
+        if fields is not None:
+            queryset = queryset.only("order", *fields)
+        return models.Prefetch("invoice_set", queryset=queryset)
 
     def get_plan_pricing(self):
         return AbstractPlanPricing.get_concrete_model().objects.get(
@@ -1294,6 +1581,50 @@ def get_initial_number(older_invoices):
     ) + 1
 
 
+DEFAULT_INVOICE_NUMBER_FORMAT = (
+    "{{ invoice.number }}/"
+    "{% if invoice.type == invoice.INVOICE_TYPES.PROFORMA %}PF{% else %}FV{% endif %}"
+    "/{{ invoice.issued|date:'m/Y' }}"
+)
+
+# The default format, with any combination of day, month and year in the date
+SIMPLE_INVOICE_NUMBER_FORMAT = re.compile(
+    r"\{\{ invoice\.number \}\}/"
+    r"\{% if invoice\.type == invoice\.INVOICE_TYPES\.PROFORMA %\}PF"
+    r"\{% else %\}FV\{% endif %\}"
+    r"/\{\{ invoice\.issued\|date:'(?P<date_format>[dmY/.-]+)' \}\}"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_invoice_number_format(format):
+    """
+    Returns ``(template, date_format)`` for an invoice number format.
+
+    ``date_format`` is not None if the format is recognized by
+    ``SIMPLE_INVOICE_NUMBER_FORMAT`` and can be rendered without the template.
+    """
+    match = SIMPLE_INVOICE_NUMBER_FORMAT.fullmatch(format)
+    return Template(format), match["date_format"] if match else None
+
+
+SAVED_INVOICE_FIELDS = re.compile(r"\binvoice\.(pk|id|created|updated_at)\b")
+
+
+def invoice_number_format_uses_saved_fields(format):
+    """
+    Tells if an invoice number format uses fields which are set only by saving
+    the invoice, so that the full number can't be generated before the INSERT.
+    """
+    return SAVED_INVOICE_FIELDS.search(format) is not None
+
+
+def format_date(day, date_format):
+    """Same as ``date`` template filter for the ``d``, ``m`` and ``Y`` format characters"""
+    values = {"d": "%02d" % day.day, "m": "%02d" % day.month, "Y": "%04d" % day.year}
+    return "".join(values.get(char, char) for char in date_format)
+
+
 class AbstractInvoice(BaseMixin, models.Model):
     """
     Single invoice document.
@@ -1458,13 +1789,36 @@ class AbstractInvoice(BaseMixin, models.Model):
                 self.number = get_next_value(
                     self.sequence_name, initial_value=self.initial_number
                 )
+            self.normalize_saved_values()
+            # The sequence number is known already, so the full number is
+            # usually stored by the same INSERT
+            if self.full_number == "" and not invoice_number_format_uses_saved_fields(
+                self.get_number_format()
+            ):
+                self.full_number = self.get_full_number()
             super(AbstractInvoice, self).save(*args, **kwargs)
 
-        # We need to generate full number based on what invoice sequence number actually ended up in DB
-        self.refresh_from_db()
         if self.full_number == "":
+            # The format needs fields set by saving, e.g. pk or created
+            self.refresh_from_db()
             self.full_number = self.get_full_number()
-        super(AbstractInvoice, self).save(update_fields=["full_number"])
+            super(AbstractInvoice, self).save(update_fields=["full_number"])
+
+    def normalize_saved_values(self):
+        """
+        Converts field values to what the database stores (e.g. a str or
+        datetime assigned to a date field to a date) with ``field.to_python()``,
+        as reloading the invoice would, so that the full number generated
+        before the INSERT is the same as one generated from the saved invoice.
+        """
+        for field in self._meta.concrete_fields:
+            value = getattr(self, field.attname)
+            if value is None:
+                continue
+            value = field.to_python(value)
+            if isinstance(field, models.DecimalField):
+                value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+            setattr(self, field.attname, value)
 
     #    def validate_unique(self, exclude=None):
     #        super(Invoice, self).validate_unique(exclude)
@@ -1474,6 +1828,12 @@ class AbstractInvoice(BaseMixin, models.Model):
     #        if self.type in (Invoice.INVOICE_TYPES.INVOICE, Invoice.INVOICE_TYPES.PROFORMA):
     #            pass
 
+    @staticmethod
+    def get_number_format():
+        return getattr(
+            settings, "PLANS_INVOICE_NUMBER_FORMAT", DEFAULT_INVOICE_NUMBER_FORMAT
+        )
+
     def get_full_number(self):
         """
         Generates on the fly invoice full number from template provided by ``settings.PLANS_INVOICE_NUMBER_FORMAT``.
@@ -1487,14 +1847,13 @@ class AbstractInvoice(BaseMixin, models.Model):
 
         :return: string (generated full number)
         """
-        format = getattr(
-            settings,
-            "PLANS_INVOICE_NUMBER_FORMAT",
-            "{{ invoice.number }}/"
-            "{% if invoice.type == invoice.INVOICE_TYPES.PROFORMA %}PF{% else %}FV{% endif %}"
-            "/{{ invoice.issued|date:'m/Y' }}",
-        )
-        return Template(format).render(Context({"invoice": self}))
+        template, date_format = compile_invoice_number_format(self.get_number_format())
+        # Other values (str, datetime) are left to the template's date filter,
+        # which parses them and converts aware datetimes to the current time zone
+        if date_format is not None and type(self.issued) is date:
+            kind = "PF" if self.type == self.INVOICE_TYPES.PROFORMA else "FV"
+            return f"{self.number}/{kind}/{format_date(self.issued, date_format)}"
+        return template.render(Context({"invoice": self}))
 
     def set_issuer_invoice_data(self):
         """
@@ -1559,6 +1918,26 @@ class AbstractInvoice(BaseMixin, models.Model):
         else:
             self.item_description = order.name
 
+    @classmethod
+    def from_order(cls, order, invoice_type, billing_info, day=None):
+        """
+        Returns a new, unsaved and unnumbered invoice of ``invoice_type`` for ``order``
+        """
+        if day is None:
+            day = localdate()
+        pday = order.completed
+        if invoice_type == cls.INVOICE_TYPES["PROFORMA"]:
+            pday = day + timedelta(days=14)
+
+        invoice = cls(
+            issued=day, selling_date=order.completed, payment_date=pday
+        )  # FIXME: 14 - this should set accordingly to ORDER_TIMEOUT in days
+        invoice.type = invoice_type
+        invoice.copy_from_order(order)
+        invoice.set_issuer_invoice_data()
+        invoice.set_buyer_invoice_data(billing_info)
+        return invoice
+
     @classmethod
     def create(cls, order, invoice_type):
         language_code = get_user_language(order.user)
@@ -1572,18 +1951,7 @@ class AbstractInvoice(BaseMixin, models.Model):
         except BillingInfo.DoesNotExist:
             return
 
-        day = localdate()
-        pday = order.completed
-        if invoice_type == cls.INVOICE_TYPES["PROFORMA"]:
-            pday = day + timedelta(days=14)
-
-        invoice = cls(
-            issued=day, selling_date=order.completed, payment_date=pday
-        )  # FIXME: 14 - this should set accordingly to ORDER_TIMEOUT in days
-        invoice.type = invoice_type
-        invoice.copy_from_order(order)
-        invoice.set_issuer_invoice_data()
-        invoice.set_buyer_invoice_data(billing_info)
+        invoice = cls.from_order(order, invoice_type, billing_info)
         invoice.clean()
         invoice.save()
         if language_code is not None:
@@ -1591,11 +1959,114 @@ class AbstractInvoice(BaseMixin, models.Model):
 
         return invoice
 
-    def send_invoice_by_email(self):
+    @classmethod
+    def create_bulk(cls, orders, invoice_type):
+        """
+        Issues invoices of ``invoice_type`` for many orders (a list or a
+        queryset) at once.
+
+        Works like ``create()`` called for every order, but orders with their
+        users and billing info are fetched with one query each, invoice numbers
+        are reserved with one call per sequence and invoices are inserted with
+        ``bulk_create()``. Orders which already have an invoice of
+        ``invoice_type`` and orders of users without billing info are skipped.
+        Invoice e-mails are sent over one connection after the invoices are
+        committed. Used by the ``create_invoices`` management command.
+
+        .. warning::
+
+            ``post_save`` signal is not sent for the created invoices, and the
+            language of the user is not activated while an invoice is built
+            (only while its e-mail is rendered). Use ``create()`` where
+            ``post_save`` receivers or translated invoice values are needed.
+
+        :return: list of created invoices
+        """
+        Order = AbstractOrder.get_concrete_model()
+        if isinstance(orders, models.QuerySet):
+            order_ids = orders.values("pk")
+        else:
+            order_ids = [order.pk for order in orders]
+        orders = list(
+            Order.objects.filter(pk__in=order_ids)
+            .exclude(
+                models.Exists(
+                    cls.objects.filter(type=invoice_type, order=models.OuterRef("pk"))
+                )
+            )
+            .select_related("user")
+            .order_by("pk")
+        )
+        BillingInfo = AbstractBillingInfo.get_concrete_model()
+        billing_infos = {
+            billing_info.user_id: billing_info
+            for billing_info in BillingInfo.objects.filter(
+                user_id__in={order.user_id for order in orders}
+            )
+        }
+        day = localdate()
+        invoices = [
+            cls.from_order(order, invoice_type, billing_infos[order.user_id], day)
+            for order in orders
+            if order.user_id in billing_infos
+        ]
+        if not invoices:
+            return []
+
+        # Sequence of an invoice depends only on its type and issue date,
+        # unless PLANS_INVOICE_COUNTER_RESET is a callable
+        counter_reset = getattr(settings, "PLANS_INVOICE_COUNTER_RESET", None)
+        sequences = {}
+        for invoice in invoices:
+            key = (invoice.type, invoice.issued)
+            if callable(counter_reset) or key not in sequences:
+                invoice.clean()
+                sequences[key] = (invoice.sequence_name, invoice.initial_number)
+            else:
+                invoice.sequence_name, invoice.initial_number = sequences[key]
+        by_sequence = {}
+        for invoice in invoices:
+            by_sequence.setdefault(invoice.sequence_name, []).append(invoice)
+
+        uses_saved_fields = invoice_number_format_uses_saved_fields(
+            cls.get_number_format()
+        )
+        with transaction.atomic():
+            for sequence_name, sequence_invoices in by_sequence.items():
+                numbers = get_next_values(
+                    len(sequence_invoices),
+                    sequence_name,
+                    initial_value=sequence_invoices[0].initial_number,
+                )
+                for invoice, number in zip(sequence_invoices, numbers):
+                    invoice.number = number
+                    # Like save(), the full number is made of saved values
+                    invoice.normalize_saved_values()
+                    if not uses_saved_fields:
+                        invoice.full_number = invoice.get_full_number()
+            cls.objects.bulk_create(invoices)
+            if uses_saved_fields:
+                # pk and timestamps are set on the instances by bulk_create()
+                for invoice in invoices:
+                    invoice.normalize_saved_values()
+                    invoice.full_number = invoice.get_full_number()
+                cls.objects.bulk_update(invoices, ["full_number"])
+            transaction.on_commit(
+                lambda: send_emails(
+                    [invoice.get_invoice_email() for invoice in invoices]
+                )
+            )
+        return invoices
+
+    def get_invoice_email(self):
+        """
+        Returns e-mail notifying the user about the invoice, or None if it
+        shouldn't be sent.
+        """
         if self.type in getattr(
             settings, "PLANS_SEND_EMAILS_DISABLED_INVOICE_TYPES", []
         ):
-            return
+            return None
 
         language_code = get_user_language(self.user)
 
@@ -1611,7 +2082,7 @@ class AbstractInvoice(BaseMixin, models.Model):
         }
         if language_code is not None:
             translation.deactivate()
-        send_template_email(
+        return build_template_email(
             [self.user.email],
             "mail/invoice_created_title.txt",
             "mail/invoice_created_body.txt",
@@ -1619,6 +2090,9 @@ class AbstractInvoice(BaseMixin, models.Model):
             language_code,
         )
 
+    def send_invoice_by_email(self):
+        send_emails([self.get_invoice_email()])
+
     def is_UE_customer(self):
         return EUTaxationPolicy.is_in_EU(self.buyer_country.code)
 
@@ -0,0 +1,301 @@
+"""
+Caching of values derived from the plan catalog.
+
+Plans, pricings and quotas are read on almost every request (quota checks,
+current plan resolution) but change very rarely. Values derived from them are
+memoized in-process and, when ``settings.PLANS_CACHE`` names a Django cache,
+shared between processes. Every cached value is keyed by the catalog
+revision, which ``plans.listeners`` bumps whenever a catalog model is written.
+
+.. warning::
+
+    Writes that bypass model signals (``QuerySet.update()``, ``bulk_create()``,
+    raw SQL) do not bump the revision. Call ``invalidate()`` after such writes.
+"""
+
+import copy
+import functools
+import hashlib
+import itertools
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+REVISION_CACHE_KEY = "plans_catalog_revision"
+VALUE_CACHE_KEY = "plans_catalog_value_%s_%s"
+
+_revision_counter = itertools.count()
+_local_revision = next(_revision_counter)
+# Per-thread aliases of connections with uncommitted catalog writes
+_uncommitted = threading.local()
+# Values memoized by ``get_or_build()`` for ``_values_revision``, least
+# recently used first. Keys include plan pks, so their number is bounded.
+MAX_VALUES = 1024
+_values = OrderedDict()
+_values_revision = None
+_values_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Returns the Django cache configured by ``PLANS_CACHE`` or None"""
+    alias = getattr(settings, "PLANS_CACHE", None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def get_revision():
+    """
+    Returns the current catalog revision.
+
+    The revision consists of a process-local counter, which is always bumped
+    by writes made in this process, and of a token kept in the shared cache
+    (if any), which makes writes made by other processes visible here.
+    """
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return _local_revision, None
+    token = shared_cache.get(REVISION_CACHE_KEY)
+    if token is None:
+        shared_cache.add(REVISION_CACHE_KEY, uuid.uuid4().hex, None)
+        token = shared_cache.get(REVISION_CACHE_KEY)
+    return _local_revision, token
+
+
+def bump_revision():
+    """Invalidates every value cached for the current catalog revision"""
+    global _local_revision
+    _local_revision = next(_revision_counter)
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared_cache.set(REVISION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate(using=None):
+    """
+    Invalidates cached values after a catalog write.
+
+    Outside of a transaction the revision is bumped right away. A write made
+    inside a transaction bumps it on commit, so that no process caches values
+    of uncommitted state. Until the transaction ends, values are built without
+    being memoized or shared, so that this thread sees its own writes and
+    nothing built from them outlives a rollback.
+    """
+    if not transaction.get_connection(using).in_atomic_block:
+        bump_revision()
+        return
+    _get_uncommitted_usings().add(using)
+    transaction.on_commit(functools.partial(_commit, using), using=using)
+
+
+def _commit(using):
+    _get_uncommitted_usings().discard(using)
+    bump_revision()
+
+
+def _get_uncommitted_usings():
+    if not hasattr(_uncommitted, "usings"):
+        _uncommitted.usings = set()
+    return _uncommitted.usings
+
+
+def has_uncommitted_writes():
+    """
+    Tells if this thread is in a transaction with catalog writes. A transaction
+    which ended without running its commit hook was rolled back.
+    """
+    usings = _get_uncommitted_usings()
+    for using in list(usings):
+        if not transaction.get_connection(using).in_atomic_block:
+            usings.discard(using)
+    return bool(usings)
+
+
+def clear():
+    """Drops all cached catalog values, e.g. in tests"""
+    bump_revision()
+    _get_uncommitted_usings().clear()
+    with _values_lock:
+        _values.clear()
+
+
+def get_quota_dict(plan_pk):
+    """
+    Returns ``{quota codename: value}`` dict for a plan given by its pk.
+    """
+    # Copy, so that callers can't mutate the cached value
+    return dict(
+        get_or_build("quota_dict_%s" % plan_pk, lambda: _build_quota_dict(plan_pk))
+    )
+
+
+def _build_quota_dict(plan_pk):
+    from plans.base.models import AbstractPlanQuota
+
+    PlanQuota = AbstractPlanQuota.get_concrete_model()
+    return dict(
+        PlanQuota.objects.filter(plan_id=plan_pk).values_list(
+            "quota__codename", "value"
+        )
+    )
+
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["default_plan", "free_plan_ids"])
+CatalogSnapshot.__doc__ = """
+Plan catalog facts needed on most requests:
+
+ * ``default_plan`` - the default ``Plan`` instance or None,
+ * ``free_plan_ids`` - frozenset of pks of plans without any pricing.
+"""
+
+
+def get_snapshot():
+    """
+    Returns ``CatalogSnapshot`` for the current catalog revision.
+    """
+    return get_or_build("snapshot", _build_snapshot)
+
+
+def get_default_plan():
+    """
+    Returns a copy of the default plan or None, so that callers can't mutate the cached instance.
+    """
+    default_plan = get_snapshot().default_plan
+    if default_plan is None:
+        return None
+    return copy.copy(default_plan)
+
+
+def get_plan(plan_pk):
+    """
+    Returns a copy of the plan given by its pk.
+
+    :raise: Plan.DoesNotExist
+    """
+    return copy.copy(get_or_build("plan_%s" % plan_pk, lambda: _build_plan(plan_pk)))
+
+
+def _build_plan(plan_pk):
+    from plans.base.models import AbstractPlan
+
+    return AbstractPlan.get_concrete_model().objects.get(pk=plan_pk)
+
+
+def is_free_plan(plan_pk):
+    return plan_pk in get_snapshot().free_plan_ids
+
+
+def _build_snapshot():
+    from django.db.models import Exists, OuterRef, Q
+
+    from plans.base.models import AbstractPlan, AbstractPlanPricing
+
+    Plan = AbstractPlan.get_concrete_model()
+    PlanPricing = AbstractPlanPricing.get_concrete_model()
+    # Single query for both the default plan and all free plans
+    plans = Plan.objects.annotate(
+        has_pricing=Exists(PlanPricing.objects.filter(plan=OuterRef("pk")))
+    ).filter(Q(default=True) | Q(has_pricing=False))
+    default_plan = None
+    free_plan_ids = set()
+    for plan in plans:
+        if plan.default:
+            default_plan = plan
+        if not plan.has_pricing:
+            free_plan_ids.add(plan.pk)
+    return CatalogSnapshot(default_plan, frozenset(free_plan_ids))
+
+
+def get_or_build(key, build):
+    """
+    Returns a value derived from the catalog, memoized under ``key`` (a string)
+    for the current catalog revision. ``build()`` is called on a cache miss and
+    must return a picklable value other than None. At most ``MAX_VALUES``
+    values are kept in-process, the least recently used ones are dropped.
+    """
+    global _values_revision
+    if has_uncommitted_writes():
+        return build()
+
+    revision = get_revision()
+    with _values_lock:
+        if _values_revision != revision:
+            _values.clear()
+            _values_revision = revision
+        if key in _values:
+            _values.move_to_end(key)
+            return _values[key]
+
+    shared_cache = get_shared_cache()
+    value = None
+    if shared_cache is not None:
+        shared_key = VALUE_CACHE_KEY % (key, revision[1])
+        value = shared_cache.get(shared_key)
+    if value is None:
+        value = build()
+        if shared_cache is not None:
+            shared_cache.set(shared_key, value)
+
+    with _values_lock:
+        if _values_revision == revision:
+            _values[key] = value
+            _values.move_to_end(key)
+            while len(_values) > MAX_VALUES:
+                _values.popitem(last=False)
+    return value
+
+
+CatalogVersion = namedtuple("CatalogVersion", ["last_modified", "etag"])
+CatalogVersion.__doc__ = """
+Version of the whole plan catalog, the same in all processes:
+
+ * ``last_modified`` - latest ``updated_at`` of any plan, pricing or quota, or None,
+ * ``etag`` - digest of ``last_modified`` and row counts, which changes on deletes too.
+"""
+
+
+def get_version():
+    """
+    Returns ``CatalogVersion`` for the current catalog revision, e.g. for
+    HTTP conditional requests of pages showing the catalog.
+    """
+    return get_or_build("version", _build_version)
+
+
+def _build_version():
+    from django.db.models import Count, Max
+
+    from plans.base.models import (
+        AbstractPlan,
+        AbstractPlanPricing,
+        AbstractPlanQuota,
+        AbstractPricing,
+        AbstractQuota,
+    )
+
+    last_modified = None
+    digest = hashlib.md5(usedforsecurity=False)
+    for model in (
+        AbstractPlan,
+        AbstractPricing,
+        AbstractPlanPricing,
+        AbstractQuota,
+        AbstractPlanQuota,
+    ):
+        stats = model.get_concrete_model().objects.aggregate(
+            last_modified=Max("updated_at"), count=Count("pk")
+        )
+        digest.update(
+            (
+                "%s:%s:%s;" % (model.__name__, stats["count"], stats["last_modified"])
+            ).encode()
+        )
+        if stats["last_modified"] is not None and (
+            last_modified is None or stats["last_modified"] > last_modified
+        ):
+            last_modified = stats["last_modified"]
+    return CatalogVersion(last_modified, digest.hexdigest())
@@ -1,8 +1,19 @@
-from django.urls import reverse
+import functools
 
-from plans.base.models import AbstractUserPlan
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.translation import get_language
 
-UserPlan = AbstractUserPlan.get_concrete_model()
+from plans.plan_state import get_plan_state
+
+
+def get_account_urls():
+    """Returns URLs of account extend and activation pages, reversed once per process"""
+    return _reverse_account_urls(get_urlconf(), get_script_prefix(), get_language())
+
+
+@functools.lru_cache(maxsize=128)
+def _reverse_account_urls(urlconf, script_prefix, language):
+    return reverse("current_plan"), reverse("account_activation")
 
 
 def account_status(request):
@@ -16,20 +27,19 @@ def account_status(request):
      * ``EXTEND_URL = string``, URL to account extend page.
      * ``ACTIVATE_URL = string``, URL to account activation needed if  account is not active
 
+    With ``PLANS_USER_PLAN_CACHE`` the state of the user plan is read from the cache, without any query.
     """
 
     if hasattr(request, "user") and request.user.is_authenticated:
-        try:
+        user_plan = get_plan_state(request.user)
+        if user_plan is not None:
+            expired = user_plan.is_expired()
+            extend_url, activate_url = get_account_urls()
             return {
-                "ACCOUNT_EXPIRED": request.user.userplan.is_expired(),
-                "ACCOUNT_NOT_ACTIVE": (
-                    not request.user.userplan.is_active()
-                    and not request.user.userplan.is_expired()
-                ),
-                "EXPIRE_IN_DAYS": request.user.userplan.days_left(),
-                "EXTEND_URL": reverse("current_plan"),
-                "ACTIVATE_URL": reverse("account_activation"),
+                "ACCOUNT_EXPIRED": expired,
+                "ACCOUNT_NOT_ACTIVE": not user_plan.is_active() and not expired,
+                "EXPIRE_IN_DAYS": user_plan.days_left(),
+                "EXTEND_URL": extend_url,
+                "ACTIVATE_URL": activate_url,
             }
-        except UserPlan.DoesNotExist:
-            pass
     return {}
@@ -8,20 +8,26 @@ from django.template import loader
 from django.template.exceptions import TemplateDoesNotExist
 from django.utils import translation
 
+from plans import outbox
 from plans.signals import user_language
 
 email_logger = logging.getLogger("emails")
 
 
-def send_template_email(recipients, title_template, body_template, context, language):
-    """Sends e-mail using templating system"""
+def build_template_email(recipients, title_template, body_template, context, language):
+    """
+    Renders e-mail using templating system
+
+    :return: ``EmailMultiAlternatives`` or None if sending plans e-mails is disabled
+    """
 
     send_emails = getattr(settings, "SEND_PLANS_EMAILS", True)
     if not send_emails:
-        return
+        return None
 
     site_name = getattr(settings, "SITE_NAME", "Please define settings.SITE_NAME")
     domain = getattr(settings, "SITE_URL", None)
+    current_site = None
 
     if domain is None:
         try:
@@ -51,6 +57,9 @@ def send_template_email(recipients, title_template, body_template, context, lang
     except TemplateDoesNotExist:
         html_body = None
 
+    if language is not None:
+        translation.deactivate()
+
     try:
         email_from = getattr(settings, "DEFAULT_FROM_EMAIL")
     except AttributeError:
@@ -58,13 +67,57 @@ def send_template_email(recipients, title_template, body_template, context, lang
             "DEFAULT_FROM_EMAIL setting needed for sending e-mails"
         )
 
-    mail.send_mail(title, body, email_from, recipients, html_message=html_body)
+    message = mail.EmailMultiAlternatives(title, body, email_from, recipients)
+    if html_body is not None:
+        message.attach_alternative(html_body, "text/html")
+    return message
 
-    if language is not None:
-        translation.deactivate()
 
+def send_emails(messages):
+    """
+    Sends e-mails built by ``build_template_email`` over a single connection
+
+    With ``PLANS_EMAIL_OUTBOX`` enabled the e-mails are put to the outbox
+    (see ``plans.outbox``) instead.
+
+    :param messages: iterable of ``EmailMessage`` objects, None items are skipped
+    :return: number of sent (or queued) e-mails
+    """
+    messages = [message for message in messages if message is not None]
+    if not messages:
+        return 0
+
+    if outbox.is_enabled():
+        return outbox.enqueue(messages)
+
+    sent = mail.get_connection().send_messages(messages)
+
+    for message in messages:
+        log_sent_email(message)
+    return sent
+
+
+def log_sent_email(message):
     email_logger.info(
-        "Email (%s) sent to %s\nTitle: %s\n%s\n\n" % (language, recipients, title, body)
+        "Email sent to %s\nTitle: %s\n%s\n\n"
+        % (message.to, message.subject, message.body)
+    )
+
+
+def send_template_email(recipients, title_template, body_template, context, language):
+    """
+    Sends e-mail using templating system
+
+    With ``PLANS_EMAIL_OUTBOX`` enabled the rendered e-mail is sent later by
+    the outbox drainer.
+    """
+
+    send_emails(
+        [
+            build_template_email(
+                recipients, title_template, body_template, context, language
+            )
+        ]
     )
 
 
@@ -1,20 +1,32 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
 from django.dispatch.dispatcher import receiver
 
+from plans import catalog, plan_change, plan_state, quota, utils, validators
 from plans.base.models import (
     AbstractInvoice,
     AbstractOrder,
     AbstractPlan,
+    AbstractPlanPricing,
+    AbstractPlanQuota,
+    AbstractPricing,
+    AbstractQuota,
+    AbstractRecurringUserPlan,
     AbstractUserPlan,
 )
-from plans.signals import activate_user_plan, order_completed
+from plans.signals import accounts_deactivated, activate_user_plan, order_completed
 
 User = get_user_model()
 Order = AbstractOrder.get_concrete_model()
 Invoice = AbstractInvoice.get_concrete_model()
 UserPlan = AbstractUserPlan.get_concrete_model()
+RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
 Plan = AbstractPlan.get_concrete_model()
+PlanPricing = AbstractPlanPricing.get_concrete_model()
+PlanQuota = AbstractPlanQuota.get_concrete_model()
+Pricing = AbstractPricing.get_concrete_model()
+Quota = AbstractQuota.get_concrete_model()
 
 
 @receiver(post_save, sender=Order)
@@ -48,6 +60,66 @@ def set_default_user_plan(sender, instance, created, **kwargs):
         UserPlan.create_for_user(instance)
 
 
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+@receiver(post_save, sender=PlanPricing)
+@receiver(post_delete, sender=PlanPricing)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+@receiver(post_save, sender=PlanQuota)
+@receiver(post_delete, sender=PlanQuota)
+@receiver(post_save, sender=Quota)
+@receiver(post_delete, sender=Quota)
+def invalidate_catalog(sender, using=None, **kwargs):
+    """
+    Invalidates cached catalog values whenever a plan, pricing or quota changes.
+    """
+    catalog.invalidate(using)
+
+
+@receiver(post_save, sender=UserPlan)
+@receiver(post_delete, sender=UserPlan)
+def clear_request_quota(sender, **kwargs):
+    """
+    Makes quota checks made later in the same request see the changed user plan.
+    """
+    quota.clear_request_quota()
+
+
+@receiver(post_save, sender=UserPlan)
+@receiver(post_delete, sender=UserPlan)
+def invalidate_plan_state(sender, instance, using=None, **kwargs):
+    plan_state.invalidate([instance.user_id], using)
+
+
+@receiver(post_save, sender=RecurringUserPlan)
+@receiver(post_delete, sender=RecurringUserPlan)
+def invalidate_recurring_plan_state(sender, instance, using=None, **kwargs):
+    user_ids = UserPlan.objects.using(using).filter(pk=instance.user_plan_id)
+    plan_state.invalidate(user_ids.values_list("user_id", flat=True), using)
+
+
+@receiver(accounts_deactivated)
+def invalidate_deactivated_plan_states(sender, userplans, **kwargs):
+    plan_state.invalidate([userplan.user_id for userplan in userplans])
+
+
+@receiver(setting_changed)
+def clear_catalog_on_setting_change(sender, setting, **kwargs):
+    if setting == "PLANS_CACHE":
+        catalog.clear()
+
+
+@receiver(setting_changed)
+def clear_registries_on_setting_change(sender, setting, **kwargs):
+    if setting == "PLANS_VALIDATORS":
+        validators.get_validators.cache_clear()
+    elif setting == "PLANS_CHANGE_POLICY":
+        plan_change.get_policy_class.cache_clear()
+    elif setting == "PLANS_TAXATION_POLICY":
+        utils.get_taxation_policy.cache_clear()
+
+
 # Hook to django-registration to initialize plan automatically after user has confirm account
 
 
@@ -1,8 +1,9 @@
 import logging
+from collections import Counter
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
-from plans import tasks
+from plans import outbox, tasks
 
 
 class Command(BaseCommand):
@@ -33,8 +34,50 @@ class Command(BaseCommand):
             dest="dry_run",
             help="Dry run, do not change any data",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            dest="workers",
+            help="Number of threads submitting accounts to renewal concurrently",
+        )
+        parser.add_argument(
+            "--shard",
+            dest="shard",
+            help="Renew only shard i of N (e.g. 0/4), split by integer user pk",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            dest="stream",
+            help="Fetch accounts in chunks and report each one as it is renewed",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            dest="chunk_size",
+            help="Number of accounts fetched at once with --stream",
+        )
+
+    def parse_shard(self, shard):
+        try:
+            index, count = (int(part) for part in shard.split("/"))
+        except ValueError:
+            raise CommandError(f"Invalid shard {shard!r}, expected i/N")
+        if not 0 <= index < count:
+            raise CommandError(f"Invalid shard {shard!r}, expected 0 <= i < N")
+        return index, count
 
     def handle(self, *args, **options):  # pragma: no cover
+        shard = options.get("shard")
+        if shard is not None:
+            shard = self.parse_shard(shard)
+        if options.get("workers") < 1:
+            raise CommandError("--workers must be at least 1")
+        if options.get("stream") and options.get("workers") > 1:
+            raise CommandError("--stream can't be combined with --workers")
+
         logger = logging.getLogger("plans.tasks")
         handler = logging.StreamHandler(self.stdout)
         logger.addHandler(handler)
@@ -54,11 +97,23 @@ class Command(BaseCommand):
                 self.stdout.write("DRY RUN active")
             throttle_seconds = options.get("throttle")
             catch_exceptions = options.get("catch_exceptions")
+            if options.get("stream"):
+                self.stream_renewals(
+                    providers,
+                    throttle_seconds=throttle_seconds,
+                    catch_exceptions=catch_exceptions,
+                    dry_run=dry_run,
+                    shard=shard,
+                    chunk_size=options.get("chunk_size"),
+                )
+                return
             renewed_accounts = tasks.autorenew_account(
                 providers,
                 throttle_seconds=throttle_seconds,
                 catch_exceptions=catch_exceptions,
                 dry_run=dry_run,
+                workers=options.get("workers"),
+                shard=shard,
             )
             if renewed_accounts:
                 if dry_run:
@@ -77,4 +132,19 @@ class Command(BaseCommand):
             else:
                 self.stdout.write("No accounts autorenewed")
         finally:
+            outbox.flush()
             logger.removeHandler(handler)
+
+    def stream_renewals(self, providers, **kwargs):
+        outcomes = Counter()
+        for record in tasks.iter_renewals(providers, **kwargs):
+            outcomes[record.outcome] += 1
+            self.stdout.write(
+                f"\t{record.provider:<30}{record.user_pk!s:<40}"
+                f"{record.expire}\t{record.outcome}"
+            )
+        if outcomes:
+            summary = ", ".join(f"{n} {outcome}" for outcome, n in outcomes.items())
+            self.stdout.write(f"Accounts processed: {summary}")
+        else:
+            self.stdout.write("No accounts autorenewed")
@@ -0,0 +1,62 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+
+from plans import outbox
+from plans.base.models import AbstractInvoice, AbstractOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue missing invoices of completed orders in batches, e.g. for "
+        "month-end reissues and data repairs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            choices=["invoice", "proforma"],
+            default="invoice",
+            dest="invoice_type",
+            help="Type of the issued invoices",
+        )
+        parser.add_argument(
+            "--completed-after",
+            dest="completed_after",
+            help="Only orders completed on or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            dest="chunk_size",
+            help="Number of orders invoiced at once",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number")
+        Order = AbstractOrder.get_concrete_model()
+        Invoice = AbstractInvoice.get_concrete_model()
+        invoice_type = Invoice.INVOICE_TYPES[options["invoice_type"].upper()]
+        orders = Order.objects.filter(completed__isnull=False).exclude(
+            Exists(Invoice.objects.filter(type=invoice_type, order=OuterRef("pk")))
+        )
+        if options["completed_after"]:
+            orders = orders.filter(completed__date__gte=options["completed_after"])
+        order_ids = orders.order_by("pk").values_list("pk", flat=True)
+
+        created = 0
+        last_pk = None
+        while True:
+            chunk = order_ids
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk[: options["chunk_size"]])
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+            created += len(
+                Invoice.create_bulk(Order.objects.filter(pk__in=chunk), invoice_type)
+            )
+        outbox.flush()
+        self.stdout.write("%d invoices created" % created)
@@ -1,11 +1,27 @@
 from django.core.management import BaseCommand
 
-from plans import tasks
+from plans import outbox, tasks
 
 
 class Command(BaseCommand):
     help = "Expire accounts and send messages"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            dest="bulk",
+            help="Expire accounts in chunks with one UPDATE per chunk",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            dest="chunk_size",
+            help="Number of accounts processed at once in bulk mode",
+        )
+
     def handle(self, *args, **options):  # pragma: no cover
-        tasks.expire_account()
+        tasks.expire_account(bulk=options["bulk"], chunk_size=options["chunk_size"])
+        outbox.flush()
         self.stdout.write("accounts was expired")
@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+
+from plans.taxation.tedb_client import TEDBClient
+
+
+class Command(BaseCommand):
+    help = "Prefetch VAT rates of all EU member states from TEDB into the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            dest="date",
+            help="Date (YYYY-MM-DD) the rates are valid on, today by default",
+        )
+
+    def handle(self, *args, **options):
+        date = options.get("date")
+        if date is not None:
+            try:
+                date = datetime.date.fromisoformat(date)
+            except ValueError:
+                raise CommandError(f"Invalid date {date!r}, expected YYYY-MM-DD")
+        rates = TEDBClient().prefetch_all(date)
+        if not rates:
+            raise CommandError("VAT rates could not be retrieved from TEDB")
+        self.stdout.write("VAT rates of %d countries were cached" % len(rates))
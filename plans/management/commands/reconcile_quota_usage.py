@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand, CommandError
+
+from plans.validators import get_counter_validators
+
+
+class Command(BaseCommand):
+    help = "Recount objects counted by quota usage counters and fix drifted counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "codenames",
+            nargs="*",
+            help="Reconcile only counters of these quotas",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            dest="batch_size",
+            help="Number of users recounted at once",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be a positive number")
+        validators = {
+            validator.code: validator for validator in get_counter_validators()
+        }
+        unknown = set(options["codenames"]) - set(validators)
+        if unknown:
+            raise CommandError(
+                "No counter validators for quotas: %s" % ", ".join(sorted(unknown))
+            )
+        for code, validator in validators.items():
+            if options["codenames"] and code not in options["codenames"]:
+                continue
+            fixed = validator.reconcile_counters(batch_size=options["batch_size"])
+            self.stdout.write("%s: %d counters fixed" % (code, fixed))
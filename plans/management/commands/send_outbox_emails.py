@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand, CommandError
+
+from plans import outbox
+
+
+class Command(BaseCommand):
+    help = "Send e-mails waiting in the outbox, including failed ones due for a retry"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            dest="batch_size",
+            help="Number of e-mails sent over one mail connection",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be a positive number")
+        sent = outbox.send_pending(batch_size=options["batch_size"])
+        self.stdout.write("%d e-mails sent" % sent)
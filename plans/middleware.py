@@ -0,0 +1,23 @@
+from plans.quota import RequestQuota, _request_quota
+
+
+class QuotaMiddleware(object):
+    """
+    Sets ``request.plans_quota`` to a ``plans.quota.RequestQuota``, which
+    resolves the current plan and quota dict of ``request.user`` at most once
+    per request. Quota validators and ``get_user_quota()`` called for the
+    request user during the request use it instead of resolving them again.
+
+    Must be placed after ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.plans_quota = RequestQuota(request)
+        token = _request_quota.set(request.plans_quota)
+        try:
+            return self.get_response(request)
+        finally:
+            _request_quota.reset(token)
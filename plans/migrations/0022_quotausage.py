@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0021_alter_recurringuserplan_currency"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuotaUsage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        db_index=True,
+                        null=True,
+                        verbose_name="created",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("codename", models.CharField(max_length=50, verbose_name="codename")),
+                ("count", models.BigIntegerField(default=0, verbose_name="count")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Quota usage",
+                "verbose_name_plural": "Quota usages",
+                "abstract": False,
+                "swappable": "PLANS_QUOTAUSAGE_MODEL",
+                "unique_together": {("user", "codename")},
+            },
+        ),
+    ]
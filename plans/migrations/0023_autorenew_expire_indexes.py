@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0022_quotausage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recurringuserplan",
+            index=models.Index(
+                fields=["renewal_triggered_by", "token_verified", "payment_provider"],
+                name="plans_recurring_renewal_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recurringuserplan",
+            index=models.Index(
+                condition=models.Q(
+                    ("renewal_triggered_by", 3), ("token_verified", True)
+                ),
+                fields=["user_plan", "last_renewal_attempt"],
+                name="plans_recurring_task_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userplan",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["expire"],
+                name="plans_userplan_active_expire",
+            ),
+        ),
+    ]
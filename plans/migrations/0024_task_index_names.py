@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0023_autorenew_expire_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="userplan",
+            name="plans_userplan_active_expire",
+        ),
+        migrations.RenameIndex(
+            model_name="recurringuserplan",
+            new_name="plans_rup_renew",
+            old_name="plans_recurring_renewal_idx",
+        ),
+        migrations.RenameIndex(
+            model_name="recurringuserplan",
+            new_name="plans_rup_task",
+            old_name="plans_recurring_task_idx",
+        ),
+        migrations.AddIndex(
+            model_name="userplan",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["active", "expire"],
+                name="plans_up_act_exp",
+            ),
+        ),
+    ]
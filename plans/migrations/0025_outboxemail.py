@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0024_task_index_names"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        db_index=True,
+                        null=True,
+                        verbose_name="created",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("subject", models.TextField(verbose_name="subject")),
+                ("body", models.TextField(verbose_name="body")),
+                (
+                    "from_email",
+                    models.CharField(max_length=254, verbose_name="from e-mail"),
+                ),
+                ("to", models.JSONField(default=list, verbose_name="to")),
+                ("cc", models.JSONField(default=list, verbose_name="cc")),
+                ("bcc", models.JSONField(default=list, verbose_name="bcc")),
+                ("reply_to", models.JSONField(default=list, verbose_name="reply to")),
+                ("headers", models.JSONField(default=dict, verbose_name="headers")),
+                (
+                    "alternatives",
+                    models.JSONField(default=list, verbose_name="alternatives"),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="attempts"),
+                ),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=django.utils.timezone.now,
+                        verbose_name="next attempt",
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="last error")),
+            ],
+            options={
+                "verbose_name": "Outbox e-mail",
+                "verbose_name_plural": "Outbox e-mails",
+                "abstract": False,
+                "swappable": "PLANS_OUTBOXEMAIL_MODEL",
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
 from django.views.generic import View
 
+from plans.paginators import InvalidCursorError, KeysetPaginator
+
 
 class LoginRequired(View):
     @method_decorator(login_required)
@@ -16,3 +20,24 @@ class UserObjectsOnlyMixin(object):
             .get_queryset()
             .filter(user=self.request.user)
         )
+
+
+class KeysetPaginationMixin(object):
+    """
+    Paginates a list view with ``KeysetPaginator`` by ``keyset_ordering``.
+    Pages are requested with ``?after=<cursor>`` or ``?before=<cursor>``,
+    see ``plans/keyset_pagination.html``.
+    """
+
+    keyset_ordering = ("-pk",)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            if "before" in self.request.GET:
+                page = paginator.page(self.request.GET["before"], before=True)
+            else:
+                page = paginator.page(self.request.GET.get("after"))
+        except InvalidCursorError:
+            raise Http404(_("Invalid page"))
+        return paginator, page, page.object_list, page.has_other_pages()
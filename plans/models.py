@@ -4,11 +4,13 @@ from plans.base.models import (
     AbstractBillingInfo,
     AbstractInvoice,
     AbstractOrder,
+    AbstractOutboxEmail,
     AbstractPlan,
     AbstractPlanPricing,
     AbstractPlanQuota,
     AbstractPricing,
     AbstractQuota,
+    AbstractQuotaUsage,
     AbstractRecurringUserPlan,
     AbstractUserPlan,
 )
@@ -56,6 +58,18 @@ class PlanQuota(AbstractPlanQuota):
         swappable = swappable_setting("plans", "PlanQuota")
 
 
+class QuotaUsage(AbstractQuotaUsage):
+    class Meta(AbstractQuotaUsage.Meta):
+        abstract = False
+        swappable = swappable_setting("plans", "QuotaUsage")
+
+
+class OutboxEmail(AbstractOutboxEmail):
+    class Meta(AbstractOutboxEmail.Meta):
+        abstract = False
+        swappable = swappable_setting("plans", "OutboxEmail")
+
+
 class Order(AbstractOrder):
     class Meta(AbstractOrder.Meta):
         abstract = False
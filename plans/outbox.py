@@ -0,0 +1,154 @@
+"""
+Asynchronous delivery of plans e-mails.
+
+With ``settings.PLANS_EMAIL_OUTBOX`` enabled, ``plans.contrib`` doesn't send
+e-mails while the caller waits (possibly holding row locks inside
+``complete_order``'s transaction). Instead e-mails, rendered by the caller, are
+stored as ``OutboxEmail`` rows in the current transaction, so they are kept
+exactly when the transaction commits. Once it commits, a background drainer
+thread sends them in batches over a single mail connection.
+
+Rows are deleted when their batch is sent. A batch which fails to send is
+retried with exponential backoff, up to ``MAX_ATTEMPTS`` times, after which the
+rows are kept in the table with the last error. E-mails left behind by a
+killed process, or waiting for a retry, are sent by the
+``send_outbox_emails`` management command, which should run periodically.
+Delivery is at least once: an e-mail may be sent again if the process dies
+between sending it and deleting its row.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import connections, transaction
+from django.utils.timezone import now
+
+email_logger = logging.getLogger("emails")
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 10
+# Doubled after every failed attempt
+RETRY_DELAY = timedelta(minutes=1)
+
+_wakeup = threading.Event()
+_drainer = None
+_drainer_lock = threading.Lock()
+# Serializes sending within the process, other processes skip locked rows
+_send_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, "PLANS_EMAIL_OUTBOX", False)
+
+
+def _get_outbox_model():
+    from plans.base.models import AbstractOutboxEmail
+
+    return AbstractOutboxEmail.get_concrete_model()
+
+
+def enqueue(messages, using=None):
+    """
+    Stores ``EmailMessage`` objects in the outbox within the current
+    transaction and wakes up the drainer once it commits. Messages of a rolled
+    back transaction are dropped with it.
+    """
+    OutboxEmail = _get_outbox_model()
+    rows = [OutboxEmail.from_message(message) for message in messages]
+    if rows:
+        OutboxEmail.objects.db_manager(using).bulk_create(rows)
+        transaction.on_commit(_wake_up, using=using)
+    return len(rows)
+
+
+def _wake_up():
+    _ensure_drainer()
+    _wakeup.set()
+
+
+def _ensure_drainer():
+    global _drainer
+    with _drainer_lock:
+        if _drainer is None or not _drainer.is_alive():
+            _drainer = threading.Thread(
+                target=_drain_forever, name="plans-email-outbox", daemon=True
+            )
+            _drainer.start()
+
+
+def _drain_forever():
+    while True:
+        _wakeup.wait()
+        _wakeup.clear()
+        try:
+            send_pending()
+        except Exception:
+            email_logger.exception("Failed to send e-mails from outbox")
+        finally:
+            connections.close_all()
+
+
+def send_pending(batch_size=BATCH_SIZE):
+    """
+    Sends all e-mails due in the outbox in batches, returns the number of sent
+    ones. Failed batches are scheduled for a retry.
+    """
+    sent = 0
+    with _send_lock:
+        while True:
+            taken, batch_sent = _send_batch(batch_size)
+            sent += batch_sent
+            if taken < batch_size:
+                return sent
+
+
+def _send_batch(batch_size):
+    """Sends one batch, returns the number of taken and of sent e-mails"""
+    from plans.contrib import log_sent_email
+
+    OutboxEmail = _get_outbox_model()
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=MAX_ATTEMPTS, next_attempt__lte=now())
+            .order_by("pk")[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        messages = [row.to_message() for row in rows]
+        try:
+            mail.get_connection().send_messages(messages)
+        except Exception as e:
+            email_logger.exception("Failed to send %d e-mails from outbox" % len(rows))
+            _schedule_retry(rows, e)
+            return len(rows), 0
+        OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    for message in messages:
+        log_sent_email(message)
+    return len(rows), len(rows)
+
+
+def _schedule_retry(rows, error):
+    for row in rows:
+        row.attempts += 1
+        row.next_attempt = now() + RETRY_DELAY * 2 ** (row.attempts - 1)
+        row.last_error = repr(error)
+        if row.attempts >= MAX_ATTEMPTS:
+            email_logger.error(
+                "Giving up sending e-mail %s to %s after %d attempts"
+                % (row.pk, row.to, row.attempts)
+            )
+    _get_outbox_model().objects.bulk_update(
+        rows, ["attempts", "next_attempt", "last_error"]
+    )
+
+
+def flush():
+    """
+    Sends all e-mails due in the outbox and waits for the drainer to finish
+    its batch. Management commands and tests call it before they finish.
+    """
+    send_pending()
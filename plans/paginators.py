@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+class KeysetPage(object):
+    """
+    Page of ``KeysetPaginator``, with the subset of ``django.core.paginator.Page``
+    API which doesn't need the number of pages.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return "<KeysetPage of %d objects>" % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.object_list:
+            return None
+        return self.paginator.get_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.object_list:
+            return None
+        return self.paginator.get_cursor(self.object_list[0])
+
+
+class KeysetPaginator(object):
+    """
+    Paginates ``queryset`` by values of ``ordering`` fields of the first or last
+    object of a page (the cursor) instead of OFFSET, so that deep pages are as
+    fast as the first one. ``ordering`` must identify objects uniquely, e.g. end
+    with the pk, and consist of non-nullable fields: NULLs can't be compared
+    with a cursor.
+    """
+
+    def __init__(self, queryset, per_page, ordering=("-pk",)):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [
+            (
+                field.lstrip("-"),
+                self._get_field(field.lstrip("-")),
+                field.startswith("-"),
+            )
+            for field in self.ordering
+        ]
+        nullable = [name for name, field, _ in self.fields if field.null]
+        if nullable:
+            raise ImproperlyConfigured(
+                "KeysetPaginator can't order by nullable fields: %s"
+                % ", ".join(nullable)
+            )
+
+    def _get_field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == "pk" else opts.get_field(name)
+
+    def page(self, cursor=None, before=False):
+        """
+        Returns the page following ``cursor``, or the page preceding it if ``before``
+        is set. The first page is returned without a cursor.
+
+        :raise: InvalidCursorError
+        """
+        queryset = self.queryset
+        if cursor is not None:
+            values = self.decode(cursor)
+            try:
+                queryset = queryset.filter(self._get_filter(values, before))
+            except (TypeError, ValueError):
+                raise InvalidCursorError(cursor)
+        if before:
+            queryset = queryset.order_by(*map(self._reverse, self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        # One more object tells if there is another page in this direction
+        object_list = list(queryset[: self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if before:
+            object_list.reverse()
+            return KeysetPage(object_list, self, bool(object_list), has_more)
+        return KeysetPage(
+            object_list, self, has_more, cursor is not None and bool(object_list)
+        )
+
+    def get_cursor(self, obj):
+        values = [getattr(obj, field.attname) for _, field, _ in self.fields]
+        # str() keeps microseconds of datetimes, unlike DjangoJSONEncoder
+        data = json.dumps(values, default=str).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(data)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursorError(cursor)
+            values = [
+                field.to_python(value)
+                for (_, field, _), value in zip(self.fields, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise InvalidCursorError(cursor)
+        if any(value is None for value in values):
+            raise InvalidCursorError(cursor)
+        return values
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith("-") else "-" + field
+
+    def _get_filter(self, values, before):
+        """
+        Objects after (or before) the cursor, e.g. ``created < c OR (created = c
+        AND pk < p)`` for ``("-created", "-pk")``
+        """
+        condition = Q()
+        for i, (name, _, descending) in reversed(list(enumerate(self.fields))):
+            lookup = "lt" if descending != before else "gt"
+            beyond = Q(**{"%s__%s" % (name, lookup): values[i]})
+            if i == len(self.fields) - 1:
+                condition = beyond
+            else:
+                condition = beyond | (Q(**{name: values[i]}) & condition)
+        return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of big tables. On PostgreSQL the number of
+    rows of an unfiltered queryset is taken from the planner statistics
+    (``pg_class.reltuples``) instead of ``COUNT(*)`` when it is greater than
+    ``estimate_threshold``.
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is not None and estimate > self.estimate_threshold:
+            return estimate
+        return super().count
+
+    def get_estimate(self):
+        """Returns the estimated number of rows of the queryset, or None if unknown"""
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
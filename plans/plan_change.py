@@ -1,4 +1,5 @@
 # coding=utf-8
+import functools
 from decimal import Decimal
 
 from django.conf import settings
@@ -102,13 +103,19 @@ class StandardPlanChangePolicy(PlanChangePolicy):
             return cost
 
 
-def get_policy():
+@functools.lru_cache(maxsize=None)
+def get_policy_class():
+    """Plan change policy class from ``PLANS_CHANGE_POLICY``, resolved only once"""
     policy_class = getattr(
         settings,
         "PLANS_CHANGE_POLICY",
         "plans.plan_change.StandardPlanChangePolicy",
     )
-    return import_name(policy_class)()
+    return import_name(policy_class)
+
+
+def get_policy():
+    return get_policy_class()()
 
 
 def get_change_price(userplan, plan):
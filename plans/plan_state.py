@@ -0,0 +1,167 @@
+"""
+Cached plan state of users.
+
+``plans.context_processors.account_status`` and ``Plan.get_current_plan()``
+run on almost every request of a logged-in user. When
+``settings.PLANS_USER_PLAN_CACHE`` names a Django cache, they read a compact
+``PlanState`` record of the user plan from it instead of querying the user
+plan. Records are stored under a per-user generation, which
+``plans.listeners`` replaces whenever the user plan or its recurring payment
+is saved or deleted, so a record loaded before that is never read again.
+
+.. warning::
+
+    Writes that bypass model signals (``QuerySet.update()``, raw SQL) don't
+    invalidate the record. Call ``invalidate(user_ids)`` after such writes.
+"""
+
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from plans import catalog
+
+PLAN_STATE_CACHE_KEY = "plans_plan_state_%s_%s"
+PLAN_STATE_GENERATION_CACHE_KEY = "plans_plan_state_gen_%s"
+PLAN_STATE_CACHE_TIMEOUT = 600
+# Cached for users without a user plan
+NO_USER_PLAN = "no-user-plan"
+
+
+def get_cache():
+    """Returns the Django cache configured by ``PLANS_USER_PLAN_CACHE`` or None"""
+    alias = getattr(settings, "PLANS_USER_PLAN_CACHE", None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+class PlanState(namedtuple("PlanState", ["plan_id", "expire", "active", "recurring"])):
+    """
+    Plan state of a user, with the read-only API of ``UserPlan`` used on every
+    request. ``recurring`` tells if the account is renewed automatically.
+    """
+
+    __slots__ = ()
+
+    @property
+    def plan(self):
+        return catalog.get_plan(self.plan_id)
+
+    def is_active(self):
+        return self.active
+
+    def is_expired(self):
+        if self.expire is None:
+            return False
+        else:
+            return self.expire < localdate()
+
+    def days_left(self):
+        if self.expire is None:
+            return None
+        else:
+            return (self.expire - localdate()).days
+
+    def has_automatic_renewal(self):
+        return self.recurring
+
+
+def get_plan_state(user):
+    """
+    Returns the cached ``PlanState`` of the user, or None if the user has no
+    user plan.
+
+    The user plan itself is returned when it is already loaded on the user or
+    no cache is configured.
+    """
+    from plans.base.models import AbstractUserPlan
+
+    UserPlan = AbstractUserPlan.get_concrete_model()
+    cache = get_cache()
+    if cache is None or user._meta.model.userplan.is_cached(user):
+        try:
+            return user.userplan
+        except UserPlan.DoesNotExist:
+            return None
+
+    timeout = getattr(
+        settings, "PLANS_USER_PLAN_CACHE_TIMEOUT", PLAN_STATE_CACHE_TIMEOUT
+    )
+    key = PLAN_STATE_CACHE_KEY % (user.pk, _get_generation(cache, user.pk, timeout))
+    state = cache.get(key)
+    if state is None:
+        state = _load_plan_state(user.pk)
+        # Invalidated meanwhile, the state is added under an unused generation
+        cache.add(key, state, timeout)
+    if state == NO_USER_PLAN:
+        return None
+    return state
+
+
+def _get_generation(cache, user_pk, timeout):
+    """
+    Returns the current generation of the user's plan state. A missing one is
+    started anew, so states of an evicted generation are not read again.
+    """
+    key = PLAN_STATE_GENERATION_CACHE_KEY % user_pk
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid4().hex
+        if not cache.add(key, generation, timeout):
+            generation = cache.get(key) or generation
+    return generation
+
+
+def _load_plan_state(user_pk):
+    from plans.base.models import AbstractRecurringUserPlan, AbstractUserPlan
+
+    UserPlan = AbstractUserPlan.get_concrete_model()
+    RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
+    row = (
+        UserPlan.objects.filter(user_id=user_pk)
+        .values_list(
+            "plan_id",
+            "expire",
+            "active",
+            "recurring__renewal_triggered_by",
+            "recurring__token_verified",
+        )
+        .first()
+    )
+    if row is None:
+        return NO_USER_PLAN
+    plan_id, expire, active, renewal_triggered_by, token_verified = row
+    recurring = bool(
+        renewal_triggered_by is not None
+        and renewal_triggered_by != RecurringUserPlan.RENEWAL_TRIGGERED_BY.USER
+        and token_verified
+    )
+    return PlanState(plan_id, expire, active, recurring)
+
+
+def invalidate(user_ids, using=None):
+    """
+    Starts new generations of cached plan states of given users. Inside a
+    transaction they are started once more on commit, so that states read
+    before the commit are not served afterwards.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+    keys = [PLAN_STATE_GENERATION_CACHE_KEY % user_id for user_id in user_ids]
+    if not keys:
+        return
+    timeout = getattr(
+        settings, "PLANS_USER_PLAN_CACHE_TIMEOUT", PLAN_STATE_CACHE_TIMEOUT
+    )
+
+    def start_generations():
+        cache.set_many(dict.fromkeys(keys, uuid4().hex), timeout)
+
+    start_generations()
+    transaction.on_commit(start_generations, using=using)
@@ -1,8 +1,86 @@
+import contextvars
+
+from django.core.exceptions import ValidationError
+
+# ``RequestQuota`` of the request being processed, set by ``plans.middleware.QuotaMiddleware``
+_request_quota = contextvars.ContextVar("plans_request_quota", default=None)
+
+
+class RequestQuota(object):
+    """
+    Current plan and quota dict of ``request.user``, resolved at most once per
+    request. Available as ``request.plans_quota`` with ``QuotaMiddleware``.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._plan = None
+        self._error = None
+        self._quota_dict = None
+
+    def is_for(self, user):
+        request_user = self.request.user
+        if user is request_user:
+            return True
+        return (
+            user is not None
+            and user.is_authenticated
+            and request_user.is_authenticated
+            and user.pk == request_user.pk
+        )
+
+    @property
+    def plan(self):
+        """
+        Current plan of the user, see ``Plan.get_current_plan()``.
+
+        :raise: ValidationError if the user plan has expired
+        """
+        if self._plan is None and self._error is None:
+            from .base.models import AbstractPlan
+
+            Plan = AbstractPlan.get_concrete_model()
+            try:
+                self._plan = Plan.get_current_plan(self.request.user)
+            except ValidationError as e:
+                self._error = e
+        if self._error is not None:
+            raise self._error
+        return self._plan
+
+    @property
+    def quota_dict(self):
+        if self._quota_dict is None:
+            self._quota_dict = self.plan.get_quota_dict()
+        # Copy, so that callers can't change the quota of later checks
+        return dict(self._quota_dict)
+
+    def get(self, codename, default=None):
+        return self.quota_dict.get(codename, default)
+
+    def clear(self):
+        """Forgets the resolved plan, e.g. after the user plan has changed"""
+        self._plan = None
+        self._error = None
+        self._quota_dict = None
+
+
+def clear_request_quota():
+    """Forgets the plan resolved for the current request, if any"""
+    request_quota = _request_quota.get()
+    if request_quota is not None:
+        request_quota.clear()
+
+
 def get_user_quota(user):
     """
     Tiny helper for getting quota dict for user
     If user has expired plan, return default plan or None
     """
+    request_quota = _request_quota.get()
+    if request_quota is not None and request_quota.is_for(user):
+        return request_quota.quota_dict
+
     from .base.models import AbstractPlan
 
     Plan = AbstractPlan.get_concrete_model()
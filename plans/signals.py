@@ -35,6 +35,14 @@ it only means that account has expired due to plan expire date limit.
 sends arguments: 'user'
 """
 
+accounts_expired = Signal()
+accounts_expired.__doc__ = """
+Batched counterpart of ``account_expired``, sent once per chunk of accounts expired by
+``expire_account`` task in bulk mode (``account_expired`` is not sent in that mode).
+
+sends arguments: 'userplans'
+"""
+
 account_deactivated = Signal()
 account_deactivated.__doc__ = """
 Sent on account deactivation, account is not operational (it could be not expired, but does not meet quota limits).
@@ -42,6 +50,14 @@ Sent on account deactivation, account is not operational (it could be not expire
 sends arguments: 'user'
 """
 
+accounts_deactivated = Signal()
+accounts_deactivated.__doc__ = """
+Batched counterpart of ``account_deactivated``, sent once per chunk of accounts deactivated by
+``expire_account`` task in bulk mode (``account_deactivated`` is not sent in that mode).
+
+sends arguments: 'userplans'
+"""
+
 account_activated = Signal()
 account_activated.__doc__ = """
 Sent on account activation, account is now fully operational.
@@ -1,20 +1,47 @@
+import contextlib
 import datetime
+import itertools
 import logging
 import math
+import threading
 import time
 import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
 from django.core.mail import mail_admins
-from django.db.models import F, Q
+from django.db import connections, transaction
+from django.db.models import F, IntegerField, Q
+from django.db.models.functions import Mod
 from django.utils import timezone
 
-from .base.models import AbstractRecurringUserPlan
-from .signals import account_automatic_renewal
+from .base.models import AbstractRecurringUserPlan, AbstractUserPlan
+from .contrib import send_emails
+from .signals import (
+    account_automatic_renewal,
+    accounts_deactivated,
+    accounts_expired,
+)
 
 User = get_user_model()
 logger = logging.getLogger("plans.tasks")
+accounts_logger = logging.getLogger("accounts")
+
+RENEWAL_SUBMITTED = "submitted"
+RENEWAL_FAILED = "failed"
+RENEWAL_SKIPPED = "skipped"
+RENEWAL_DRY_RUN = "dry_run"
+
+RenewalRecord = namedtuple(
+    "RenewalRecord", ["user_pk", "provider", "expire", "outcome"]
+)
+RenewalRecord.__doc__ = """
+Outcome of one account's renewal, as yielded by ``iter_renewals``.
+``outcome`` is one of the ``RENEWAL_*`` constants.
+"""
 
 
 def get_active_plans():
@@ -67,10 +94,16 @@ def _claim_renewal_attempt(recurring):
     return claimed
 
 
-def autorenew_account(
-    providers=None, throttle_seconds=0, catch_exceptions=False, dry_run=False
-):
-    logger.info("Started automatic account renewal")
+def get_accounts_for_renewal(providers=None, shard=None):
+    """
+    Returns users whose plans are due for automatic renewal.
+
+    :param shard: ``(index, count)`` tuple; only users whose pk modulo
+        ``count`` equals ``index`` are returned. Requires an integer user pk.
+    :raise: ImproperlyConfigured if sharding users without an integer pk
+    """
+    if shard is not None:
+        _check_shardable()
     PLANS_AUTORENEW_SCHEDULE = getattr(settings, "PLANS_AUTORENEW_SCHEDULE", None)
     PLANS_AUTORENEW_BEFORE_DAYS = getattr(settings, "PLANS_AUTORENEW_BEFORE_DAYS", 0)
     PLANS_AUTORENEW_BEFORE_HOURS = getattr(settings, "PLANS_AUTORENEW_BEFORE_HOURS", 0)
@@ -134,7 +167,7 @@ def autorenew_account(
             "and will be removed in a future version. "
             "Please use PLANS_AUTORENEW_SCHEDULE instead.",
             DeprecationWarning,
-            stacklevel=2,
+            stacklevel=3,
         )
         accounts_for_renewal = accounts_to_check.filter(
             userplan__expire__lt=timezone.now()
@@ -148,6 +181,57 @@ def autorenew_account(
             userplan__recurring__payment_provider__in=providers
         )
 
+    if shard is not None:
+        index, count = shard
+        accounts_for_renewal = accounts_for_renewal.annotate(
+            renewal_shard=Mod("pk", count)
+        ).filter(renewal_shard=index)
+
+    return accounts_for_renewal
+
+
+def _check_shardable():
+    """Shards are computed in SQL as the user pk modulo the shard count."""
+    pk = User._meta.pk
+    if pk.is_relation:
+        pk = pk.target_field
+    if not isinstance(pk, IntegerField):
+        raise ImproperlyConfigured(
+            f"Renewal shards require an integer user pk, {User.__name__}.pk is "
+            f"{type(pk).__name__}"
+        )
+
+
+def _log_dry_run(user):
+    logger.info(f"DRY RUN: Would renew user {user.pk} ({user.email})")
+    if hasattr(user, "userplan") and not user.userplan.is_active():
+        logger.info(
+            f"DRY RUN: Would activate userplan for user {user.pk} ({user.email})"
+        )
+    logger.info(
+        f"DRY RUN: Would send account_automatic_renewal signal for user {user.pk} ({user.email})"
+    )
+
+
+def autorenew_account(
+    providers=None,
+    throttle_seconds=0,
+    catch_exceptions=False,
+    dry_run=False,
+    workers=1,
+    shard=None,
+):
+    """
+    Submits accounts due for renewal to ``account_automatic_renewal`` signal.
+
+    :param workers: number of threads sending the renewal signals concurrently
+    :param shard: ``(index, count)`` tuple; only accounts whose user pk modulo
+        ``count`` equals ``index`` are renewed, so that ``count`` processes can
+        split the renewals between themselves. Requires an integer user pk.
+    """
+    logger.info("Started automatic account renewal")
+    accounts_for_renewal = get_accounts_for_renewal(providers, shard)
+
     logger.info(f"{accounts_for_renewal.count()} accounts to be renewed.")
 
     accounts_for_renewal = accounts_for_renewal.all()
@@ -155,27 +239,67 @@ def autorenew_account(
     if dry_run:
         logger.info("Dry run mode: No changes will be made.")
         for user in accounts_for_renewal:
-            logger.info(f"DRY RUN: Would renew user {user.pk} ({user.email})")
-            if hasattr(user, "userplan") and not user.userplan.is_active():
-                logger.info(
-                    f"DRY RUN: Would activate userplan for user {user.pk} ({user.email})"
-                )
-            logger.info(
-                f"DRY RUN: Would send account_automatic_renewal signal for user {user.pk} ({user.email})"
-            )
+            _log_dry_run(user)
         return accounts_for_renewal
 
+    if workers > 1:
+        return _renew_accounts_in_parallel(
+            accounts_for_renewal, workers, throttle_seconds, catch_exceptions
+        )
+
     renewed_accounts = []
     for user in accounts_for_renewal:
-        if hasattr(user, "userplan") and hasattr(user.userplan, "recurring"):
-            if not _claim_renewal_attempt(user.userplan.recurring):
-                logger.info(
-                    f"Renewal of user {user.pk} already claimed by a concurrent "
-                    "run, skipping"
-                )
-                continue
-        if throttle_seconds:
-            time.sleep(throttle_seconds)
+        if _renew_account(user, throttle_seconds, catch_exceptions) != RENEWAL_SKIPPED:
+            renewed_accounts.append(user)
+    return renewed_accounts
+
+
+def iter_renewals(
+    providers=None,
+    throttle_seconds=0,
+    catch_exceptions=False,
+    dry_run=False,
+    shard=None,
+    chunk_size=1000,
+):
+    """
+    Streaming variant of ``autorenew_account``.
+
+    Candidates are fetched ``chunk_size`` at a time with keyset pagination,
+    so memory use doesn't grow with the number of renewals. Yields one
+    ``RenewalRecord`` per candidate instead of returning the users.
+    """
+    logger.info("Started automatic account renewal")
+    if dry_run:
+        logger.info("Dry run mode: No changes will be made.")
+    accounts_for_renewal = get_accounts_for_renewal(providers, shard)
+    for chunk in _iter_chunks(accounts_for_renewal, chunk_size):
+        for user in chunk:
+            if dry_run:
+                _log_dry_run(user)
+                outcome = RENEWAL_DRY_RUN
+            else:
+                outcome = _renew_account(user, throttle_seconds, catch_exceptions)
+            yield RenewalRecord(
+                user.pk,
+                user.userplan.recurring.payment_provider,
+                user.userplan.expire,
+                outcome,
+            )
+
+
+def _renew_account(user, throttle_seconds, catch_exceptions, semaphore=None):
+    """Claims and submits one account to renewal, returns the ``RENEWAL_*`` outcome."""
+    if hasattr(user, "userplan") and hasattr(user.userplan, "recurring"):
+        if not _claim_renewal_attempt(user.userplan.recurring):
+            logger.info(
+                f"Renewal of user {user.pk} already claimed by a concurrent "
+                "run, skipping"
+            )
+            return RENEWAL_SKIPPED
+    if throttle_seconds:
+        time.sleep(throttle_seconds)
+    with semaphore or contextlib.nullcontext():
         if catch_exceptions:
             try:
                 account_automatic_renewal.send(sender=None, user=user)
@@ -194,21 +318,168 @@ def autorenew_account(
                 {e}
                 """
                 mail_admins(subject, message, fail_silently=True)
+                return RENEWAL_FAILED
         else:
             account_automatic_renewal.send(sender=None, user=user)
-        renewed_accounts.append(user)
-    return renewed_accounts
+    return RENEWAL_SUBMITTED
 
 
-def expire_account():
-    logger.info("Started account expiration")
+def _renew_accounts_in_thread(
+    next_account,
+    outcomes,
+    failed,
+    throttle_seconds,
+    catch_exceptions,
+    semaphores,
+):
+    """
+    Worker loop of ``_renew_accounts_in_parallel``: takes accounts one by one
+    until all are taken or another worker has failed, and stores their outcomes.
+    """
+    try:
+        while not failed.is_set():
+            taken = next_account()
+            if taken is None:
+                return
+            index, user = taken
+            outcomes[index] = user, _renew_account(
+                user,
+                throttle_seconds,
+                catch_exceptions,
+                semaphores.get(user.userplan.recurring.payment_provider),
+            )
+    except BaseException:
+        # Accounts not taken yet stay unclaimed for the next run
+        failed.set()
+        raise
+    finally:
+        # Worker threads open their own database connections, closed once the
+        # thread is done
+        connections.close_all()
+
+
+def _renew_accounts_in_parallel(
+    accounts_for_renewal, workers, throttle_seconds, catch_exceptions, chunk_size=1000
+):
+    """
+    Submits accounts to renewal from a pool of ``workers`` threads.
 
-    expired_accounts = get_active_plans().filter(
-        userplan__expire__lt=timezone.localdate()
+    Candidates are fetched ``chunk_size`` at a time with keyset pagination by
+    whichever worker runs out of accounts first, so memory use doesn't grow
+    with the number of candidates. Every account is still claimed by
+    ``_claim_renewal_attempt`` right before its renewal, so overlapping runs
+    and shards never charge it twice. Accounts of providers listed in
+    ``PLANS_AUTORENEW_PROVIDER_CONCURRENCY`` are renewed by at most that many
+    threads at once.
+    """
+    provider_limits = getattr(settings, "PLANS_AUTORENEW_PROVIDER_CONCURRENCY", {})
+    semaphores = {
+        provider: threading.BoundedSemaphore(limit)
+        for provider, limit in provider_limits.items()
+    }
+    accounts = enumerate(
+        itertools.chain.from_iterable(_iter_chunks(accounts_for_renewal, chunk_size))
     )
+    # ``(user, outcome)`` of taken accounts by their position among candidates
+    outcomes = {}
+    lock = threading.Lock()
 
-    for user in expired_accounts.all():
-        user.userplan.expire_account()
+    def next_account():
+        with lock:
+            return next(accounts, None)
+
+    failed = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _renew_accounts_in_thread,
+                next_account,
+                outcomes,
+                failed,
+                throttle_seconds,
+                catch_exceptions,
+                semaphores,
+            )
+            for _ in range(workers)
+        ]
+    for future in futures:
+        future.result()
+    return [
+        user
+        for _, (user, outcome) in sorted(outcomes.items())
+        if outcome != RENEWAL_SKIPPED
+    ]
+
+
+def _iter_chunks(queryset, chunk_size):
+    """Walks ``queryset`` with keyset pagination on pk, yielding lists of at most ``chunk_size`` objects."""
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def _expire_accounts_in_bulk(chunk_size):
+    """Deactivates expired accounts with one UPDATE per chunk instead of one per account."""
+    UserPlan = AbstractUserPlan.get_concrete_model()
+    today = timezone.localdate()
+    expired_userplans = UserPlan.objects.filter(active=True, expire__lt=today)
+    expired_count = 0
+    for chunk in _iter_chunks(expired_userplans.only("pk"), chunk_size):
+        with transaction.atomic():
+            # Lock the chunk, so that only accounts which are still expired are
+            # deactivated and notified (e.g. not the ones renewed in the meantime)
+            userplans = list(
+                expired_userplans.filter(pk__in=[u.pk for u in chunk])
+                .order_by("pk")
+                .select_for_update()
+                .prefetch_related("user")
+            )
+            UserPlan.objects.filter(pk__in=[u.pk for u in userplans]).update(
+                active=False, updated_at=timezone.now()
+            )
+        if not userplans:
+            continue
+        for userplan in userplans:
+            userplan.active = False
+        expired_count += len(userplans)
+        accounts_logger.info(
+            "%d accounts have expired: %s"
+            % (len(userplans), ", ".join(str(u.user.pk) for u in userplans))
+        )
+        send_emails(userplan.get_expired_account_email() for userplan in userplans)
+        accounts_deactivated.send(sender=UserPlan, userplans=userplans)
+        accounts_expired.send(sender=UserPlan, userplans=userplans)
+    return expired_count
+
+
+def expire_account(bulk=False, chunk_size=1000):
+    """
+    Expires accounts after their expiration date and sends expiration reminders.
+
+    :param bulk: deactivate accounts in chunks, with one UPDATE and one batch of
+        e-mails per chunk. ``accounts_deactivated`` and ``accounts_expired``
+        signals are sent per chunk instead of per-account ``account_deactivated``
+        and ``account_expired``.
+    :param chunk_size: number of accounts processed at once in bulk mode
+    """
+    logger.info("Started account expiration")
+
+    if bulk:
+        expired_count = _expire_accounts_in_bulk(chunk_size)
+        logger.info(f"{expired_count} accounts expired.")
+    else:
+        expired_accounts = get_active_plans().filter(
+            userplan__expire__lt=timezone.localdate()
+        )
+
+        for user in expired_accounts.all():
+            user.userplan.expire_account()
 
     notifications_days_before = getattr(settings, "PLANS_EXPIRATION_REMIND", [])
 
@@ -217,7 +488,12 @@ def expire_account():
             lambda x: timezone.localdate() + datetime.timedelta(days=x),
             notifications_days_before,
         )
-        for user in User.objects.select_related("userplan").filter(
+        users_to_remind = User.objects.select_related("userplan").filter(
             userplan__active=True, userplan__expire__in=days
-        ):
-            user.userplan.remind_expire_soon()
+        )
+        if bulk:
+            for chunk in _iter_chunks(users_to_remind, chunk_size):
+                send_emails(user.userplan.get_remind_expire_email() for user in chunk)
+        else:
+            for user in users_to_remind:
+                user.userplan.remind_expire_soon()
@@ -0,0 +1,131 @@
+"""
+Circuit breaker for the remote services used by ``EUTaxationPolicy``.
+
+When TEDB or VIES is down, every request would wait for the full timeout of
+the remote call before falling back. A ``CircuitBreaker`` counts failures of
+a service and once there are ``PLANS_CIRCUIT_BREAKER_THRESHOLD`` of them
+within ``PLANS_CIRCUIT_BREAKER_RESET_TIMEOUT`` seconds it opens: callers skip
+the service and use their fallback right away. After the reset timeout the
+breaker is half-open and lets a single trial call through; its success closes
+the breaker, its failure opens it again.
+
+The state is kept in the Django cache named by ``PLANS_CIRCUIT_BREAKER_CACHE``
+so that all workers share it.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger("plans.taxation.circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60
+FAILURES_CACHE_KEY = "plans_circuit_%s_failures"
+OPENED_AT_CACHE_KEY = "plans_circuit_%s_opened_at"
+TRIAL_CACHE_KEY = "plans_circuit_%s_trial"
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self.failures_key = FAILURES_CACHE_KEY % name
+        self.opened_at_key = OPENED_AT_CACHE_KEY % name
+        self.trial_key = TRIAL_CACHE_KEY % name
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "PLANS_CIRCUIT_BREAKER_CACHE", "default")]
+
+    @property
+    def threshold(self):
+        return getattr(settings, "PLANS_CIRCUIT_BREAKER_THRESHOLD", DEFAULT_THRESHOLD)
+
+    @property
+    def reset_timeout(self):
+        return getattr(
+            settings, "PLANS_CIRCUIT_BREAKER_RESET_TIMEOUT", DEFAULT_RESET_TIMEOUT
+        )
+
+    def _get_state(self, opened_at):
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    @property
+    def state(self):
+        return self._get_state(self.cache.get(self.opened_at_key))
+
+    def get_status(self):
+        """Returns a dict describing the breaker, e.g. for monitoring"""
+        values = self.cache.get_many([self.failures_key, self.opened_at_key])
+        opened_at = values.get(self.opened_at_key)
+        return {
+            "name": self.name,
+            "state": self._get_state(opened_at),
+            "failures": values.get(self.failures_key, 0),
+            "opened_at": opened_at,
+        }
+
+    def allow_request(self):
+        """
+        Tells if the service should be called. In the half-open state only
+        one caller (across all workers) gets True until it records the result.
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        return self.cache.add(self.trial_key, True, self.reset_timeout)
+
+    def record_success(self):
+        values = self.cache.get_many([self.failures_key, self.opened_at_key])
+        if values:
+            self.cache.delete_many(
+                [self.failures_key, self.opened_at_key, self.trial_key]
+            )
+            if self.opened_at_key in values:
+                logger.info("Circuit breaker %s closed" % self.name)
+
+    def record_failure(self):
+        if self.cache.get(self.opened_at_key) is not None:
+            # The half-open trial failed
+            self._open()
+            return
+        self.cache.add(self.failures_key, 0, self.reset_timeout)
+        try:
+            failures = self.cache.incr(self.failures_key)
+        except ValueError:
+            # The counter has just expired
+            failures = 1
+            self.cache.set(self.failures_key, failures, self.reset_timeout)
+        if failures >= self.threshold:
+            self._open()
+
+    def _open(self):
+        self.cache.set(self.opened_at_key, time.time(), None)
+        self.cache.delete_many([self.failures_key, self.trial_key])
+        logger.warning(
+            "Circuit breaker %s opened for %s seconds" % (self.name, self.reset_timeout)
+        )
+
+    def reset(self):
+        self.cache.delete_many([self.failures_key, self.opened_at_key, self.trial_key])
+
+
+tedb = CircuitBreaker("tedb")
+vies = CircuitBreaker("vies")
+
+
+def get_status():
+    """Returns status of the TEDB and VIES circuit breakers"""
+    return {breaker.name: breaker.get_status() for breaker in (tedb, vies)}
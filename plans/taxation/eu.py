@@ -1,16 +1,14 @@
 import logging
+import threading
 from decimal import Decimal
-from urllib.error import URLError
-from xml.sax import SAXParseException
 
-import stdnum.eu.vat
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.html import format_html
 from requests.exceptions import ConnectionError, Timeout
 from zeep.exceptions import Fault, TransportError, XMLSyntaxError
 
-from plans.taxation import TaxationPolicy
+from plans.taxation import TaxationPolicy, circuit_breaker, vies
 from plans.taxation.tedb_client import TEDBClient
 from plans.utils import country_code_transform
 
@@ -79,6 +77,31 @@ class EUTaxationPolicy(TaxationPolicy):
             cls._tedb_client = TEDBClient()
         return cls._tedb_client
 
+    @classmethod
+    def get_service_status(cls):
+        """
+        Returns states of the TEDB and VIES circuit breakers, e.g. for a health check::
+
+            {"tedb": {"name": "tedb", "state": "open", "failures": 0, "opened_at": 1767268800.0},
+             "vies": {"name": "vies", "state": "closed", "failures": 2, "opened_at": None}}
+        """
+        return circuit_breaker.get_status()
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Initialize the TEDB client in a background thread, so that the first
+        tax calculation of a process doesn't wait for the WSDL to load.
+        """
+        tedb_client = cls._get_tedb_client()
+        thread = threading.Thread(
+            target=lambda: tedb_client.client,
+            name="plans-tedb-warm-up",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
     @classmethod
     def _get_vat_rate_from_tedb(cls, country_code):
         """
@@ -164,8 +187,7 @@ class EUTaxationPolicy(TaxationPolicy):
             if cls.is_in_EU(country_code):
                 # Company is from other EU country
                 try:
-                    vies_result = bool(stdnum.eu.vat.check_vies(tax_id)["valid"])
-                    logger.info("TAX_ID=%s RESULT=%s" % (tax_id, vies_result))
+                    vies_result = vies.validate_vat_id(tax_id)
                     if tax_id and vies_result:
                         # Company is registered in VIES
                         # Charge back
@@ -175,16 +197,7 @@ class EUTaxationPolicy(TaxationPolicy):
                         if rate is not None:
                             return rate, True
                         return cls.EU_COUNTRIES_VAT[country_code], True
-                except (
-                    Fault,
-                    TransportError,
-                    XMLSyntaxError,
-                    stdnum.exceptions.InvalidComponent,
-                    ConnectionError,
-                    URLError,
-                    SAXParseException,
-                    TimeoutError,
-                ) as e:
+                except vies.VIESError as e:
                     # If we could not connect to VIES or the VAT ID is incorrect
                     if request:
                         messages.warning(
@@ -1,12 +1,20 @@
 import logging
+import threading
+import time
+from collections import Counter, defaultdict
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Dict, Optional
 
+from django.conf import settings
 from django.core.cache import cache
 from requests.exceptions import ConnectionError, Timeout
 from zeep import Client
+from zeep.cache import SqliteCache
 from zeep.exceptions import Fault, TransportError, XMLSyntaxError
+from zeep.transports import Transport
+
+from plans.taxation import circuit_breaker
 
 logger = logging.getLogger("plans.taxation.tedb")
 
@@ -15,22 +23,76 @@ class TEDBClient:
     """
     Client for European Commission's TEDB SOAP web service.
     Provides real-time VAT rates with caching and fallback mechanisms.
+
+    The SOAP client is created on first use, i.e. when a rate is not cached,
+    because loading the WSDL needs a request to ec.europa.eu.
+
+    Failed lookups (no standard rate for the country, service error) are cached
+    too, for ``NEGATIVE_CACHE_TIMEOUT``. ``stats`` counts cache hits, misses
+    and hits of cached failures.
     """
 
     WSDL_URL = "https://ec.europa.eu/taxation_customs/tedb/ws/VatRetrievalService.wsdl"
     CACHE_TIMEOUT = 3600 * 24  # 24 hours
+    NEGATIVE_CACHE_TIMEOUT = 60 * 5  # 5 minutes
     CACHE_KEY_PREFIX = "tedb_vat_rate"
+    INIT_RETRY_INTERVAL = 60 * 10  # 10 minutes
+    # Cached instead of a rate when TEDB didn't return any
+    NO_RATE = "no-rate"
 
     def __init__(self):
-        self.client = None
-        self._initialize_client()
+        self._client = None
+        self._initialized_at = None
+        self._lock = threading.Lock()
+        self.stats = Counter(hits=0, misses=0, negative_hits=0)
+
+    @property
+    def client(self):
+        """SOAP client, ``None`` if it could not be initialized."""
+        if self._needs_initialization():
+            with self._lock:
+                if self._needs_initialization():
+                    self._initialize_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+        self._initialized_at = time.monotonic()
+
+    def _needs_initialization(self):
+        if self._initialized_at is None:
+            return True
+        # Retry a failed initialization once in a while, not on every cache miss
+        return (
+            self._client is None
+            and time.monotonic() - self._initialized_at > self.INIT_RETRY_INTERVAL
+        )
+
+    def get_wsdl(self) -> str:
+        """URL or local path of the WSDL, e.g. of a copy shipped with the project."""
+        return getattr(settings, "PLANS_TEDB_WSDL", self.WSDL_URL)
+
+    def get_transport(self) -> Optional[Transport]:
+        """Transport caching the WSDL in the file given by ``PLANS_TEDB_WSDL_CACHE``."""
+        path = getattr(settings, "PLANS_TEDB_WSDL_CACHE", None)
+        if path is None:
+            return None
+        return Transport(cache=SqliteCache(path=path, timeout=self.CACHE_TIMEOUT))
 
     def _initialize_client(self):
         """Initialize SOAP client with error handling."""
         try:
-            self.client = Client(self.WSDL_URL)
+            self.client = Client(self.get_wsdl(), transport=self.get_transport())
             logger.info("TEDB SOAP client initialized successfully")
-        except (ConnectionError, Timeout, TransportError, Fault, XMLSyntaxError) as e:
+        except (
+            ConnectionError,
+            Timeout,
+            TransportError,
+            Fault,
+            XMLSyntaxError,
+            OSError,  # unreadable local WSDL or cache file
+        ) as e:
             logger.error(f"Failed to initialize TEDB SOAP client: {e}")
             self.client = None
 
@@ -55,11 +117,21 @@ class TEDBClient:
         # Check cache first
         cache_key = self._get_cache_key(country_code, date)
         cached_rate = cache.get(cache_key)
+        if cached_rate == self.NO_RATE:
+            self.stats["negative_hits"] += 1
+            logger.debug(f"TEDB recently failed to return VAT rate for {country_code}")
+            return None
         if cached_rate is not None:
+            self.stats["hits"] += 1
             logger.debug(f"Retrieved cached VAT rate for {country_code}: {cached_rate}")
             return cached_rate
+        self.stats["misses"] += 1
+
+        # Try TEDB service, unless it has been failing lately
+        if not circuit_breaker.tedb.allow_request():
+            logger.warning(f"TEDB circuit breaker is open, skipping {country_code}")
+            return None
 
-        # Try TEDB service
         if self.client:
             try:
                 logger.info(f"Retrieving VAT rate from TEDB for {country_code}")
@@ -67,66 +139,114 @@ class TEDBClient:
                 response = self.client.service.retrieveVatRates(
                     memberStates={"isoCode": [country_code]}, situationOn=date
                 )
-
-                if hasattr(response, "vatRateResults") and response.vatRateResults:
-                    # Collect all standard/default VAT rates
-                    # Some countries have multiple rates (e.g., Spain has Canary Islands)
-                    standard_rates = []
-
-                    for vat_rate in response.vatRateResults:
-                        if (
-                            hasattr(vat_rate, "memberState")
-                            and vat_rate.memberState == country_code
-                            and hasattr(vat_rate, "rate")
-                            and hasattr(vat_rate, "type")
-                            and vat_rate.type == "STANDARD"
-                        ):
-                            rate_info = vat_rate.rate
-                            if hasattr(rate_info, "value") and hasattr(
-                                rate_info, "type"
-                            ):
-                                if rate_info.type == "DEFAULT":
-                                    # Store rate with metadata for filtering
-                                    comment = (
-                                        vat_rate.comment
-                                        if hasattr(vat_rate, "comment")
-                                        else None
-                                    )
-                                    standard_rates.append(
-                                        {"value": rate_info.value, "comment": comment}
-                                    )
-
-                    if standard_rates:
-                        # Prefer rate without comment (general/mainland rate)
-                        # Filter out special regions (e.g., Canary Islands)
-                        general_rates = [r for r in standard_rates if not r["comment"]]
-
-                        if general_rates:
-                            # Use the general rate
-                            selected_rate = general_rates[0]["value"]
-                        else:
-                            # If all have comments, use the highest rate
-                            selected_rate = max(r["value"] for r in standard_rates)
-                            logger.warning(
-                                f"Multiple regional rates for {country_code}, using highest: {selected_rate}%"
-                            )
-
-                        # Convert to Decimal and normalize
-                        raw_decimal = Decimal(str(selected_rate))
-                        rate = (
-                            raw_decimal.quantize(Decimal("1"))
-                            if raw_decimal % 1 == 0
-                            else raw_decimal
-                        )
-
-                        # Cache the result
-                        cache.set(cache_key, rate, self.CACHE_TIMEOUT)
-                        logger.info(
-                            f"Retrieved standard VAT rate from TEDB for {country_code}: {rate}%"
-                        )
-                        return rate
             except (Fault, TransportError, ConnectionError, Timeout) as e:
+                circuit_breaker.tedb.record_failure()
                 logger.warning(f"TEDB service error for {country_code}: {e}")
+            else:
+                circuit_breaker.tedb.record_success()
+                rate = self._parse_vat_rates(response).get(country_code)
+                if rate is not None:
+                    # Cache the result
+                    cache.set(cache_key, rate, self.CACHE_TIMEOUT)
+                    logger.info(
+                        f"Retrieved standard VAT rate from TEDB for {country_code}: {rate}%"
+                    )
+                    return rate
+            # Don't ask TEDB again for a while
+            cache.set(cache_key, self.NO_RATE, self.NEGATIVE_CACHE_TIMEOUT)
 
         logger.warning(f"Could not retrieve VAT rate from TEDB for {country_code}")
         return None
+
+    def prefetch_all(self, date=None) -> Dict[str, Decimal]:
+        """
+        Retrieve standard VAT rates of all EU member states with a single request and cache them,
+        so that no customer request has to wait for TEDB when the cached rates expire.
+
+        Args:
+            date: ``datetime.date`` the rates are valid on, today by default
+
+        Returns:
+            Dict of country code to Decimal VAT rate, empty on error
+        """
+        from plans.taxation.eu import EUTaxationPolicy
+
+        date = (date or datetime.now()).strftime("%Y-%m-%d")
+        if not self.client:
+            logger.warning("TEDB SOAP client is not available, rates not prefetched")
+            return {}
+
+        # Called by scheduled jobs, so it tries TEDB even if the circuit breaker is open
+        try:
+            response = self.client.service.retrieveVatRates(
+                memberStates={"isoCode": list(EUTaxationPolicy.EU_COUNTRIES_VAT)},
+                situationOn=date,
+            )
+        except (Fault, TransportError, ConnectionError, Timeout) as e:
+            circuit_breaker.tedb.record_failure()
+            logger.warning(f"TEDB service error while prefetching VAT rates: {e}")
+            return {}
+        circuit_breaker.tedb.record_success()
+
+        rates = self._parse_vat_rates(response)
+        cache.set_many(
+            {
+                self._get_cache_key(country_code, date): rate
+                for country_code, rate in rates.items()
+            },
+            self.CACHE_TIMEOUT,
+        )
+        logger.info(f"Prefetched VAT rates from TEDB for {len(rates)} countries")
+        return rates
+
+    def _parse_vat_rates(self, response) -> Dict[str, Decimal]:
+        """Parse standard VAT rates of all countries in a ``retrieveVatRates`` response."""
+        if not (hasattr(response, "vatRateResults") and response.vatRateResults):
+            return {}
+
+        # Collect all standard/default VAT rates
+        # Some countries have multiple rates (e.g., Spain has Canary Islands)
+        standard_rates = defaultdict(list)
+        for vat_rate in response.vatRateResults:
+            if (
+                hasattr(vat_rate, "memberState")
+                and hasattr(vat_rate, "rate")
+                and hasattr(vat_rate, "type")
+                and vat_rate.type == "STANDARD"
+            ):
+                rate_info = vat_rate.rate
+                if hasattr(rate_info, "value") and hasattr(rate_info, "type"):
+                    if rate_info.type == "DEFAULT":
+                        # Store rate with metadata for filtering
+                        comment = (
+                            vat_rate.comment if hasattr(vat_rate, "comment") else None
+                        )
+                        standard_rates[vat_rate.memberState].append(
+                            {"value": rate_info.value, "comment": comment}
+                        )
+
+        return {
+            country_code: self._select_rate(country_code, rates)
+            for country_code, rates in standard_rates.items()
+        }
+
+    def _select_rate(self, country_code: str, standard_rates) -> Decimal:
+        # Prefer rate without comment (general/mainland rate)
+        # Filter out special regions (e.g., Canary Islands)
+        general_rates = [r for r in standard_rates if not r["comment"]]
+
+        if general_rates:
+            # Use the general rate
+            selected_rate = general_rates[0]["value"]
+        else:
+            # If all have comments, use the highest rate
+            selected_rate = max(r["value"] for r in standard_rates)
+            logger.warning(
+                f"Multiple regional rates for {country_code}, using highest: {selected_rate}%"
+            )
+
+        # Convert to Decimal and normalize
+        raw_decimal = Decimal(str(selected_rate))
+        return (
+            raw_decimal.quantize(Decimal("1")) if raw_decimal % 1 == 0 else raw_decimal
+        )
@@ -0,0 +1,169 @@
+"""
+Validation of EU VAT IDs in VIES with a result cache.
+
+VIES is slow and renewals check the same VAT IDs every cycle, so results can be
+cached in a Django cache named by ``settings.PLANS_VIES_CACHE``, with separate
+timeouts for valid, invalid and failed checks (``PLANS_VIES_CACHE_TIMEOUTS``).
+Checks are done by a backend given by ``settings.PLANS_VIES_BACKEND`` - a
+function taking a VAT ID and returning a bool - so that tests and local
+development can use a stub instead of the remote service. While the VIES
+circuit breaker is open, uncached VAT IDs are not checked at all.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from xml.sax import SAXParseException
+
+import stdnum.eu.vat
+from django.conf import settings
+from django.core.cache import caches
+from requests.exceptions import ConnectionError
+from zeep.exceptions import Fault, TransportError, XMLSyntaxError
+
+from plans.importer import import_name
+from plans.taxation import circuit_breaker
+
+logger = logging.getLogger("plans.taxation.eu.vies")
+
+VALID = "valid"
+INVALID = "invalid"
+ERROR = "error"
+# The check was skipped because the circuit breaker is open, never cached
+UNAVAILABLE = "unavailable"
+
+DEFAULT_CACHE_TIMEOUTS = {
+    VALID: 60 * 60 * 24 * 7,
+    INVALID: 60 * 60 * 24,
+    ERROR: 60 * 5,
+}
+CACHE_KEY = "plans_vies_%s"
+
+# Errors of the VIES service (or an unparseable VAT ID) making a check inconclusive
+VIES_ERRORS = (
+    Fault,
+    TransportError,
+    XMLSyntaxError,
+    stdnum.exceptions.InvalidComponent,
+    ConnectionError,
+    URLError,
+    SAXParseException,
+    TimeoutError,
+)
+
+
+class VIESError(Exception):
+    """VIES could not tell if a VAT ID is valid"""
+
+
+def check_vies(vat_id):
+    """Default backend, checks the VAT ID against the VIES service"""
+    return bool(stdnum.eu.vat.check_vies(vat_id)["valid"])
+
+
+def get_backend():
+    return import_name(
+        getattr(settings, "PLANS_VIES_BACKEND", "plans.taxation.vies.check_vies")
+    )
+
+
+def get_cache():
+    """Returns the Django cache configured by ``PLANS_VIES_CACHE`` or None"""
+    alias = getattr(settings, "PLANS_VIES_CACHE", None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def get_cache_timeout(status):
+    timeouts = dict(DEFAULT_CACHE_TIMEOUTS)
+    timeouts.update(getattr(settings, "PLANS_VIES_CACHE_TIMEOUTS", {}))
+    return timeouts[status]
+
+
+def normalize_vat_id(vat_id):
+    try:
+        return stdnum.eu.vat.compact(vat_id)
+    except stdnum.exceptions.ValidationError:
+        # Unknown country prefix, the backend will reject the VAT ID
+        return "".join(vat_id.split()).upper()
+
+
+def _check(vat_id):
+    """Returns ``(status, error message)`` of a VIES check"""
+    if not circuit_breaker.vies.allow_request():
+        return UNAVAILABLE, "VIES circuit breaker is open"
+    try:
+        valid = get_backend()(vat_id)
+    except VIES_ERRORS as e:
+        logger.warning("TAX_ID=%s ERROR=%s" % (vat_id, e))
+        if not isinstance(e, stdnum.exceptions.ValidationError):
+            circuit_breaker.vies.record_failure()
+        return ERROR, str(e)
+    circuit_breaker.vies.record_success()
+    logger.info("TAX_ID=%s RESULT=%s" % (vat_id, valid))
+    return (VALID if valid else INVALID), None
+
+
+def _to_result(status, error):
+    if status in (ERROR, UNAVAILABLE):
+        return VIESError(error)
+    return status == VALID
+
+
+def validate_vat_ids(vat_ids, max_workers=8):
+    """
+    Validates many VAT IDs at once.
+
+    VAT IDs are normalized and deduplicated, cached results are read with
+    a single cache call and the rest are checked concurrently.
+
+    :return: dict mapping each given VAT ID to True, False or ``VIESError``
+        if VIES could not validate it
+    """
+    normalized = {vat_id: normalize_vat_id(vat_id) for vat_id in vat_ids}
+    unique_ids = set(normalized.values())
+    cache = get_cache()
+    results = {}
+    if cache is not None and unique_ids:
+        cached = cache.get_many([CACHE_KEY % vat_id for vat_id in unique_ids])
+        for vat_id in unique_ids:
+            if CACHE_KEY % vat_id in cached:
+                results[vat_id] = cached[CACHE_KEY % vat_id]
+
+    missing = [vat_id for vat_id in unique_ids if vat_id not in results]
+    if len(missing) == 1:
+        checked = {missing[0]: _check(missing[0])}
+    elif missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            checked = dict(zip(missing, pool.map(_check, missing)))
+    else:
+        checked = {}
+    if checked:
+        results.update(checked)
+        if cache is not None:
+            for status in (VALID, INVALID, ERROR):
+                to_cache = {
+                    CACHE_KEY % vat_id: result
+                    for vat_id, result in checked.items()
+                    if result[0] == status
+                }
+                if to_cache:
+                    cache.set_many(to_cache, get_cache_timeout(status))
+
+    return {
+        vat_id: _to_result(*results[normalized_id])
+        for vat_id, normalized_id in normalized.items()
+    }
+
+
+def validate_vat_id(vat_id):
+    """
+    Tells if a VAT ID is valid according to VIES.
+
+    :raise: VIESError if VIES could not validate it
+    """
+    result = validate_vat_ids([vat_id])[vat_id]
+    if isinstance(result, VIESError):
+        raise result
+    return result
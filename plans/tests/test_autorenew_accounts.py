@@ -2,7 +2,7 @@ import datetime
 from decimal import Decimal
 from io import StringIO
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 from model_bakery import baker
 
@@ -93,6 +93,47 @@ class ManagementCommandTests(TestCase):
             "No accounts autorenewed\n",
         )
 
+    def test_renewal_shards(self):
+        user = _make_user(
+            userplan__expire=datetime.date(2020, 1, 2),
+            userplan__recurring__renewal_triggered_by=AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+            userplan__recurring__token_verified=True,
+        )
+        renewed = []
+        for index in range(3):
+            out = StringIO()
+            with self.assertWarns(DeprecationWarning):
+                call_command("autorenew_accounts", shard=f"{index}/3", stdout=out)
+            if "1 accounts submitted to renewal" in out.getvalue():
+                renewed.append(index)
+        self.assertEqual(renewed, [user.pk % 3])
+
+    def test_renewal_stream(self):
+        user = _make_user(
+            userplan__expire=datetime.date(2020, 1, 2),
+            userplan__recurring__renewal_triggered_by=AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+            userplan__recurring__token_verified=True,
+        )
+        out = StringIO()
+        with self.assertWarns(DeprecationWarning):
+            call_command("autorenew_accounts", stream=True, chunk_size=10, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Starting renewal\n"
+            "Started automatic account renewal\n"
+            f"\tinternal-payment-recurring    {user.pk:<40}2020-01-02\tsubmitted\n"
+            "Accounts processed: 1 submitted\n",
+        )
+
+    def test_invalid_shard(self):
+        for shard in ("1", "a/2", "2/2", "-1/2"):
+            with self.assertRaises(CommandError):
+                call_command("autorenew_accounts", shard=shard, stdout=StringIO())
+
+    def test_invalid_workers(self):
+        with self.assertRaises(CommandError):
+            call_command("autorenew_accounts", workers=0, stdout=StringIO())
+
 
 def _make_user(
     userplan__expire,
@@ -114,3 +155,4 @@ def _make_user(
         recurring__token_verified=userplan__recurring__token_verified,
         expire=userplan__expire,
     )
+    return user
@@ -0,0 +1,196 @@
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+from example.foo.models import Foo
+from model_bakery import baker
+
+from plans import catalog
+from plans.models import Plan
+from plans.validators import (
+    ModelCountValidator,
+    QuotaValidator,
+    bulk_plan_validation,
+    plan_validation,
+)
+
+
+class MaxFoosValidator(ModelCountValidator):
+    code = "MAX_FOO_COUNT"
+    model = Foo
+
+    def get_queryset(self, user):
+        return super().get_queryset(user).filter(user=user)
+
+    def get_bulk_queryset(self, user_ids):
+        return super().get_bulk_queryset(user_ids)
+
+
+class MaxFoosCounterValidator(MaxFoosValidator):
+    use_counter = True
+
+
+class MaxUnnamedFoosValidator(ModelCountValidator):
+    code = "MAX_FOO_COUNT"
+    model = Foo
+
+    def get_queryset(self, user):
+        return super().get_queryset(user).filter(user=user, name="")
+
+
+class MaxPlansValidator(ModelCountValidator):
+    code = "MAX_FOO_COUNT"
+    model = Plan
+
+
+class NoFooNamedBarValidator(QuotaValidator):
+    code = "NO_BAR"
+
+    def __call__(self, user, quota_dict=None, **kwargs):
+        quota = self.get_quota_value(user, quota_dict)
+        if quota is not None and Foo.objects.filter(user=user, name="bar").exists():
+            raise ValidationError("Bar is not allowed")
+
+
+max_foos_validator = MaxFoosValidator()
+max_foos_counter_validator = MaxFoosCounterValidator()
+max_unnamed_foos_validator = MaxUnnamedFoosValidator()
+max_plans_validator = MaxPlansValidator()
+no_foo_named_bar_validator = NoFooNamedBarValidator()
+
+
+@override_settings(
+    PLANS_VALIDATORS={
+        "MAX_FOO_COUNT": "plans.tests.test_bulk_validation.max_foos_validator",
+        "NO_BAR": "plans.tests.test_bulk_validation.no_foo_named_bar_validator",
+    }
+)
+class BulkPlanValidationTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.small_plan = baker.make("Plan")
+            self.big_plan = baker.make("Plan")
+            max_foo_count = baker.make("Quota", codename="MAX_FOO_COUNT")
+            for plan, value in ((self.small_plan, 1), (self.big_plan, 3)):
+                baker.make("PlanQuota", plan=plan, quota=max_foo_count, value=value)
+            baker.make("PlanQuota", plan=self.small_plan, quota__codename="NO_BAR")
+
+        self.users = []
+        for plan, foo_count in (
+            (self.small_plan, 0),
+            (self.small_plan, 1),
+            (self.small_plan, 2),
+            (self.big_plan, 2),
+            (self.big_plan, 4),
+        ):
+            user = baker.make("User")
+            baker.make("UserPlan", user=user, plan=plan)
+            for _ in range(foo_count):
+                baker.make(Foo, user=user)
+            self.users.append(user)
+        baker.make(Foo, user=self.users[0], name="bar")
+
+    def test_violations(self):
+        violations = bulk_plan_validation(self.users)
+
+        self.assertEqual(
+            violations,
+            {
+                self.users[0].pk: {"NO_BAR": None},
+                self.users[2].pk: {"MAX_FOO_COUNT": 2},
+                self.users[4].pk: {"MAX_FOO_COUNT": 4},
+            },
+        )
+
+    def test_matches_plan_validation(self):
+        violations = bulk_plan_validation(self.users)
+
+        for user in self.users:
+            errors = plan_validation(user)
+            self.assertEqual(
+                user.pk in violations, bool(errors["required_to_activate"])
+            )
+
+    def test_given_plan(self):
+        violations = bulk_plan_validation(self.users, plan=self.big_plan)
+
+        self.assertEqual(violations, {self.users[4].pk: {"MAX_FOO_COUNT": 4}})
+
+    def test_grouped_queries(self):
+        catalog.get_quota_dict(self.small_plan.pk)
+        catalog.get_quota_dict(self.big_plan.pk)
+
+        # Plans of the chunk, grouped count, one query per user of the non-count
+        # validator's plan
+        with self.assertNumQueries(2 + 3):
+            bulk_plan_validation(self.users)
+        # Two chunks
+        with self.assertNumQueries(4 + 3):
+            bulk_plan_validation(self.users, chunk_size=3)
+
+    def test_user_without_user_plan_is_skipped(self):
+        user = baker.make("User")
+
+        self.assertNotIn(user.pk, bulk_plan_validation([user] + self.users))
+
+    @override_settings(
+        PLANS_VALIDATORS={
+            "MAX_FOO_COUNT": (
+                "plans.tests.test_bulk_validation.max_foos_counter_validator"
+            ),
+        }
+    )
+    def test_counter_validator(self):
+        max_foos_counter_validator.connect_counter()
+        self.addCleanup(
+            post_save.disconnect,
+            sender=Foo,
+            dispatch_uid="plans_quota_usage_MAX_FOO_COUNT",
+        )
+        self.addCleanup(
+            post_delete.disconnect,
+            sender=Foo,
+            dispatch_uid="plans_quota_usage_MAX_FOO_COUNT",
+        )
+        # Creates the counter of users[2] only
+        baker.make(Foo, user=self.users[2])
+
+        violations = bulk_plan_validation(self.users)
+
+        self.assertEqual(
+            violations,
+            {
+                self.users[2].pk: {"MAX_FOO_COUNT": 3},
+                self.users[4].pk: {"MAX_FOO_COUNT": 4},
+            },
+        )
+
+    @override_settings(
+        PLANS_VALIDATORS={
+            "MAX_FOO_COUNT": (
+                "plans.tests.test_bulk_validation.max_unnamed_foos_validator"
+            ),
+        }
+    )
+    def test_customized_queryset_validated_per_user(self):
+        baker.make(Foo, user=self.users[1], name="", _quantity=2)
+
+        violations = bulk_plan_validation(self.users)
+
+        self.assertEqual(violations, {self.users[1].pk: {"MAX_FOO_COUNT": None}})
+
+    @override_settings(
+        PLANS_VALIDATORS={
+            "MAX_FOO_COUNT": "plans.tests.test_bulk_validation.max_plans_validator",
+        }
+    )
+    def test_model_without_user_field(self):
+        baker.make("Plan")
+
+        violations = bulk_plan_validation(self.users)
+
+        # All 3 plans count for every user
+        self.assertEqual(
+            violations,
+            {user.pk: {"MAX_FOO_COUNT": None} for user in self.users[:3]},
+        )
@@ -0,0 +1,250 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from model_bakery import baker
+
+from plans import catalog
+from plans.models import Plan, PlanQuota, Quota
+
+
+class QuotaDictCacheTests(TestCase):
+    """``Plan.get_quota_dict`` is on the hot path of every quota check.
+
+    The dict is memoized per catalog revision, so repeated calls must not
+    touch the database, while any write to a plan, quota or plan quota must
+    be visible to the very next call.
+    """
+
+    def setUp(self):
+        catalog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan = baker.make("Plan")
+            self.quota = baker.make("Quota", codename="MAX_FOO_COUNT")
+            self.plan_quota = baker.make(
+                "PlanQuota", plan=self.plan, quota=self.quota, value=3
+            )
+
+    def test_repeated_calls_are_served_from_cache(self):
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 3})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 3})
+
+    def test_returned_dict_is_a_copy(self):
+        self.plan.get_quota_dict()["MAX_FOO_COUNT"] = 100
+
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 3})
+
+    def test_plan_quota_change_invalidates(self):
+        self.plan.get_quota_dict()
+
+        self.plan_quota.value = 5
+        self.plan_quota.save()
+
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 5})
+
+    def test_plan_quota_delete_invalidates(self):
+        self.plan.get_quota_dict()
+
+        self.plan_quota.delete()
+
+        self.assertEqual(self.plan.get_quota_dict(), {})
+
+    def test_quota_rename_invalidates(self):
+        self.plan.get_quota_dict()
+
+        self.quota.codename = "MAX_BAR_COUNT"
+        self.quota.save()
+
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_BAR_COUNT": 3})
+
+    def test_invalidate_picks_up_writes_bypassing_signals(self):
+        self.plan.get_quota_dict()
+        PlanQuota.objects.filter(pk=self.plan_quota.pk).update(value=7)
+        Quota.objects.filter(pk=self.quota.pk).update(codename="MAX_BAZ_COUNT")
+
+        catalog.invalidate()
+
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_BAZ_COUNT": 7})
+
+    @mock.patch("plans.catalog.MAX_VALUES", 2)
+    def test_least_recently_used_values_are_dropped(self):
+        build = mock.Mock(side_effect=lambda: ["value"])
+        catalog.get_or_build("a", build)
+        catalog.get_or_build("b", build)
+        catalog.get_or_build("a", build)
+        catalog.get_or_build("c", build)
+
+        self.assertEqual(list(catalog._values), ["a", "c"])
+        self.assertEqual(build.call_count, 3)
+
+
+class CatalogSnapshotTests(TestCase):
+    """The default plan and plan freeness are resolved from one cached snapshot."""
+
+    def setUp(self):
+        catalog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.default_plan = baker.make("Plan", default=True)
+            self.paid_plan = baker.make("Plan")
+            baker.make("PlanPricing", plan=self.paid_plan)
+
+    def test_lookups_are_served_from_cache(self):
+        catalog.get_snapshot()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Plan.get_default_plan(), self.default_plan)
+            self.assertTrue(self.default_plan.is_free())
+            self.assertFalse(self.paid_plan.is_free())
+
+    def test_default_plan_is_a_copy(self):
+        Plan.get_default_plan().name = "Changed"
+
+        self.assertEqual(Plan.get_default_plan().name, self.default_plan.name)
+
+    def test_pricing_changes_invalidate(self):
+        self.assertTrue(self.default_plan.is_free())
+
+        plan_pricing = baker.make("PlanPricing", plan=self.default_plan)
+        self.assertFalse(self.default_plan.is_free())
+
+        plan_pricing.delete()
+        self.assertTrue(self.default_plan.is_free())
+
+    def test_default_flag_change_invalidates(self):
+        self.assertEqual(Plan.get_default_plan(), self.default_plan)
+
+        self.default_plan.delete()
+
+        self.assertIsNone(Plan.get_default_plan())
+
+    def test_rolled_back_write_is_not_served(self):
+        try:
+            with transaction.atomic():
+                Plan.objects.get(pk=self.default_plan.pk).delete()
+                self.assertIsNone(Plan.get_default_plan())
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(Plan.get_default_plan(), self.default_plan)
+
+    def test_unsaved_plan_is_free(self):
+        self.assertTrue(Plan().is_free())
+
+
+@override_settings(PLANS_CACHE="default")
+class SharedQuotaDictCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan = baker.make("Plan")
+            baker.make(
+                "PlanQuota",
+                plan=self.plan,
+                quota__codename="MAX_FOO_COUNT",
+                value=3,
+            )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_value_is_shared_between_processes(self):
+        self.plan.get_quota_dict()
+        # Another process starts with a cold in-process cache
+        catalog._values.clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 3})
+
+    def test_revision_token_eviction_invalidates(self):
+        revision = catalog.get_revision()
+        cache.clear()
+
+        self.assertNotEqual(catalog.get_revision(), revision)
+
+    def test_write_in_another_process_invalidates(self):
+        self.plan.get_quota_dict()
+        PlanQuota.objects.filter(plan=self.plan).update(value=5)
+        # Another process bumps the shared token, the local counter stays
+        cache.delete(catalog.REVISION_CACHE_KEY)
+
+        self.assertEqual(self.plan.get_quota_dict(), {"MAX_FOO_COUNT": 5})
+
+    def test_built_value_is_shared_between_processes(self):
+        build = mock.Mock(return_value=["value"])
+        catalog.get_or_build("foo", build)
+        # Another process starts with a cold in-process cache
+        catalog._values.clear()
+
+        self.assertEqual(catalog.get_or_build("foo", build), ["value"])
+        build.assert_called_once_with()
+
+    def test_uncommitted_write_is_not_shared(self):
+        revision = catalog.get_revision()
+        shared_key = catalog.VALUE_CACHE_KEY % (
+            "quota_dict_%s" % self.plan.pk,
+            revision[1],
+        )
+        self.plan.get_quota_dict()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                PlanQuota.objects.get(plan=self.plan).delete()
+                # This thread sees its own write, other processes don't
+                self.assertEqual(self.plan.get_quota_dict(), {})
+                self.assertEqual(catalog.get_revision(), revision)
+                self.assertEqual(cache.get(shared_key), {"MAX_FOO_COUNT": 3})
+
+        self.assertNotEqual(catalog.get_revision(), revision)
+        self.assertEqual(self.plan.get_quota_dict(), {})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.plan.get_quota_dict(), {})
+
+
+class CatalogTransactionTests(TransactionTestCase):
+    def test_rolled_back_write_is_not_served(self):
+        catalog.clear()
+        # Flushing the database at the end of the test doesn't send signals
+        self.addCleanup(catalog.clear)
+        default_plan = baker.make("Plan", default=True)
+        self.assertEqual(Plan.get_default_plan(), default_plan)
+
+        try:
+            with transaction.atomic():
+                Plan.objects.get(pk=default_plan.pk).delete()
+                self.assertIsNone(Plan.get_default_plan())
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        # Values of the committed state are still valid
+        with self.assertNumQueries(0):
+            self.assertEqual(Plan.get_default_plan(), default_plan)
+
+
+class CatalogVersionTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan = baker.make("Plan")
+
+    def test_version_is_memoized(self):
+        version = catalog.get_version()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get_version(), version)
+
+    def test_version_changes_with_catalog(self):
+        version = catalog.get_version()
+        self.assertEqual(version.last_modified, self.plan.updated_at)
+
+        pricing = baker.make("Pricing")
+        self.assertGreater(catalog.get_version().last_modified, version.last_modified)
+        self.assertNotEqual(catalog.get_version().etag, version.etag)
+
+        version = catalog.get_version()
+        pricing.delete()
+        self.assertNotEqual(catalog.get_version().etag, version.etag)
@@ -0,0 +1,171 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from zeep.exceptions import TransportError
+
+from plans.taxation import circuit_breaker, vies
+from plans.taxation.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from plans.taxation.eu import EUTaxationPolicy
+from plans.taxation.tedb_client import TEDBClient
+from plans.tests.test_vies import checked
+
+
+@override_settings(
+    PLANS_CIRCUIT_BREAKER_THRESHOLD=3, PLANS_CIRCUIT_BREAKER_RESET_TIMEOUT=60
+)
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker("test")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.get_status()["failures"], 1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failures_expire(self):
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+            frozen.tick(61)
+            self.breaker.record_failure()
+
+            self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_allows_single_trial(self):
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            for _ in range(3):
+                self.breaker.record_failure()
+            frozen.tick(61)
+
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            self.assertTrue(self.breaker.allow_request())
+            self.assertFalse(CircuitBreaker("test").allow_request())
+
+            self.breaker.record_success()
+
+            self.assertEqual(self.breaker.state, CLOSED)
+            self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            for _ in range(3):
+                self.breaker.record_failure()
+            frozen.tick(61)
+            self.assertTrue(self.breaker.allow_request())
+
+            self.breaker.record_failure()
+
+            self.assertEqual(
+                self.breaker.get_status(),
+                {
+                    "name": "test",
+                    "state": OPEN,
+                    "failures": 0,
+                    "opened_at": 1767268861.0,
+                },
+            )
+            frozen.tick(61)
+            self.assertTrue(self.breaker.allow_request())
+
+
+@override_settings(
+    PLANS_CIRCUIT_BREAKER_THRESHOLD=2,
+    PLANS_TAX=Decimal("23.0"),
+    PLANS_TAX_COUNTRY="PL",
+    PLANS_VIES_BACKEND="plans.tests.test_vies.stub_backend",
+)
+class TaxationCircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        checked.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_open_tedb_breaker_skips_service(self):
+        client = TEDBClient()
+        client.client = mock.Mock()
+        client.client.service.retrieveVatRates.side_effect = TransportError("down")
+
+        for country_code in ["DE", "FR", "IT"]:
+            self.assertIsNone(client.get_vat_rate(country_code))
+
+        self.assertEqual(client.client.service.retrieveVatRates.call_count, 2)
+        self.assertEqual(circuit_breaker.tedb.state, OPEN)
+
+    def test_open_tedb_breaker_uses_static_rate(self):
+        for _ in range(2):
+            circuit_breaker.tedb.record_failure()
+
+        with mock.patch("plans.taxation.tedb_client.Client") as client_class:
+            rate = EUTaxationPolicy._get_vat_rate_from_tedb("FR")
+
+        self.assertEqual(rate, Decimal("20"))
+        client_class.assert_not_called()
+
+    @override_settings(PLANS_VIES_CACHE="default")
+    def test_open_vies_breaker_skips_service(self):
+        with mock.patch.object(
+            EUTaxationPolicy, "_get_vat_rate_from_tedb", return_value=Decimal("20")
+        ):
+            for vat_id in ["ATU1", "ATU2", "CZ48136450"]:
+                self.assertEqual(
+                    EUTaxationPolicy.get_tax_rate(vat_id, "CZ"), (Decimal("20"), False)
+                )
+
+        self.assertEqual(checked, ["ATU1", "ATU2"])
+        self.assertEqual(circuit_breaker.vies.state, OPEN)
+
+    @override_settings(PLANS_VIES_CACHE="default")
+    def test_open_vies_breaker_results_not_cached(self):
+        for _ in range(2):
+            circuit_breaker.vies.record_failure()
+        with self.assertRaises(vies.VIESError):
+            vies.validate_vat_id("CZ48136450")
+
+        circuit_breaker.vies.reset()
+
+        self.assertTrue(vies.validate_vat_id("CZ48136450"))
+        self.assertEqual(checked, ["CZ48136450"])
+
+    def test_invalid_vat_id_format_is_not_a_failure(self):
+        with mock.patch(
+            "plans.taxation.vies.get_backend",
+            return_value=mock.Mock(side_effect=vies.stdnum.exceptions.InvalidComponent),
+        ):
+            for _ in range(3):
+                with self.assertRaises(vies.VIESError):
+                    vies.validate_vat_id("CZ1")
+
+        self.assertEqual(circuit_breaker.vies.state, CLOSED)
+
+    def test_service_status(self):
+        for _ in range(2):
+            circuit_breaker.tedb.record_failure()
+
+        status = EUTaxationPolicy.get_service_status()
+
+        self.assertEqual(status["tedb"]["state"], OPEN)
+        self.assertEqual(status["vies"]["state"], CLOSED)
@@ -90,6 +90,21 @@ class EUTaxationTEDBIntegrationTest(TestCase):
         self.assertEqual(rate, Decimal("20"))
         self.assertTrue(success)
 
+    @patch("plans.taxation.tedb_client.Client")
+    def test_warm_up_initializes_client_in_background(self, mock_client_class):
+        """Test that warm_up loads the WSDL outside of the calling thread."""
+        if hasattr(EUTaxationPolicy, "_tedb_client"):
+            delattr(EUTaxationPolicy, "_tedb_client")
+        self.addCleanup(delattr, EUTaxationPolicy, "_tedb_client")
+
+        thread = EUTaxationPolicy.warm_up()
+        thread.join()
+
+        mock_client_class.assert_called_once()
+        self.assertIs(
+            EUTaxationPolicy._get_tedb_client().client, mock_client_class.return_value
+        )
+
     @override_settings(PLANS_TAX_COUNTRY="DE")
     def test_updated_vat_rates_in_static_table(self):
         """Test that recently updated VAT rates are correct in static table."""
@@ -0,0 +1,88 @@
+import datetime
+import unittest
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from plans import tasks
+from plans.models import RecurringUserPlan, UserPlan
+
+
+class TaskIndexesTests(TestCase):
+    def test_indexes_are_created(self):
+        with connection.cursor() as cursor:
+            user_plan_constraints = connection.introspection.get_constraints(
+                cursor, UserPlan._meta.db_table
+            )
+            recurring_constraints = connection.introspection.get_constraints(
+                cursor, RecurringUserPlan._meta.db_table
+            )
+
+        self.assertEqual(
+            user_plan_constraints["plans_up_act_exp"]["columns"],
+            ["active", "expire"],
+        )
+        self.assertEqual(
+            recurring_constraints["plans_rup_renew"]["columns"],
+            ["renewal_triggered_by", "token_verified", "payment_provider"],
+        )
+        self.assertEqual(
+            recurring_constraints["plans_rup_task"]["columns"],
+            ["user_plan_id", "last_renewal_attempt"],
+        )
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL specific"
+)
+class TaskQueryPlansTests(TestCase):
+    """
+    The planner prefers sequential scans of the few rows of a test database, so
+    they are disabled to check that the task queries can use the indexes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        for i in range(50):
+            user_plan = baker.make(
+                UserPlan,
+                user=baker.make("User"),
+                active=bool(i % 2),
+                expire=today + datetime.timedelta(days=i - 25),
+            )
+            baker.make(
+                RecurringUserPlan,
+                user_plan=user_plan,
+                payment_provider="paypal" if i % 3 else "stripe",
+                renewal_triggered_by=RecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+                token_verified=bool(i % 5),
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE %s" % UserPlan._meta.db_table)
+            cursor.execute("ANALYZE %s" % RecurringUserPlan._meta.db_table)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def test_expire_account_query(self):
+        plan = UserPlan.objects.filter(
+            active=True, expire__lt=timezone.localdate()
+        ).explain()
+
+        self.assertIn("plans_up_act_exp", plan)
+
+    @override_settings(PLANS_AUTORENEW_SCHEDULE=[datetime.timedelta(days=1)])
+    def test_autorenew_account_query(self):
+        plan = tasks.get_accounts_for_renewal().explain()
+
+        self.assertIn("plans_rup_task", plan)
+
+    @override_settings(PLANS_AUTORENEW_SCHEDULE=[datetime.timedelta(days=1)])
+    def test_autorenew_account_query_by_provider(self):
+        plan = tasks.get_accounts_for_renewal(providers=["paypal"]).explain()
+
+        self.assertIn("plans_rup_renew", plan)
@@ -0,0 +1,163 @@
+import time
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+from freezegun import freeze_time
+from model_bakery import baker
+
+from plans import outbox
+from plans.contrib import send_emails, send_template_email
+from plans.models import OutboxEmail
+
+
+@override_settings(PLANS_EMAIL_OUTBOX=True)
+class OutboxTests(TestCase):
+    """E-mails are stored in the transaction and sent in batches after it commits."""
+
+    def setUp(self):
+        self.user = baker.make("User", email="user@example.com")
+        # Drain in the test thread, which sees the test transaction's data
+        patcher = mock.patch("plans.outbox._ensure_drainer")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, plan=None):
+        send_template_email(
+            [self.user.email],
+            "mail/change_plan_title.txt",
+            "mail/change_plan_body.txt",
+            {"user": self.user, "plan": plan or baker.make("Plan"), "userplan": None},
+            None,
+        )
+
+    def test_stored_in_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.send()
+
+        self.assertEqual(OutboxEmail.objects.get().to, ["user@example.com"])
+        self.assertIn(outbox._wake_up, callbacks)
+        self.assertEqual(mail.outbox, [])
+
+    def test_sent_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send()
+
+        outbox.flush()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user@example.com"])
+        self.assertEqual(mail.outbox[0].alternatives, [])
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_rendered_when_queued(self):
+        plan = baker.make("Plan", name="Gold")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send(plan)
+            plan.name = "Silver"
+
+        outbox.flush()
+
+        self.assertIn("Your current plan is Gold.", mail.outbox[0].body)
+
+    def test_rolled_back_email_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.send()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        outbox.flush()
+
+        self.assertEqual(mail.outbox, [])
+
+    def test_batch_uses_one_connection(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.send()
+            send_emails([mail.EmailMessage("Subject", "Body", to=["a@example.com"])])
+
+        with mock.patch(
+            "plans.outbox.mail.get_connection", wraps=mail.get_connection
+        ) as get_connection:
+            outbox.flush()
+
+        get_connection.assert_called_once_with()
+        self.assertEqual(len(mail.outbox), 4)
+
+    @override_settings(SEND_PLANS_EMAILS=False)
+    def test_disabled_emails_are_not_queued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send()
+
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_failed_batch_is_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send()
+        connection = mock.Mock()
+        connection.send_messages.side_effect = SMTPException("Unavailable")
+
+        with mock.patch("plans.outbox.mail.get_connection", return_value=connection):
+            self.assertEqual(outbox.send_pending(), 0)
+            # Not due yet
+            outbox.send_pending()
+
+        connection.send_messages.assert_called_once()
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt, now())
+        self.assertIn("Unavailable", email.last_error)
+        with freeze_time(now() + outbox.RETRY_DELAY):
+            self.assertEqual(outbox.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_gives_up_after_max_attempts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send()
+        OutboxEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        connection = mock.Mock()
+        connection.send_messages.side_effect = SMTPException
+
+        with mock.patch("plans.outbox.mail.get_connection", return_value=connection):
+            with self.assertLogs("emails", "ERROR"):
+                outbox.send_pending()
+        with freeze_time(now() + timedelta(days=30)):
+            outbox.send_pending()
+
+        self.assertEqual(OutboxEmail.objects.get().attempts, outbox.MAX_ATTEMPTS)
+        self.assertEqual(mail.outbox, [])
+
+    def test_command_sends_left_over_emails(self):
+        # Stored by a process killed before its drainer sent them
+        with self.captureOnCommitCallbacks():
+            send_emails(
+                mail.EmailMessage("Subject", "Body", to=["a@example.com"])
+                for _ in range(3)
+            )
+
+        call_command("send_outbox_emails", batch_size=2, stdout=mock.Mock())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+@override_settings(PLANS_EMAIL_OUTBOX=True)
+class OutboxDrainerTests(TransactionTestCase):
+    def test_drainer_thread_sends_committed_messages(self):
+        send_emails([mail.EmailMessage("Subject", "Body", to=["a@example.com"])])
+
+        for _ in range(100):
+            if mail.outbox:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(len(mail.outbox), 1)
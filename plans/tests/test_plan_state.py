@@ -0,0 +1,128 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from freezegun import freeze_time
+from model_bakery import baker
+
+from plans import catalog, plan_state, tasks
+from plans.context_processors import account_status
+from plans.models import Plan, RecurringUserPlan
+from plans.plan_state import PlanState, get_plan_state
+
+User = get_user_model()
+
+
+@override_settings(PLANS_USER_PLAN_CACHE="default")
+class PlanStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan = baker.make("Plan")
+        self.user = baker.make("User")
+        baker.make(
+            "UserPlan", user=self.user, plan=self.plan, expire=date(2026, 10, 27)
+        )
+
+    def get_user(self):
+        """The user as loaded by the authentication middleware, without its user plan"""
+        return User.objects.get(pk=self.user.pk)
+
+    def account_status(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return account_status(request)
+
+    @freeze_time("2026-10-17 12:00")
+    def test_account_status_from_cache(self):
+        expected = {
+            "ACCOUNT_EXPIRED": False,
+            "ACCOUNT_NOT_ACTIVE": False,
+            "EXPIRE_IN_DAYS": 10,
+            "EXTEND_URL": "/plan/account/",
+            "ACTIVATE_URL": "/plan/account/activation/",
+        }
+        self.assertEqual(self.account_status(self.get_user()), expected)
+
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.account_status(user), expected)
+
+    @freeze_time("2026-10-17 12:00")
+    def test_user_plan_save_invalidates(self):
+        self.account_status(self.get_user())
+
+        self.user.userplan.expire = date(2026, 10, 16)
+        self.user.userplan.active = False
+        self.user.userplan.save()
+
+        status = self.account_status(self.get_user())
+        self.assertTrue(status["ACCOUNT_EXPIRED"])
+        self.assertFalse(status["ACCOUNT_NOT_ACTIVE"])
+        self.assertEqual(status["EXPIRE_IN_DAYS"], -1)
+
+    def test_user_without_user_plan(self):
+        self.user.userplan.delete()
+        self.assertEqual(self.account_status(self.get_user()), {})
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_plan_state(User(pk=self.user.pk)))
+            self.assertEqual(self.account_status(User(pk=self.user.pk)), {})
+
+    @freeze_time("2026-10-17 12:00")
+    def test_get_current_plan_from_cache(self):
+        self.assertEqual(Plan.get_current_plan(self.get_user()), self.plan)
+
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(Plan.get_current_plan(user), self.plan)
+
+    @freeze_time("2026-10-17 12:00")
+    def test_loaded_user_plan_is_used(self):
+        state = get_plan_state(self.get_user())
+        self.assertIsInstance(state, PlanState)
+
+        self.assertIs(get_plan_state(self.user), self.user.userplan)
+
+    def test_invalidation_during_load(self):
+        load_plan_state = plan_state._load_plan_state
+
+        def load_then_invalidate(user_pk):
+            # Another request saves the user plan after this one loaded it
+            state = load_plan_state(user_pk)
+            self.user.userplan.active = False
+            self.user.userplan.save()
+            return state
+
+        with mock.patch(
+            "plans.plan_state._load_plan_state", side_effect=load_then_invalidate
+        ):
+            self.assertTrue(get_plan_state(self.get_user()).is_active())
+
+        self.assertFalse(get_plan_state(self.get_user()).is_active())
+
+    def test_recurring_flag(self):
+        self.assertFalse(get_plan_state(self.get_user()).has_automatic_renewal())
+
+        baker.make(
+            RecurringUserPlan,
+            user_plan=self.user.userplan,
+            renewal_triggered_by=RecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+            token_verified=True,
+        )
+
+        self.assertTrue(get_plan_state(self.get_user()).has_automatic_renewal())
+
+    @freeze_time("2026-10-17 12:00")
+    def test_bulk_expiration_invalidates(self):
+        self.user.userplan.expire = date.today() - timedelta(days=1)
+        self.user.userplan.save()
+        self.assertTrue(get_plan_state(self.get_user()).is_active())
+
+        tasks.expire_account(bulk=True)
+
+        self.assertFalse(get_plan_state(self.get_user()).is_active())
@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from model_bakery import baker
+
+from plans import catalog
+from plans.middleware import QuotaMiddleware
+from plans.models import Plan
+from plans.quota import _request_quota, get_user_quota
+from plans.validators import ModelCountValidator
+
+
+class MaxUsersValidator(ModelCountValidator):
+    code = "MAX_USERS"
+    model = get_user_model()
+
+
+class QuotaMiddlewareTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+        self.plan = baker.make("Plan")
+        baker.make("PlanQuota", plan=self.plan, quota__codename="MAX_USERS", value=5)
+        self.user = baker.make("User")
+        baker.make("UserPlan", user=self.user, plan=self.plan, expire=None)
+
+    def process(self, view, user=None):
+        request = RequestFactory().get("/")
+        request.user = user or self.user
+        return QuotaMiddleware(view)(request)
+
+    def test_plan_resolved_once_per_request(self):
+        validator = MaxUsersValidator()
+
+        def view(request):
+            validator(request.user)
+            validator(request.user, add=1)
+            self.assertEqual(get_user_quota(request.user), {"MAX_USERS": 5})
+            self.assertEqual(request.plans_quota.get("MAX_USERS"), 5)
+            return HttpResponse()
+
+        with mock.patch.object(
+            Plan, "get_current_plan", wraps=Plan.get_current_plan
+        ) as get_current_plan:
+            self.process(view)
+
+        get_current_plan.assert_called_once_with(self.user)
+
+    def test_other_user_resolved_separately(self):
+        other_plan = baker.make("Plan")
+        baker.make("PlanQuota", plan=other_plan, quota__codename="OTHER", value=1)
+        other_user = baker.make("User")
+        baker.make("UserPlan", user=other_user, plan=other_plan, expire=None)
+
+        def view(request):
+            self.assertEqual(get_user_quota(other_user), {"OTHER": 1})
+            self.assertEqual(get_user_quota(request.user), {"MAX_USERS": 5})
+            return HttpResponse()
+
+        self.process(view)
+
+    def test_user_plan_change_is_visible(self):
+        other_plan = baker.make("Plan")
+
+        def view(request):
+            self.assertEqual(get_user_quota(request.user), {"MAX_USERS": 5})
+            request.user.userplan.plan = other_plan
+            request.user.userplan.save()
+            self.assertEqual(get_user_quota(request.user), {})
+            return HttpResponse()
+
+        self.process(view)
+
+    def test_expired_plan_error(self):
+        self.user.userplan.expire = date.today() - timedelta(days=1)
+        self.user.userplan.save()
+
+        def view(request):
+            for _ in range(2):
+                with self.assertRaises(ValidationError):
+                    request.plans_quota.quota_dict
+            return HttpResponse()
+
+        with mock.patch.object(
+            Plan, "get_current_plan", wraps=Plan.get_current_plan
+        ) as get_current_plan:
+            self.process(view)
+
+        get_current_plan.assert_called_once_with(self.user)
+
+    def test_anonymous_user(self):
+        def view(request):
+            with self.assertRaises(ValidationError):
+                request.plans_quota.quota_dict
+            return HttpResponse()
+
+        self.process(view, AnonymousUser())
+
+    def test_context_reset_after_request(self):
+        self.process(lambda request: HttpResponse())
+
+        self.assertIsNone(_request_quota.get())
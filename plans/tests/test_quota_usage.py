@@ -0,0 +1,140 @@
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+from example.foo.models import Foo
+from model_bakery import baker
+
+from plans.models import QuotaUsage
+from plans.validators import ModelCountValidator
+
+
+class MaxFoosCounterValidator(ModelCountValidator):
+    code = "MAX_FOO_COUNT"
+    model = Foo
+    use_counter = True
+
+    def get_queryset(self, user):
+        return super().get_queryset(user).filter(user=user)
+
+
+max_foos_counter_validator = MaxFoosCounterValidator()
+
+
+class QuotaUsageCounterTests(TestCase):
+    def setUp(self):
+        max_foos_counter_validator.connect_counter()
+        self.addCleanup(self.disconnect)
+        self.user = baker.make("User")
+
+    def disconnect(self):
+        post_save.disconnect(sender=Foo, dispatch_uid="plans_quota_usage_MAX_FOO_COUNT")
+        post_delete.disconnect(
+            sender=Foo, dispatch_uid="plans_quota_usage_MAX_FOO_COUNT"
+        )
+
+    def get_counter(self, user=None):
+        return QuotaUsage.objects.get(user=user or self.user, codename="MAX_FOO_COUNT")
+
+    def test_validator_reads_counter(self):
+        baker.make(Foo, user=self.user, _quantity=2)
+
+        with self.assertNumQueries(1):
+            max_foos_counter_validator(self.user, {"MAX_FOO_COUNT": 2})
+        with self.assertRaises(ValidationError):
+            max_foos_counter_validator(self.user, {"MAX_FOO_COUNT": 2}, add=1)
+
+    def test_counter_follows_creates_and_deletes(self):
+        foos = baker.make(Foo, user=self.user, _quantity=3)
+        self.assertEqual(self.get_counter().count, 3)
+
+        foos[0].delete()
+        Foo.objects.filter(pk=foos[1].pk).delete()
+        foos[2].name = "Renamed"
+        foos[2].save()
+
+        self.assertEqual(self.get_counter().count, 1)
+
+    def test_delete_does_not_create_counter(self):
+        Foo.objects.bulk_create([Foo(user=self.user), Foo(user=self.user)])
+
+        Foo.objects.first().delete()
+
+        self.assertFalse(QuotaUsage.objects.filter(user=self.user).exists())
+
+    def test_deleting_user_with_counted_objects(self):
+        baker.make(Foo, user=self.user, _quantity=2)
+        self.assertEqual(self.get_counter().count, 2)
+
+        self.user.delete()
+
+        self.assertFalse(Foo.objects.exists())
+        self.assertFalse(QuotaUsage.objects.exists())
+
+    def test_counter_initialized_by_counting(self):
+        Foo.objects.bulk_create([Foo(user=self.user), Foo(user=self.user)])
+
+        self.assertEqual(max_foos_counter_validator.get_total_count(self.user), 2)
+        baker.make(Foo, user=self.user)
+        self.assertEqual(self.get_counter().count, 3)
+
+    def test_counters_are_per_user(self):
+        other_user = baker.make("User")
+        baker.make(Foo, user=self.user)
+        baker.make(Foo, user=other_user, _quantity=2)
+
+        self.assertEqual(max_foos_counter_validator.get_total_count(self.user), 1)
+        self.assertEqual(max_foos_counter_validator.get_total_count(other_user), 2)
+
+    def test_rolled_back_create_is_not_counted(self):
+        baker.make(Foo, user=self.user)
+        try:
+            with transaction.atomic():
+                baker.make(Foo, user=self.user)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(self.get_counter().count, 1)
+
+    def test_reconcile_counters(self):
+        other_user = baker.make("User")
+        third_user = baker.make("User")
+        baker.make(Foo, user=self.user)
+        baker.make(Foo, user=third_user)
+        Foo.objects.bulk_create([Foo(user=self.user), Foo(user=other_user)])
+        Foo.objects.filter(user=third_user).update(user=other_user)
+
+        fixed = max_foos_counter_validator.reconcile_counters(batch_size=2)
+
+        self.assertEqual(fixed, 3)
+        self.assertEqual(self.get_counter().count, 2)
+        self.assertEqual(self.get_counter(other_user).count, 2)
+        self.assertEqual(self.get_counter(third_user).count, 0)
+        self.assertEqual(max_foos_counter_validator.reconcile_counters(), 0)
+
+
+@override_settings(
+    PLANS_VALIDATORS={
+        "MAX_FOO_COUNT": "plans.tests.test_quota_usage.max_foos_counter_validator"
+    }
+)
+class ReconcileQuotaUsageCommandTests(TestCase):
+    def test_reconcile(self):
+        user = baker.make("User")
+        Foo.objects.bulk_create([Foo(user=user), Foo(user=user)])
+        out = StringIO()
+
+        call_command("reconcile_quota_usage", "--batch-size", "10", stdout=out)
+
+        self.assertEqual(out.getvalue(), "MAX_FOO_COUNT: 1 counters fixed\n")
+        self.assertEqual(
+            QuotaUsage.objects.get(user=user, codename="MAX_FOO_COUNT").count, 2
+        )
+
+    def test_unknown_codename(self):
+        with self.assertRaisesRegex(CommandError, "MAX_BAR_COUNT"):
+            call_command("reconcile_quota_usage", "MAX_BAR_COUNT")
@@ -1,17 +1,38 @@
 import datetime
+import threading
+import time
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core import mail
-from django.test import TestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, models
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from freezegun import freeze_time
 from model_bakery import baker
 
 from plans.base.models import AbstractRecurringUserPlan
 from plans.models import RecurringUserPlan
-from plans.signals import account_automatic_renewal
-from plans.tasks import autorenew_account, expire_account
+from plans.signals import (
+    account_automatic_renewal,
+    account_expired,
+    accounts_deactivated,
+    accounts_expired,
+)
+from plans.tasks import (
+    RENEWAL_DRY_RUN,
+    RENEWAL_FAILED,
+    RENEWAL_SUBMITTED,
+    RenewalRecord,
+    _renew_accounts_in_parallel,
+    autorenew_account,
+    expire_account,
+    get_accounts_for_renewal,
+    iter_renewals,
+)
 
 User = get_user_model()
 
@@ -120,6 +141,146 @@ class AutorenewDryRunTests(TestCase):
         self.assertEqual(self.signals, [self.user])
 
 
+@override_settings(
+    PLANS_AUTORENEW_SCHEDULE=[datetime.timedelta(days=1)],
+    PLANS_AUTORENEW_PROVIDER_CONCURRENCY={"slow-provider": 2},
+)
+@freeze_time("2026-08-05 12:00:00")
+class ParallelAutorenewTests(TransactionTestCase):
+    """Worker threads must renew every account exactly once.
+
+    The threads commit their claims on their own connections, hence
+    ``TransactionTestCase``.
+    """
+
+    def setUp(self):
+        self.users = [
+            _renewable_user(f"parallel{i}", datetime.date(2026, 8, 6)) for i in range(6)
+        ]
+        RecurringUserPlan.objects.update(payment_provider="slow-provider")
+        self.lock = threading.Lock()
+        self.renewed = []
+        self.in_flight = self.max_in_flight = 0
+
+        def receiver(sender, user, **kwargs):
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.05)
+            with self.lock:
+                self.in_flight -= 1
+                self.renewed.append(user)
+
+        account_automatic_renewal.connect(receiver)
+        self.addCleanup(account_automatic_renewal.disconnect, receiver)
+
+    def test_every_account_renewed_once(self):
+        attempted = autorenew_account(workers=4)
+
+        self.assertCountEqual(attempted, self.users)
+        self.assertCountEqual(self.renewed, self.users)
+        self.assertFalse(
+            RecurringUserPlan.objects.filter(last_renewal_attempt=None).exists()
+        )
+
+    def test_connections_closed_once_per_worker(self):
+        with mock.patch.object(
+            connections, "close_all", wraps=connections.close_all
+        ) as close_all:
+            autorenew_account(workers=4)
+
+        self.assertEqual(close_all.call_count, 4)
+
+    def test_second_run_renews_nothing(self):
+        autorenew_account(workers=4)
+
+        self.assertEqual(autorenew_account(workers=4), [])
+
+    def test_provider_concurrency_limit(self):
+        autorenew_account(workers=4)
+
+        self.assertEqual(self.max_in_flight, 2)
+
+    def test_shards_split_the_accounts(self):
+        attempted = []
+        for index in range(3):
+            attempted += autorenew_account(workers=2, shard=(index, 3))
+
+        self.assertCountEqual(attempted, self.users)
+
+    def test_candidates_fetched_in_chunks(self):
+        attempted = _renew_accounts_in_parallel(
+            get_accounts_for_renewal(), 4, 0, False, chunk_size=4
+        )
+
+        self.assertEqual(attempted, sorted(self.users, key=lambda user: user.pk))
+        self.assertCountEqual(self.renewed, self.users)
+
+    def test_shards_require_integer_pk(self):
+        with mock.patch.object(User._meta, "pk", models.UUIDField()):
+            with self.assertRaises(ImproperlyConfigured):
+                autorenew_account(workers=2, shard=(0, 3))
+
+
+@override_settings(PLANS_AUTORENEW_SCHEDULE=[datetime.timedelta(days=1)])
+@freeze_time("2026-08-05 12:00:00")
+class StreamingAutorenewTests(TestCase):
+    """``iter_renewals`` walks candidates in chunks and yields compact records."""
+
+    def setUp(self):
+        self.users = [
+            _renewable_user(f"stream{i}", datetime.date(2026, 8, 6)) for i in range(5)
+        ]
+        self.renewed = []
+
+        def receiver(sender, user, **kwargs):
+            if user == self.users[0]:
+                raise RuntimeError("declined")
+            self.renewed.append(user)
+
+        account_automatic_renewal.connect(receiver)
+        self.addCleanup(account_automatic_renewal.disconnect, receiver)
+
+    def test_yields_records_chunk_by_chunk(self):
+        renewals = iter_renewals(catch_exceptions=True, chunk_size=2)
+
+        # Only the first chunk is fetched before the first record
+        with CaptureQueriesContext(connection) as queries:
+            first = next(renewals)
+        self.assertEqual(
+            first,
+            RenewalRecord(
+                self.users[0].pk,
+                self.users[0].userplan.recurring.payment_provider,
+                datetime.date(2026, 8, 6),
+                RENEWAL_FAILED,
+            ),
+        )
+        selects = [q for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+
+        records = [first, *renewals]
+        self.assertEqual([r.user_pk for r in records], [u.pk for u in self.users])
+        self.assertEqual(
+            [r.outcome for r in records], [RENEWAL_FAILED] + [RENEWAL_SUBMITTED] * 4
+        )
+        self.assertEqual(self.renewed, self.users[1:])
+
+    def test_claimed_accounts_are_not_yielded_again(self):
+        list(iter_renewals(catch_exceptions=True, chunk_size=2))
+
+        self.assertEqual(list(iter_renewals(chunk_size=2)), [])
+
+    def test_dry_run(self):
+        records = list(iter_renewals(dry_run=True, chunk_size=2))
+
+        self.assertEqual([r.outcome for r in records], [RENEWAL_DRY_RUN] * 5)
+        self.assertEqual(self.renewed, [])
+        self.assertFalse(
+            RecurringUserPlan.objects.exclude(last_renewal_attempt=None).exists()
+        )
+
+
 @freeze_time("2026-08-05 12:00:00")
 class ExpirationReminderTests(TestCase):
     """``PLANS_EXPIRATION_REMIND`` drives the pre-expiry warning emails.
@@ -153,6 +314,79 @@ class ExpirationReminderTests(TestCase):
         self.assertEqual(mail.outbox, [])
 
 
+@freeze_time("2026-08-05 12:00:00")
+class BulkExpireAccountTests(TestCase):
+    """Bulk mode must expire exactly the accounts the per-account mode does.
+
+    It trades per-account UPDATEs, signals and SMTP round-trips for one of
+    each per chunk; the month-start expiry wave is the reason it exists.
+    """
+
+    def setUp(self):
+        yesterday = datetime.date(2026, 8, 4)
+        self.expired = [_renewable_user(f"expired{i}", yesterday) for i in range(5)]
+        self.current = _renewable_user("current", datetime.date(2026, 8, 5))
+        self.batches = {"expired": [], "deactivated": []}
+        self.single = []
+
+        def on_expired(sender, userplans, **kwargs):
+            self.batches["expired"].append(userplans)
+
+        def on_deactivated(sender, userplans, **kwargs):
+            self.batches["deactivated"].append(userplans)
+
+        def on_single(sender, user, **kwargs):
+            self.single.append(user)
+
+        for signal, receiver in (
+            (accounts_expired, on_expired),
+            (accounts_deactivated, on_deactivated),
+            (account_expired, on_single),
+        ):
+            signal.connect(receiver)
+            self.addCleanup(signal.disconnect, receiver)
+
+    def test_expires_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            expire_account(bulk=True, chunk_size=2)
+
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        for user in self.expired:
+            user.userplan.refresh_from_db()
+            self.assertFalse(user.userplan.active)
+        self.current.userplan.refresh_from_db()
+        self.assertTrue(self.current.userplan.active)
+
+    def test_batched_signals_and_emails(self):
+        expire_account(bulk=True, chunk_size=2)
+
+        self.assertEqual([len(b) for b in self.batches["expired"]], [2, 2, 1])
+        self.assertEqual([len(b) for b in self.batches["deactivated"]], [2, 2, 1])
+        self.assertEqual(self.single, [])
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            sorted(u.email for u in self.expired),
+        )
+
+    def test_second_run_is_a_noop(self):
+        expire_account(bulk=True)
+        mail.outbox = []
+
+        expire_account(bulk=True)
+
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(PLANS_EXPIRATION_REMIND=[3])
+    def test_reminders(self):
+        _renewable_user("expiring", datetime.date(2026, 8, 8))
+
+        expire_account(bulk=True, chunk_size=2)
+
+        reminders = [m for m in mail.outbox if "will expire" in m.subject]
+        self.assertEqual(len(reminders), 1)
+
+
 class AutorenewCalendarEdgeTests(TestCase):
     """Slot bookkeeping edges: DST transitions and the max-age boundary."""
 
@@ -1,8 +1,12 @@
+from datetime import date
 from decimal import Decimal
+from io import StringIO
 from unittest.mock import Mock, patch
 
 from django.core.cache import cache
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
 from requests.exceptions import ConnectionError
 from zeep.exceptions import XMLSyntaxError
 
@@ -25,8 +29,63 @@ class TEDBClientTest(TestCase):
 
         client = TEDBClient()
 
-        mock_client_class.assert_called_once_with(TEDBClient.WSDL_URL)
+        mock_client_class.assert_not_called()
         self.assertEqual(client.client, mock_client)
+        self.assertEqual(client.client, mock_client)
+        mock_client_class.assert_called_once_with(TEDBClient.WSDL_URL, transport=None)
+
+    @patch("plans.taxation.tedb_client.Client")
+    def test_client_not_initialized_on_cache_hit(self, mock_client_class):
+        """The WSDL is not loaded while rates are served from the cache."""
+        client = TEDBClient()
+        cache.set(client._get_cache_key("DE"), Decimal("19"))
+
+        self.assertEqual(client.get_vat_rate("DE"), Decimal("19"))
+
+        mock_client_class.assert_not_called()
+
+    @patch("plans.taxation.tedb_client.Client")
+    def test_client_initialization_retried_after_interval(self, mock_client_class):
+        """A failed initialization is retried only after INIT_RETRY_INTERVAL."""
+        mock_client_class.side_effect = ConnectionError("Network error")
+        client = TEDBClient()
+
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            self.assertIsNone(client.client)
+            self.assertIsNone(client.client)
+            self.assertEqual(mock_client_class.call_count, 1)
+
+            mock_client = Mock()
+            mock_client_class.side_effect = None
+            mock_client_class.return_value = mock_client
+            frozen.tick(TEDBClient.INIT_RETRY_INTERVAL + 1)
+
+            self.assertEqual(client.client, mock_client)
+            self.assertEqual(mock_client_class.call_count, 2)
+
+    @override_settings(
+        PLANS_TEDB_WSDL="/srv/wsdl/VatRetrievalService.wsdl",
+        PLANS_TEDB_WSDL_CACHE="/tmp/plans-tedb-wsdl.db",
+    )
+    @patch("plans.taxation.tedb_client.SqliteCache")
+    @patch("plans.taxation.tedb_client.Client")
+    def test_client_initialization_from_settings(
+        self, mock_client_class, mock_cache_class
+    ):
+        """WSDL location and the transport cache are configurable."""
+        TEDBClient().client
+
+        mock_cache_class.assert_called_once_with(
+            path="/tmp/plans-tedb-wsdl.db", timeout=TEDBClient.CACHE_TIMEOUT
+        )
+        (wsdl,), kwargs = mock_client_class.call_args
+        self.assertEqual(wsdl, "/srv/wsdl/VatRetrievalService.wsdl")
+        self.assertIs(kwargs["transport"].cache, mock_cache_class.return_value)
+
+    @override_settings(PLANS_TEDB_WSDL="/nonexistent/VatRetrievalService.wsdl")
+    def test_client_initialization_missing_local_wsdl(self):
+        """A missing local WSDL is handled like an unreachable service."""
+        self.assertIsNone(TEDBClient().client)
 
     @patch("plans.taxation.tedb_client.Client")
     def test_client_initialization_failure(self, mock_client_class):
@@ -218,3 +277,113 @@ class TEDBClientTest(TestCase):
         # Verify: Should be Decimal("21"), not Decimal("21.0")
         self.assertEqual(rate, Decimal("21"))
         self.assertEqual(str(rate), "21")  # Ensure string representation is clean
+
+    def test_missing_rate_is_negatively_cached(self):
+        """A country without a standard rate is not looked up again for a while."""
+        self.client.client = Mock()
+        self.client.client.service.retrieveVatRates.return_value = Mock(
+            vatRateResults=[_vat_rate("DE", 7.0, rate_type="REDUCED")]
+        )
+
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            self.assertIsNone(self.client.get_vat_rate("DE"))
+            self.assertIsNone(self.client.get_vat_rate("DE"))
+            self.assertEqual(self.client.client.service.retrieveVatRates.call_count, 1)
+
+            frozen.tick(TEDBClient.NEGATIVE_CACHE_TIMEOUT + 1)
+            self.assertIsNone(self.client.get_vat_rate("DE"))
+            self.assertEqual(self.client.client.service.retrieveVatRates.call_count, 2)
+
+    def test_service_error_is_negatively_cached(self):
+        """A failed lookup is not repeated on the next call."""
+        self.client.client = Mock()
+        self.client.client.service.retrieveVatRates.side_effect = ConnectionError()
+
+        self.assertIsNone(self.client.get_vat_rate("DE"))
+        self.assertIsNone(self.client.get_vat_rate("DE"))
+
+        self.assertEqual(self.client.client.service.retrieveVatRates.call_count, 1)
+
+    def test_stats(self):
+        """Cache hits, misses and negative hits are counted."""
+        self.client.client = Mock()
+        self.client.client.service.retrieveVatRates.side_effect = lambda **kwargs: Mock(
+            vatRateResults=[_vat_rate("DE", 19.0)]
+        )
+
+        for country_code in ["DE", "DE", "FR", "FR", "FR"]:
+            self.client.get_vat_rate(country_code)
+
+        self.assertEqual(
+            self.client.stats, {"hits": 1, "misses": 2, "negative_hits": 2}
+        )
+
+
+class TEDBPrefetchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = TEDBClient()
+        self.client.client = Mock()
+        self.client.client.service.retrieveVatRates.return_value = Mock(
+            vatRateResults=[
+                _vat_rate("DE", 19.0),
+                _vat_rate("ES", 7.0, comment="VAT - Canary Islands - "),
+                _vat_rate("ES", 21.0),
+                _vat_rate("PL", 8.0, rate_type="REDUCED"),
+                _vat_rate("PL", 23.0),
+            ]
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_prefetch_all_in_one_request(self):
+        rates = self.client.prefetch_all(date(2025, 11, 1))
+
+        self.assertEqual(
+            rates, {"DE": Decimal("19"), "ES": Decimal("21"), "PL": Decimal("23")}
+        )
+        service = self.client.client.service
+        service.retrieveVatRates.assert_called_once()
+        kwargs = service.retrieveVatRates.call_args.kwargs
+        self.assertEqual(kwargs["situationOn"], "2025-11-01")
+        self.assertIn("DE", kwargs["memberStates"]["isoCode"])
+        self.assertIn("SE", kwargs["memberStates"]["isoCode"])
+
+    def test_prefetched_rates_are_served_from_cache(self):
+        self.client.prefetch_all()
+        self.client.client.service.retrieveVatRates.reset_mock()
+
+        self.assertEqual(self.client.get_vat_rate("ES"), Decimal("21"))
+        self.assertEqual(self.client.get_vat_rate("PL"), Decimal("23"))
+        self.client.client.service.retrieveVatRates.assert_not_called()
+
+    def test_prefetch_all_service_error(self):
+        self.client.client.service.retrieveVatRates.side_effect = ConnectionError()
+
+        self.assertEqual(self.client.prefetch_all(), {})
+
+    @patch("plans.taxation.tedb_client.Client")
+    def test_prefetch_command(self, mock_client_class):
+        mock_client_class.return_value = self.client.client
+        out = StringIO()
+
+        call_command("prefetch_vat_rates", date="2025-11-01", stdout=out)
+
+        self.assertEqual(out.getvalue(), "VAT rates of 3 countries were cached\n")
+        self.assertEqual(
+            cache.get(self.client._get_cache_key("PL", "2025-11-01")), Decimal("23")
+        )
+
+    def test_prefetch_command_invalid_date(self):
+        with self.assertRaises(CommandError):
+            call_command("prefetch_vat_rates", date="tomorrow")
+
+
+def _vat_rate(country_code, value, rate_type="STANDARD", comment=None):
+    return Mock(
+        memberState=country_code,
+        type=rate_type,
+        rate=Mock(type="DEFAULT", value=value),
+        comment=comment,
+    )
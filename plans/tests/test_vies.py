@@ -0,0 +1,102 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from zeep.exceptions import TransportError
+
+from plans.taxation import vies
+from plans.taxation.eu import EUTaxationPolicy
+
+checked = []
+VALID_IDS = {"CZ48136450", "BE0203201340"}
+
+
+def stub_backend(vat_id):
+    checked.append(vat_id)
+    if vat_id.startswith("AT"):
+        raise TransportError("VIES is down")
+    return vat_id in VALID_IDS
+
+
+@override_settings(PLANS_VIES_BACKEND="plans.tests.test_vies.stub_backend")
+class VIESTests(TestCase):
+    def setUp(self):
+        checked.clear()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_validate_vat_id(self):
+        self.assertTrue(vies.validate_vat_id("CZ 48136450"))
+        self.assertFalse(vies.validate_vat_id("CZ12345678"))
+        with self.assertRaisesRegex(vies.VIESError, "VIES is down"):
+            vies.validate_vat_id("ATU12345678")
+
+    def test_not_cached_by_default(self):
+        vies.validate_vat_id("CZ48136450")
+        vies.validate_vat_id("CZ48136450")
+
+        self.assertEqual(checked, ["CZ48136450", "CZ48136450"])
+
+    def test_validate_vat_ids_deduplicates(self):
+        results = vies.validate_vat_ids(
+            ["CZ48136450", "CZ 48136450", "BE0203201340", "CZ12345678", "ATU1"]
+        )
+
+        self.assertEqual(
+            sorted(checked), ["ATU1", "BE0203201340", "CZ12345678", "CZ48136450"]
+        )
+        self.assertIs(results["CZ48136450"], True)
+        self.assertIs(results["CZ 48136450"], True)
+        self.assertIs(results["BE0203201340"], True)
+        self.assertIs(results["CZ12345678"], False)
+        self.assertIsInstance(results["ATU1"], vies.VIESError)
+
+    @override_settings(
+        PLANS_VIES_CACHE="default",
+        PLANS_VIES_CACHE_TIMEOUTS={"valid": 300, "invalid": 200, "error": 100},
+    )
+    def test_results_cached_with_separate_timeouts(self):
+        ids = ["CZ48136450", "CZ12345678", "ATU1"]
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            vies.validate_vat_ids(ids)
+            vies.validate_vat_ids(ids)
+            self.assertEqual(len(checked), 3)
+
+            frozen.tick(150)
+            vies.validate_vat_ids(ids)
+            self.assertEqual(checked[3:], ["ATU1"])
+
+            frozen.tick(100)
+            vies.validate_vat_ids(ids)
+            self.assertEqual(sorted(checked[4:]), ["ATU1", "CZ12345678"])
+
+    @override_settings(
+        PLANS_VIES_CACHE="default", PLANS_TAX=Decimal("23.0"), PLANS_TAX_COUNTRY="PL"
+    )
+    def test_policy_uses_cached_result(self):
+        self.assertEqual(
+            EUTaxationPolicy.get_tax_rate("CZ48136450", "CZ"), (None, True)
+        )
+        with mock.patch("plans.taxation.eu.vies.get_backend") as get_backend:
+            self.assertEqual(
+                EUTaxationPolicy.get_tax_rate("CZ48136450", "CZ"), (None, True)
+            )
+        get_backend.assert_not_called()
+
+    @override_settings(
+        PLANS_VIES_CACHE="default", PLANS_TAX=Decimal("23.0"), PLANS_TAX_COUNTRY="PL"
+    )
+    def test_policy_falls_back_on_cached_error(self):
+        with mock.patch.object(
+            EUTaxationPolicy, "_get_vat_rate_from_tedb", return_value=Decimal("20")
+        ):
+            for _ in range(2):
+                self.assertEqual(
+                    EUTaxationPolicy.get_tax_rate("ATU1", "AT"), (Decimal("20"), False)
+                )
+
+        self.assertEqual(checked, ["ATU1"])
@@ -1,8 +1,19 @@
+import base64
+import json
+from copy import deepcopy
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import translation
 from model_bakery import baker
 
+from plans import catalog
+from plans.models import Order
+from plans.paginators import KeysetPaginator
+
 User = get_user_model()
 
 
@@ -37,6 +48,94 @@ class CurrentPlanViewTests(TestCase):
         self.assertContains(response, "<dd>Foo</dd>", html=True)
 
 
+class PricingViewTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan = baker.make(
+                "Plan", name="Foo plan", available=True, visible=True
+            )
+            quota = baker.make("Quota", name="Foo quota")
+            baker.make("PlanQuota", plan=self.plan, quota=quota, value=7)
+            baker.make("PlanPricing", plan=self.plan, price=10)
+
+    def test_get_anonymous_cached(self):
+        response = self.client.get(reverse("pricing"))
+        self.assertContains(response, "Foo plan")
+        self.assertContains(response, "Foo quota")
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        # Only the catalog version is checked by the conditional request handling
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("pricing"))
+        self.assertContains(response, "Foo plan")
+
+    def test_table_rendered_per_request(self):
+        templates = deepcopy(settings.TEMPLATES)
+        templates[0]["OPTIONS"]["loaders"].insert(
+            0,
+            (
+                "django.template.loaders.locmem.Loader",
+                {"plans/plan_table.html": "Path: {{ request.get_full_path }}"},
+            ),
+        )
+
+        with override_settings(TEMPLATES=templates):
+            self.client.get(reverse("pricing"), {"a": "1"})
+            response = self.client.get(reverse("pricing"), {"b": "2"})
+
+        self.assertContains(response, "Path: /plan/pricing/?b=2")
+
+    def test_not_modified(self):
+        response = self.client.get(reverse("pricing"))
+
+        response = self.client.get(
+            reverse("pricing"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            reverse("pricing"), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_invalidates(self):
+        etag = self.client.get(reverse("pricing"))["ETag"]
+
+        self.plan.name = "Bar plan"
+        self.plan.save()
+
+        response = self.client.get(reverse("pricing"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Bar plan")
+
+    def test_deleted_plan_changes_etag(self):
+        other_plan = baker.make("Plan", available=True, visible=True)
+        etag = self.client.get(reverse("pricing"))["ETag"]
+
+        other_plan.delete()
+
+        self.assertNotEqual(self.client.get(reverse("pricing"))["ETag"], etag)
+
+    def test_etag_depends_on_language(self):
+        etag = self.client.get(reverse("pricing"))["ETag"]
+
+        with translation.override("pl"):
+            self.assertNotEqual(self.client.get(reverse("pricing"))["ETag"], etag)
+
+    def test_get_authenticated_not_cached(self):
+        user = baker.make(User)
+        baker.make("UserPlan", user=user, plan=self.plan)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("pricing"))
+
+        self.assertContains(response, "your current plan")
+        self.assertNotIn("ETag", response)
+
+
 class ChangePlanViewTests(TestCase):
     def test_get(self):
         user = baker.make(User, username="Foo")
@@ -99,6 +198,55 @@ class OrderListViewTests(TestCase):
             html=True,
         )
 
+    def test_keyset_pagination(self):
+        user = baker.make(User)
+        orders = baker.make("Order", user=user, _quantity=23)
+        baker.make("Order", _quantity=3)
+        # Orders without created are listed as well
+        Order.objects.filter(pk__in=[o.pk for o in orders[5:15]]).update(created=None)
+        expected = list(Order.objects.filter(user=user).order_by("-pk"))
+        self.client.force_login(user)
+
+        pages = [self.client.get(reverse("order_list"))]
+        while pages[-1].context["page_obj"].has_next():
+            cursor = pages[-1].context["page_obj"].next_cursor
+            pages.append(self.client.get(reverse("order_list"), {"after": cursor}))
+
+        self.assertEqual(
+            [list(page.context["object_list"]) for page in pages],
+            [expected[:10], expected[10:20], expected[20:]],
+        )
+        self.assertFalse(pages[0].context["page_obj"].has_previous())
+        self.assertContains(pages[1], 'class="pagination__prev"')
+
+        cursor = pages[2].context["page_obj"].previous_cursor
+        response = self.client.get(reverse("order_list"), {"before": cursor})
+        self.assertEqual(list(response.context["object_list"]), expected[10:20])
+        self.assertTrue(response.context["page_obj"].has_previous())
+        cursor = response.context["page_obj"].previous_cursor
+        response = self.client.get(reverse("order_list"), {"before": cursor})
+        self.assertEqual(list(response.context["object_list"]), expected[:10])
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_invalid_cursor(self):
+        user = baker.make(User)
+        self.client.force_login(user)
+
+        crafted = ([None], [[1]], [{"a": 1}], [1, 2])
+        cursors = ["foo"] + [
+            base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            for values in crafted
+        ]
+        for cursor in cursors:
+            for direction in ("after", "before"):
+                response = self.client.get(reverse("order_list"), {direction: cursor})
+
+                self.assertEqual(response.status_code, 404, (cursor, direction))
+
+    def test_nullable_ordering_field(self):
+        with self.assertRaises(ImproperlyConfigured):
+            KeysetPaginator(Order.objects.all(), 10, ("-created", "-pk"))
+
 
 class OrderPaymentReturnViewTests(TestCase):
     def test_success(self):
@@ -2,6 +2,7 @@ import random
 import re
 import warnings
 from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
 from decimal import Decimal
 from io import StringIO
 from unittest import mock
@@ -16,9 +17,12 @@ from django.contrib.sessions.middleware import SessionMiddleware
 from django.core import mail
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.management import call_command
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_save
+from django.template import Context, Template
 from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.timezone import localdate, now
 from django_concurrent_tests.helpers import call_concurrently
@@ -27,8 +31,14 @@ from internet_sabotage import no_connection
 from model_bakery import baker
 
 from plans import tasks
-from plans.admin import OrderAdmin, make_order_invoice
+from plans.admin import (
+    OrderAdmin,
+    make_order_completed,
+    make_order_invoice,
+    make_order_returned,
+)
 from plans.base.models import (
+    DEFAULT_INVOICE_NUMBER_FORMAT,
     AbstractBillingInfo,
     AbstractInvoice,
     AbstractOrder,
@@ -37,11 +47,23 @@ from plans.base.models import (
     AbstractPricing,
     AbstractRecurringUserPlan,
     AbstractUserPlan,
+    compile_invoice_number_format,
+)
+from plans.paginators import EstimatedCountPaginator
+from plans.plan_change import (
+    PlanChangePolicy,
+    StandardPlanChangePolicy,
+    get_policy,
 )
-from plans.plan_change import PlanChangePolicy, StandardPlanChangePolicy
 from plans.quota import get_user_quota
+from plans.taxation import TaxationPolicy
 from plans.taxation.eu import EUTaxationPolicy
-from plans.validators import ModelCountValidator
+from plans.utils import get_taxation_policy
+from plans.validators import (
+    ModelAttributeValidator,
+    ModelCountValidator,
+    get_validators,
+)
 from plans.views import CreateOrderView
 
 User = get_user_model()
@@ -370,6 +392,43 @@ class TestInvoice(TestCase):
         i.issued = date(2010, 5, 30)
         self.assertEqual(i.get_full_number(), "2010.123.05")
 
+    def test_get_full_number_fast_path_matches_template(self):
+        for date_format in ("m/Y", "d/m/Y", "Y-m", "Y.m.d"):
+            number_format = DEFAULT_INVOICE_NUMBER_FORMAT.replace("m/Y", date_format)
+            template, fast_date_format = compile_invoice_number_format(number_format)
+            self.assertEqual(fast_date_format, date_format)
+            for invoice_type in Invoice.INVOICE_TYPES:
+                i = Invoice(number=7, type=invoice_type[0], issued=date(2010, 5, 3))
+                with override_settings(PLANS_INVOICE_NUMBER_FORMAT=number_format):
+                    self.assertEqual(
+                        i.get_full_number(),
+                        template.render(Context({"invoice": i})),
+                    )
+
+    @override_settings(
+        USE_TZ=True,
+        TIME_ZONE="America/Chicago",
+        PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT,
+    )
+    def test_get_full_number_non_date_issued(self):
+        template, _ = compile_invoice_number_format(DEFAULT_INVOICE_NUMBER_FORMAT)
+        # 1 June in UTC, which is still 31 May in Chicago
+        i = Invoice(number=7, issued=datetime(2010, 6, 1, 2, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(i.get_full_number(), "7/FV/05/2010")
+        # Left to the template, which doesn't parse strings
+        i = Invoice(number=7, issued="2010-05-03")
+        self.assertEqual(i.get_full_number(), template.render(Context({"invoice": i})))
+
+    def test_get_full_number_template_is_compiled_once(self):
+        number_format = "{{ invoice.number }}-{{ invoice.issued|date:'Y' }}"
+        i = Invoice(number=1, issued=date(2010, 5, 3))
+        with override_settings(PLANS_INVOICE_NUMBER_FORMAT=number_format):
+            with patch("plans.base.models.Template", wraps=Template) as template:
+                compile_invoice_number_format.cache_clear()
+                self.assertEqual(i.get_full_number(), "1-2010")
+                self.assertEqual(i.get_full_number(), "1-2010")
+        template.assert_called_once_with(number_format)
+
     def test_set_issuer_invoice_data_raise(self):
         issdata = settings.PLANS_INVOICE_ISSUER
         del settings.PLANS_INVOICE_ISSUER
@@ -411,6 +470,64 @@ class TestInvoice(TestCase):
         self.assertEqual(i.buyer_city, u.billinginfo.shipping_city)
         self.assertEqual(i.buyer_country, u.billinginfo.shipping_country)
 
+    def _make_invoice(self):
+        o = Order.objects.all()[0]
+        day = date(2010, 5, 3)
+        i = Invoice(issued=day, selling_date=day, payment_date=day)
+        i.copy_from_order(o)
+        i.set_issuer_invoice_data()
+        i.set_buyer_invoice_data(o.user.billinginfo)
+        i.clean()
+        return i
+
+    @override_settings(PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT)
+    def test_invoice_full_number_saved_by_insert(self):
+        i = self._make_invoice()
+
+        with CaptureQueriesContext(connection) as queries:
+            i.save()
+
+        invoice_queries = [
+            q["sql"] for q in queries if Invoice._meta.db_table in q["sql"]
+        ]
+        self.assertEqual(len(invoice_queries), 1)
+        self.assertTrue(invoice_queries[0].startswith("INSERT"))
+        self.assertEqual(
+            Invoice.objects.get(pk=i.pk).full_number, "%d/FV/05/2010" % i.number
+        )
+
+    @override_settings(
+        USE_TZ=True,
+        TIME_ZONE="America/Chicago",
+        PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT,
+    )
+    def test_invoice_full_number_of_coerced_issued(self):
+        for issued in (
+            "2010-05-31",
+            # 1 June in UTC, stored as 31 May in Chicago
+            datetime(2010, 6, 1, 2, 0, tzinfo=dt_timezone.utc),
+        ):
+            i = self._make_invoice()
+            i.issued = issued
+
+            i.save()
+
+            self.assertEqual(i.issued, date(2010, 5, 31))
+            self.assertEqual(i.full_number, "%d/FV/05/2010" % i.number)
+            saved = Invoice.objects.get(pk=i.pk)
+            self.assertEqual(saved.full_number, saved.get_full_number())
+
+    @override_settings(
+        PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}-{{ invoice.pk }}"
+    )
+    def test_invoice_full_number_using_pk(self):
+        i = self._make_invoice()
+
+        i.save()
+
+        self.assertEqual(i.full_number, "%d-%d" % (i.number, i.pk))
+        self.assertEqual(Invoice.objects.get(pk=i.pk).full_number, i.full_number)
+
     def test_invoice_number(self):
         settings.PLANS_INVOICE_NUMBER_FORMAT = (
             "{{ invoice.number }}/{% if "
@@ -2340,9 +2457,54 @@ class CreateOrderViewTestCase(TestCase):
         self.assertEqual(o.tax, None)
 
 
+class OptionalUsersValidator(ModelCountValidator):
+    code = "OPTIONAL_USERS"
+    model = User
+    required_to_activate = False
+
+
+optional_users_validator = OptionalUsersValidator()
+
+
 class ValidatorsTestCase(TestCase):
     fixtures = ["test_django-plans_auth"]
 
+    def test_get_validators(self):
+        from example.foo.validators import max_foos_validator
+
+        validators = get_validators()
+        self.assertEqual(validators.all, (max_foos_validator,))
+        self.assertIs(get_validators(), validators)
+
+        with override_settings(
+            PLANS_VALIDATORS={
+                "OPTIONAL_USERS": "plans.tests.tests.optional_users_validator",
+                "MAX_FOO_COUNT": max_foos_validator,
+            }
+        ):
+            validators = get_validators()
+            self.assertEqual(
+                validators.all, (optional_users_validator, max_foos_validator)
+            )
+            self.assertEqual(validators.required_to_activate, (max_foos_validator,))
+            self.assertEqual(validators.other, (optional_users_validator,))
+
+        self.assertEqual(get_validators().all, (max_foos_validator,))
+
+    def test_policies_follow_settings(self):
+        self.assertIs(type(get_policy()), StandardPlanChangePolicy)
+        self.assertIs(get_taxation_policy(), EUTaxationPolicy)
+
+        with override_settings(
+            PLANS_CHANGE_POLICY="plans.plan_change.PlanChangePolicy",
+            PLANS_TAXATION_POLICY="plans.taxation.TaxationPolicy",
+        ):
+            self.assertIs(type(get_policy()), PlanChangePolicy)
+            self.assertIs(get_taxation_policy(), TaxationPolicy)
+
+        self.assertIs(type(get_policy()), StandardPlanChangePolicy)
+        self.assertIs(get_taxation_policy(), EUTaxationPolicy)
+
     def test_model_count_validator(self):
         """
         We create a test model validator for User. It will raise ValidationError when QUOTA_NAME value
@@ -2364,6 +2526,46 @@ class ValidatorsTestCase(TestCase):
             validator_object(user=None, quota_dict={"QUOTA_NAME": 3}), None
         )
 
+    def test_model_attribute_validator_db_filter(self):
+        class MaxOrderAmountValidator(ModelAttributeValidator):
+            code = "MAX_ORDER_AMOUNT"
+            model = Order
+            attribute = "amount"
+
+            def get_queryset(self, user):
+                return super().get_queryset(user).filter(user=user).order_by("pk")
+
+        class MaxOrderAmountDBValidator(MaxOrderAmountValidator):
+            use_db_filter = True
+            message_fields = ["id"]
+            max_listed_objects = 2
+
+        user = baker.make("User")
+        orders = [
+            baker.make(Order, user=user, amount=amount) for amount in (5, 20, 30, 40)
+        ]
+        baker.make(Order, amount=50)
+        quota_dict = {"MAX_ORDER_AMOUNT": 10}
+
+        with self.assertRaises(ValidationError) as python_error:
+            MaxOrderAmountValidator()(user, quota_dict)
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as db_error:
+                MaxOrderAmountDBValidator()(user, quota_dict)
+
+        self.assertEqual(python_error.exception.params["objects"].count("<a href"), 3)
+        self.assertEqual(
+            db_error.exception.params["objects"],
+            '<a href="%s">Order #%d</a>, <a href="%s">Order #%d</a>'
+            % (
+                orders[1].get_absolute_url(),
+                orders[1].pk,
+                orders[2].get_absolute_url(),
+                orders[2].pk,
+            ),
+        )
+        self.assertIsNone(MaxOrderAmountDBValidator()(user, {"MAX_ORDER_AMOUNT": 40}))
+
         #   TODO: FIX this test not to use Pricing for testing  ModelAttributeValidator
         # def test_model_attribute_validator(self):
         #     """
@@ -2811,6 +3013,8 @@ class AdminActionsTestCase(TestCase):
         self.plan_pricing = PlanPricing.objects.first()
         self.modeladmin = OrderAdmin(Order, admin_site)
         self.request = RequestFactory().get("/")
+        SessionMiddleware(lambda x: x).process_request(self.request)
+        setattr(self.request, "_messages", FallbackStorage(self.request))
 
     def test_make_order_invoice_not_completed(self):
         """
@@ -2848,6 +3052,341 @@ class AdminActionsTestCase(TestCase):
             level="ERROR",
         )
 
+    def test_make_order_invoice(self):
+        orders = [
+            Order.objects.create(
+                user=self.user,
+                pricing=self.plan_pricing.pricing,
+                amount=100,
+                plan=self.plan_pricing.plan,
+                completed=now(),
+            )
+            for _ in range(3)
+        ]
+        Invoice.create(orders[0], Invoice.INVOICE_TYPES.INVOICE)
+
+        make_order_invoice(
+            self.modeladmin,
+            self.request,
+            Order.objects.filter(pk__in=[o.pk for o in orders]),
+        )
+
+        for order in orders:
+            self.assertEqual(
+                Invoice.objects.filter(
+                    order=order, type=Invoice.INVOICE_TYPES.INVOICE
+                ).count(),
+                1,
+            )
+
+    def test_make_order_invoice_sends_post_save(self):
+        orders = self.make_orders(2, completed=now())
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Invoice)
+        self.addCleanup(post_save.disconnect, receiver, sender=Invoice)
+
+        make_order_invoice(
+            self.modeladmin,
+            self.request,
+            Order.objects.filter(pk__in=[o.pk for o in orders]),
+        )
+
+        created = [
+            call.kwargs["instance"].order
+            for call in receiver.call_args_list
+            if call.kwargs["created"]
+        ]
+        self.assertCountEqual(created, orders)
+
+    def make_orders(self, count, **kwargs):
+        return [
+            Order.objects.create(
+                user=self.user,
+                pricing=self.plan_pricing.pricing,
+                amount=100,
+                plan=self.plan_pricing.plan,
+                **kwargs,
+            )
+            for _ in range(count)
+        ]
+
+    def test_make_order_completed(self):
+        userplan = self.user.userplan
+        userplan.plan = self.plan_pricing.plan
+        userplan.expire = localdate() + timedelta(days=10)
+        userplan.save()
+        orders = self.make_orders(3)
+        completed_order = self.make_orders(1, completed=now())[0]
+        self.modeladmin.message_user = mock.Mock()
+        progress = mock.Mock()
+
+        processed, errors = Order.complete_orders(
+            [o.pk for o in orders[:1]], progress=progress
+        )
+        self.assertEqual(len(processed), 1)
+        progress.assert_called_once_with(1)
+        make_order_completed(
+            self.modeladmin,
+            self.request,
+            Order.objects.filter(pk__in=[o.pk for o in orders + [completed_order]]),
+        )
+
+        self.modeladmin.message_user.assert_called_once_with(
+            self.request, "2 orders completed."
+        )
+        userplan.refresh_from_db()
+        # Extensions of the same user stack
+        self.assertEqual(
+            userplan.expire,
+            localdate() + timedelta(days=10 + 3 * self.plan_pricing.pricing.period),
+        )
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.STATUS.COMPLETED)
+
+    def test_make_order_returned(self):
+        userplan = self.user.userplan
+        userplan.plan = self.plan_pricing.plan
+        userplan.expire = localdate() + timedelta(days=10)
+        userplan.save()
+        orders = self.make_orders(2)
+        new_order = self.make_orders(1)[0]
+        Order.complete_orders([o.pk for o in orders])
+        self.modeladmin.message_user = mock.Mock()
+
+        make_order_returned(
+            self.modeladmin,
+            self.request,
+            Order.objects.filter(pk__in=[o.pk for o in orders + [new_order]]),
+        )
+
+        self.modeladmin.message_user.assert_has_calls(
+            [
+                mock.call(self.request, "2 orders returned."),
+                mock.call(
+                    self.request,
+                    f"Order {new_order.pk} could not be processed: Cannot return "
+                    "order with status other than COMPLETED and NOT_VALID: 1",
+                    level="ERROR",
+                ),
+            ]
+        )
+        userplan.refresh_from_db()
+        self.assertEqual(userplan.expire, localdate() + timedelta(days=10))
+        new_order.refresh_from_db()
+        self.assertEqual(new_order.status, Order.STATUS.NEW)
+
+    def test_make_order_invoice_skips_invoiced(self):
+        orders = self.make_orders(5, completed=now())
+        Invoice.create(orders[0], Invoice.INVOICE_TYPES.INVOICE)
+        queryset = Order.objects.filter(pk__in=[o.pk for o in orders])
+        self.modeladmin.message_user = mock.Mock()
+
+        with CaptureQueriesContext(connection) as queries:
+            make_order_invoice(self.modeladmin, self.request, queryset)
+
+        # Invoiced orders are found by the query of orders
+        self.assertIn("EXISTS", queries[0]["sql"])
+        for order in orders:
+            self.assertEqual(
+                Invoice.objects.filter(
+                    order=order, type=Invoice.INVOICE_TYPES.INVOICE
+                ).count(),
+                1,
+            )
+        self.modeladmin.message_user.assert_called_once_with(
+            self.request, "4 invoices created."
+        )
+
+
+class UserPlanAdminTestCase(TestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            username="admin", email="admin@test.com", password="adminpass"
+        )
+        self.client.force_login(self.superuser)
+        self.url = reverse("admin:plans_userplan_changelist")
+        self.pricing = baker.make("Pricing", name="Monthly", period=30)
+
+    def make_user_plans(self, count):
+        for i in range(count):
+            user_plan = baker.make(
+                "UserPlan", user=baker.make("User"), expire=date(2026, 10, 27)
+            )
+            if i % 2:
+                baker.make(
+                    "RecurringUserPlan",
+                    user_plan=user_plan,
+                    pricing=self.pricing,
+                    payment_provider="paypal",
+                    token_verified=True,
+                )
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        self.make_user_plans(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        self.make_user_plans(6)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        model_admin = response.context["cl"].model_admin
+        pricings = [
+            model_admin.recurring__pricing(user_plan)
+            for user_plan in response.context["cl"].result_list
+        ]
+        self.assertEqual(pricings.count("Monthly (30 days)"), 4)
+        self.assertEqual(pricings.count(None), 4)
+
+    def test_changelist_date_hierarchy(self):
+        self.make_user_plans(2)
+
+        response = self.client.get(
+            self.url, {"expire__year": 2026, "expire__month": 10}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    def test_estimated_count_paginator(self):
+        paginator = EstimatedCountPaginator(UserPlan.objects.order_by("pk"), 10)
+        # No planner statistics outside of PostgreSQL
+        self.assertIsNone(paginator.get_estimate())
+        self.assertEqual(paginator.count, UserPlan.objects.count())
+
+        with patch.object(
+            EstimatedCountPaginator, "get_estimate", return_value=2000000
+        ):
+            paginator = EstimatedCountPaginator(UserPlan.objects.order_by("pk"), 10)
+            self.assertEqual(paginator.count, 2000000)
+            self.assertEqual(paginator.num_pages, 200000)
+
+            # Small estimates are counted exactly
+            paginator = EstimatedCountPaginator(UserPlan.objects.order_by("pk"), 10)
+            paginator.estimate_threshold = 3000000
+            self.assertEqual(paginator.count, UserPlan.objects.count())
+
+
+class InvoiceCreateBulkTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        self.user = User.objects.get(username="test1")
+        plan_pricing = PlanPricing.objects.first()
+        self.orders = [
+            Order.objects.create(
+                user=self.user,
+                pricing=plan_pricing.pricing,
+                amount=100,
+                plan=plan_pricing.plan,
+                completed=now(),
+            )
+            for _ in range(3)
+        ]
+        mail.outbox = []
+
+    @override_settings(PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT)
+    def test_numbers_continue_the_sequence(self):
+        first = Invoice.create(self.orders[0], Invoice.INVOICE_TYPES.INVOICE)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoices = Invoice.create_bulk(
+                self.orders[1:], Invoice.INVOICE_TYPES.INVOICE
+            )
+
+        self.assertEqual(
+            [i.number for i in invoices], [first.number + 1, first.number + 2]
+        )
+        for invoice in invoices:
+            invoice_from_db = Invoice.objects.get(pk=invoice.pk)
+            self.assertEqual(invoice_from_db.full_number, invoice.get_full_number())
+            self.assertEqual(invoice_from_db.payment_date, invoice.payment_date)
+            self.assertEqual(invoice_from_db.total, invoice.total)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_queries_do_not_depend_on_number_of_orders(self):
+        with CaptureQueriesContext(connection) as queries:
+            Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE)
+
+        def count(prefix, table):
+            return sum(
+                1
+                for q in queries
+                if q["sql"].startswith(prefix) and f'"{table}"' in q["sql"]
+            )
+
+        self.assertEqual(count("SELECT", User._meta.db_table), 1)
+        self.assertEqual(count("SELECT", BillingInfo._meta.db_table), 1)
+        # Orders without an invoice, initial number of the sequence
+        self.assertEqual(count("SELECT", Invoice._meta.db_table), 2)
+        self.assertEqual(count("INSERT", Invoice._meta.db_table), 1)
+        self.assertEqual(count("UPDATE", Invoice._meta.db_table), 0)
+
+    def test_orders_with_invoice_are_skipped(self):
+        Invoice.create(self.orders[0], Invoice.INVOICE_TYPES.INVOICE)
+
+        invoices = Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE)
+
+        self.assertEqual([i.order for i in invoices], self.orders[1:])
+        self.assertEqual(
+            Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE), []
+        )
+        self.assertEqual(
+            Invoice.objects.filter(
+                order__in=self.orders, type=Invoice.INVOICE_TYPES.INVOICE
+            ).count(),
+            3,
+        )
+
+    @override_settings(
+        PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}/{{ invoice.total }}"
+    )
+    def test_full_number_of_saved_values(self):
+        invoices = Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE)
+
+        for invoice in invoices:
+            invoice_from_db = Invoice.objects.get(pk=invoice.pk)
+            self.assertEqual(
+                invoice_from_db.full_number, invoice_from_db.get_full_number()
+            )
+
+    def test_create_invoices_command(self):
+        Invoice.create(self.orders[0], Invoice.INVOICE_TYPES.INVOICE)
+
+        call_command("create_invoices", chunk_size=2, stdout=StringIO())
+
+        for order in self.orders:
+            self.assertEqual(
+                Invoice.objects.filter(
+                    order=order, type=Invoice.INVOICE_TYPES.INVOICE
+                ).count(),
+                1,
+            )
+        out = StringIO()
+        call_command("create_invoices", stdout=out)
+        self.assertEqual(out.getvalue(), "0 invoices created\n")
+
+    def test_users_without_billing_info_are_skipped(self):
+        BillingInfo.objects.filter(user=self.user).delete()
+
+        self.assertEqual(
+            Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE), []
+        )
+
+    @override_settings(
+        PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}-{{ invoice.pk }}"
+    )
+    def test_full_number_using_pk(self):
+        invoices = Invoice.create_bulk(self.orders, Invoice.INVOICE_TYPES.INVOICE)
+
+        for invoice in invoices:
+            self.assertEqual(
+                Invoice.objects.get(pk=invoice.pk).full_number,
+                "%d-%d" % (invoice.number, invoice.pk),
+            )
+
 
 class TasksTestCase(TestCase):
     def setUp(self):
@@ -1,3 +1,4 @@
+import functools
 from decimal import Decimal
 
 from django.conf import settings
@@ -49,11 +50,17 @@ def country_code_transform(country_code):
     return transform_dict.get(country_code, country_code)
 
 
-def calculate_tax_rate(tax_number, country_code, request=None):
+@functools.lru_cache(maxsize=None)
+def get_taxation_policy():
+    """Taxation policy from ``PLANS_TAXATION_POLICY``, resolved only once"""
     taxation_policy = getattr(settings, "PLANS_TAXATION_POLICY", None)
     if not taxation_policy:
         raise ImproperlyConfigured("PLANS_TAXATION_POLICY is not set")
-    taxation_policy = import_name(taxation_policy)
+    return import_name(taxation_policy)
+
+
+def calculate_tax_rate(tax_number, country_code, request=None):
+    taxation_policy = get_taxation_policy()
     tax, request_successful = taxation_policy.get_tax_rate(
         tax_number, country_code, request
     )
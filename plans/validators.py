@@ -1,7 +1,16 @@
+import functools
+from collections import namedtuple
+
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
+from plans import catalog
 from plans.importer import import_name
 from plans.quota import get_user_quota
 
@@ -42,6 +51,24 @@ class QuotaValidator(object):
         """
         raise NotImplementedError("Please implement specific QuotaValidator")
 
+    def bulk_validate(self, users, quota_dicts):
+        """
+        Validates many users at once, ``quota_dicts`` maps user pk to the quota dict
+        the user is validated against.
+
+        Returns dict ``{user pk: number of objects}`` of users exceeding the quota.
+        This implementation calls the validator for every user and doesn't know
+        the number (None); validators able to check many users with a few
+        grouped queries override it.
+        """
+        violations = {}
+        for user in users:
+            try:
+                self(user, quota_dicts[user.pk])
+            except ValidationError:
+                violations[user.pk] = None
+        return violations
+
     def on_activation(self, user, quota_dict=None, **kwargs):
         """
         Hook for any action that validator needs to do while successful activation of the plan
@@ -55,8 +82,18 @@ class QuotaValidator(object):
 class ModelCountValidator(QuotaValidator):
     """
     Validator that checks if there is no more than quota number of objects given model
+
+    With ``use_counter = True`` the number of user's objects is read from a
+    ``QuotaUsage`` counter, which is updated when objects of the model are
+    created or deleted, instead of counting them on every check. Counted are
+    all objects of the model whose ``user_field`` is the user, regardless of
+    ``get_queryset()``. Moving an object to another user is not counted, use
+    ``reconcile_counters()`` after that.
     """
 
+    use_counter = False
+    user_field = "user"
+
     @property
     def model(self):
         raise ImproperlyConfigured("ModelCountValidator requires model name")
@@ -64,6 +101,163 @@ class ModelCountValidator(QuotaValidator):
     def get_queryset(self, user):
         return self.model.objects.all()
 
+    def get_counted_queryset(self, user_id):
+        """Objects counted by the counter of a given user"""
+        return self.model.objects.filter(**{"%s_id" % self.user_field: user_id})
+
+    def get_bulk_queryset(self, user_ids):
+        """
+        Objects of all given users, counted by ``bulk_validate()`` per ``user_field``.
+        Only used when overridden (or with ``use_counter``), as it has to match
+        ``get_queryset()``; otherwise users are validated one by one.
+        """
+        return self.model.objects.filter(**{"%s_id__in" % self.user_field: user_ids})
+
+    def count_per_user(self, queryset):
+        """Returns ``{user pk: number of objects}`` with a single grouped query"""
+        return dict(
+            queryset.order_by()
+            .values_list("%s_id" % self.user_field)
+            .annotate(Count("pk"))
+        )
+
+    def get_counts(self, user_ids):
+        """Returns ``{user pk: number of objects}`` for given users"""
+        counts = {}
+        if self.use_counter:
+            counts = dict(
+                self._get_usage_model()
+                .objects.filter(codename=self.code, user_id__in=user_ids)
+                .values_list("user_id", "count")
+            )
+            user_ids = [user_id for user_id in user_ids if user_id not in counts]
+        if user_ids:
+            if self.use_counter:
+                queryset = self.model.objects.filter(
+                    **{"%s_id__in" % self.user_field: user_ids}
+                )
+            else:
+                queryset = self.get_bulk_queryset(user_ids)
+            counts.update(self.count_per_user(queryset))
+        return counts
+
+    def bulk_validate(self, users, quota_dicts):
+        cls = type(self)
+        if cls.__call__ is not ModelCountValidator.__call__ or not (
+            self.use_counter
+            or cls.get_bulk_queryset is not ModelCountValidator.get_bulk_queryset
+        ):
+            # Validation is customized or not known to count objects per user,
+            # check users one by one
+            return super().bulk_validate(users, quota_dicts)
+        quotas = {}
+        for user in users:
+            quota = self.get_quota_value(user, quota_dicts[user.pk])
+            if quota is not None:
+                quotas[user.pk] = quota
+        counts = self.get_counts(list(quotas)) if quotas else {}
+        return {
+            user_pk: counts[user_pk]
+            for user_pk, quota in quotas.items()
+            if counts.get(user_pk, 0) > quota
+        }
+
+    def get_total_count(self, user):
+        if self.use_counter and user is not None:
+            QuotaUsage = self._get_usage_model()
+            return QuotaUsage.get_count(
+                user.pk, self.code, self.get_counted_queryset(user.pk).count
+            )
+        return self.get_queryset(user).count()
+
+    def connect_counter(self):
+        """
+        Updates the counters when objects of the model are created or deleted.
+        Called on startup for counter validators in ``PLANS_VALIDATORS``.
+        """
+        dispatch_uid = "plans_quota_usage_%s" % self.code
+        post_save.connect(
+            self._on_save, sender=self.model, weak=False, dispatch_uid=dispatch_uid
+        )
+        post_delete.connect(
+            self._on_delete, sender=self.model, weak=False, dispatch_uid=dispatch_uid
+        )
+
+    def _on_save(self, sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            self._add(instance, 1)
+
+    def _on_delete(self, sender, instance, origin=None, **kwargs):
+        user_id = getattr(instance, "%s_id" % self.user_field)
+        if isinstance(origin, get_user_model()) and origin.pk == user_id:
+            # Cascade from deleting the user, the counter goes away as well
+            return
+        self._add(instance, -1)
+
+    def _add(self, instance, delta):
+        user_id = getattr(instance, "%s_id" % self.user_field)
+        if user_id is not None:
+            self._get_usage_model().add(
+                user_id, self.code, delta, self.get_counted_queryset(user_id).count
+            )
+
+    def reconcile_counters(self, batch_size=1000):
+        """
+        Recounts objects of all users in batches and fixes counters that
+        drifted, e.g. after ``bulk_create()``, ``QuerySet.update()`` or raw SQL
+        writes, which don't send model signals. Counters of a batch are locked
+        while their users' objects are counted.
+
+        :return: number of created or fixed counters
+        """
+        QuotaUsage = self._get_usage_model()
+        users = get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = users if last_pk is None else users.filter(pk__gt=last_pk)
+            user_ids = list(batch[:batch_size])
+            if not user_ids:
+                return fixed
+            last_pk = user_ids[-1]
+            with transaction.atomic():
+                counters = {
+                    counter.user_id: counter
+                    for counter in QuotaUsage.objects.select_for_update().filter(
+                        codename=self.code, user_id__in=user_ids
+                    )
+                }
+                counts = self.count_per_user(
+                    self.model.objects.filter(
+                        **{"%s_id__in" % self.user_field: user_ids}
+                    )
+                )
+                to_create = []
+                to_update = []
+                for user_id in user_ids:
+                    count = counts.get(user_id, 0)
+                    counter = counters.get(user_id)
+                    if counter is None:
+                        if count:
+                            to_create.append(
+                                QuotaUsage(
+                                    user_id=user_id, codename=self.code, count=count
+                                )
+                            )
+                    elif counter.count != count:
+                        counter.count = count
+                        counter.updated_at = now()
+                        to_update.append(counter)
+                QuotaUsage.objects.bulk_create(to_create, ignore_conflicts=True)
+                QuotaUsage.objects.bulk_update(to_update, ["count", "updated_at"])
+            fixed += len(to_create) + len(to_update)
+
+    @staticmethod
+    def _get_usage_model():
+        from plans.base.models import AbstractQuotaUsage
+
+        return AbstractQuotaUsage.get_concrete_model()
+
     def get_error_message(self, quota_value, **kwargs):
         return _(
             "Limit of %(model_name_plural)s exceeded. The limit is %(quota)s items."
@@ -79,7 +273,7 @@ class ModelCountValidator(QuotaValidator):
 
     def __call__(self, user, quota_dict=None, **kwargs):
         quota = self.get_quota_value(user, quota_dict)
-        total_count = self.get_queryset(user).count() + kwargs.get("add", 0)
+        total_count = self.get_total_count(user) + kwargs.get("add", 0)
         if quota is not None and total_count > quota:
             raise ValidationError(
                 message=self.get_error_message(quota),
@@ -94,8 +288,18 @@ class ModelAttributeValidator(ModelCountValidator):
 
     .. warning::
         ModelAttributeValidator requires `get_absolute_url()` method on provided model.
+
+    With ``use_db_filter = True`` the objects not in limits are found by the
+    database with ``get_violation_filter()`` instead of loading all objects of the
+    user. Only ``message_fields`` of at most ``max_listed_objects`` objects are
+    then loaded for the error message.
     """
 
+    use_db_filter = False
+    #: Fields used by ``str()`` and ``get_absolute_url()`` of the objects, all if None
+    message_fields = None
+    max_listed_objects = 10
+
     @property
     def attribute(self):
         raise ImproperlyConfigured(
@@ -109,7 +313,30 @@ class ModelAttributeValidator(ModelCountValidator):
     def get_error_message(self, quota_value, **kwargs):
         return _("Following %(model_name_plural)s are not in limits: %(objects)s")
 
-    def get_error_params(self, quota_value, total_count, **kwargs):
+    def get_violation_filter(self, quota_value):
+        """
+        ``Q`` object matching objects which don't pass ``check_attribute_value()``,
+        override both of them together
+        """
+        return Q(**{"%s__gt" % self.attribute: quota_value})
+
+    def get_not_valid_objects(self, user, quota_value):
+        if not self.use_db_filter:
+            return [
+                obj
+                for obj in self.get_queryset(user)
+                if not self.check_attribute_value(
+                    getattr(obj, self.attribute), quota_value
+                )
+            ]
+        queryset = self.get_queryset(user).filter(
+            self.get_violation_filter(quota_value)
+        )
+        if self.message_fields is not None:
+            queryset = queryset.only(*self.message_fields)
+        return list(queryset[: self.max_listed_objects])
+
+    def get_error_params(self, quota_value, total_count=None, **kwargs):
         return {
             "quota": quota_value,
             "validator_codename": self.code,
@@ -126,20 +353,37 @@ class ModelAttributeValidator(ModelCountValidator):
         quota_value = self.get_quota_value(user, quota_dict)
         not_valid_objects = []
         if quota_value is not None:
-            for obj in self.get_queryset(user):
-                if not self.check_attribute_value(
-                    getattr(obj, self.attribute), quota_value
-                ):
-                    not_valid_objects.append(obj)
+            not_valid_objects = self.get_not_valid_objects(user, quota_value)
         if not_valid_objects:
             raise ValidationError(
-                self.get_error_message(
+                message=self.get_error_message(
+                    quota_value, not_valid_objects=not_valid_objects
+                ),
+                params=self.get_error_params(
                     quota_value, not_valid_objects=not_valid_objects
                 ),
-                self.get_error_params(quota_value, not_valid_objects=not_valid_objects),
             )
 
 
+Validators = namedtuple("Validators", ["all", "required_to_activate", "other"])
+
+
+@functools.lru_cache(maxsize=None)
+def get_validators():
+    """
+    Returns ``Validators`` tuple of validator instances from ``PLANS_VALIDATORS``,
+    also split by ``required_to_activate``. The setting is resolved only once,
+    call ``get_validators.cache_clear()`` after changing it.
+    """
+    validators = import_name(getattr(settings, "PLANS_VALIDATORS", {}))
+    validators = tuple(import_name(validator) for validator in validators.values())
+    return Validators(
+        all=validators,
+        required_to_activate=tuple(v for v in validators if v.required_to_activate),
+        other=tuple(v for v in validators if not v.required_to_activate),
+    )
+
+
 def plan_validation(user, plan=None, on_activation=False):
     """
     Validates validator that represents quotas in a given system
@@ -151,24 +395,73 @@ def plan_validation(user, plan=None, on_activation=False):
         # if plan is not given, the default is to use current plan of the user
         plan = user.userplan.plan
     quota_dict = plan.get_quota_dict()
-    validators = getattr(settings, "PLANS_VALIDATORS", {})
-    validators = import_name(validators)
+    validators = get_validators()
     errors = {
         "required_to_activate": [],
         "other": [],
     }
 
-    for quota in validators:
-        validator = import_name(validators[quota])
-
-        if on_activation:
+    if on_activation:
+        for validator in validators.all:
             validator.on_activation(user, quota_dict)
-        else:
+        return errors
+
+    for kind in errors:
+        for validator in getattr(validators, kind):
             try:
                 validator(user, quota_dict)
             except ValidationError as e:
-                if validator.required_to_activate:
-                    errors["required_to_activate"].extend(e.messages)
-                else:
-                    errors["other"].extend(e.messages)
+                errors[kind].extend(e.messages)
     return errors
+
+
+def bulk_plan_validation(users, plan=None, chunk_size=1000):
+    """
+    Finds which of many users exceed quotas of their current plans (or of
+    ``plan``, e.g. before a downgrade), with a few grouped queries per chunk of
+    users instead of running every validator for every user.
+
+    Users without a user plan are skipped when ``plan`` is not given.
+
+    :return: dict ``{user pk: {quota codename: number of objects}}`` of users
+        exceeding any quota in ``PLANS_VALIDATORS``; the number is None for
+        validators which don't count objects
+    """
+    from plans.base.models import AbstractUserPlan
+
+    UserPlan = AbstractUserPlan.get_concrete_model()
+    validators = get_validators().all
+    users = list(users)
+    violations = {}
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start : start + chunk_size]
+        if plan is None:
+            plan_ids = dict(
+                UserPlan.objects.filter(user__in=chunk).values_list(
+                    "user_id", "plan_id"
+                )
+            )
+        else:
+            plan_ids = {user.pk: plan.pk for user in chunk}
+        # Users of the same plan share one quota dict
+        plan_quota_dicts = {
+            plan_id: catalog.get_quota_dict(plan_id)
+            for plan_id in set(plan_ids.values())
+        }
+        quota_dicts = {
+            user_pk: plan_quota_dicts[plan_id] for user_pk, plan_id in plan_ids.items()
+        }
+        chunk = [user for user in chunk if user.pk in quota_dicts]
+        for validator in validators:
+            for user_pk, count in validator.bulk_validate(chunk, quota_dicts).items():
+                violations.setdefault(user_pk, {})[validator.code] = count
+    return violations
+
+
+def get_counter_validators():
+    """Returns validators from ``PLANS_VALIDATORS`` keeping counts in ``QuotaUsage``"""
+    return [
+        validator
+        for validator in get_validators().all
+        if getattr(validator, "use_counter", False)
+    ]
@@ -9,7 +9,9 @@ from django.db.models import Q
 from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse, reverse_lazy
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition
 from django.views.generic import CreateView, RedirectView, TemplateView, View
 from django.views.generic.detail import (
     DetailView,
@@ -25,6 +27,7 @@ from django.views.generic.edit import (
 from django.views.generic.list import ListView
 from next_url_mixin.mixin import NextUrlMixin
 
+from plans import catalog
 from plans.base.models import (
     AbstractBillingInfo,
     AbstractInvoice,
@@ -35,9 +38,8 @@ from plans.base.models import (
     AbstractUserPlan,
 )
 from plans.forms import BillingInfoForm, CreateOrderForm, FakePaymentsForm
-from plans.importer import import_name
-from plans.mixins import LoginRequired
-from plans.plan_change import get_change_price
+from plans.mixins import KeysetPaginationMixin, LoginRequired
+from plans.plan_change import get_change_price, get_policy
 from plans.signals import order_started
 from plans.utils import get_currency
 from plans.validators import plan_validation
@@ -111,13 +113,10 @@ class PlanTableMixin(object):
 
         # Generate data structure described in method docstring, propagate ``None`` whenever
         # ``PlanQuota`` is not available for given ``Plan`` and ``Quota``
-        return map(
-            lambda quota: (
-                quota,
-                map(lambda plan: plan_quotas_dic[plan].get(quota, None), plan_list),
-            ),
-            quota_list,
-        )
+        return [
+            (quota, [plan_quotas_dic[plan].get(quota, None) for plan in plan_list])
+            for quota in quota_list
+        ]
 
 
 class PlanTableViewBase(PlanTableMixin, ListView):
@@ -161,7 +160,8 @@ class PlanTableViewBase(PlanTableMixin, ListView):
             except (ValueError, AttributeError):
                 pass
 
-        context["plan_table"] = self.get_plan_table(self.object_list)
+        if "plan_table" not in context:
+            context["plan_table"] = self.get_plan_table(self.object_list)
         context["CURRENCY"] = settings.PLANS_CURRENCY
 
         return context
@@ -181,8 +181,47 @@ class UpgradePlanView(LoginRequired, PlanTableViewBase):
 
 
 class PricingView(PlanTableViewBase):
+    """
+    Plan comparison table.
+
+    For anonymous users the plans only depend on the plan catalog and the
+    language, so the plan list and the table are cached per catalog revision
+    and language, and responses carry ``ETag`` and ``Last-Modified`` headers
+    for conditional requests. The page itself is rendered for every request,
+    as templates may use the request.
+    """
+
     template_name = "plans/pricing.html"
 
+    def dispatch(self, request, *args, **kwargs):
+        return condition(
+            etag_func=self.get_etag, last_modified_func=self.get_last_modified
+        )(super().dispatch)(request, *args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return "%s-%s" % (catalog.get_version().etag, get_language())
+
+    def get_last_modified(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return catalog.get_version().last_modified
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        plan_list, plan_table = catalog.get_or_build(
+            "pricing_table_%s" % get_language(), self.build_anonymous_table
+        )
+        self.object_list = plan_list
+        context = self.get_context_data(plan_table=plan_table)
+        return self.render_to_response(context)
+
+    def build_anonymous_table(self):
+        plan_list = list(self.get_queryset())
+        return plan_list, self.get_plan_table(plan_list)
+
 
 class ChangePlanView(LoginRequired, View):
     """
@@ -207,13 +246,7 @@ class ChangePlanView(LoginRequired, View):
             & (Q(customized=request.user) | Q(customized__isnull=True)),
         )
         if request.user.userplan.plan != plan:
-            policy = import_name(
-                getattr(
-                    settings,
-                    "PLANS_CHANGE_POLICY",
-                    "plans.plan_change.StandardPlanChangePolicy",
-                )
-            )()
+            policy = get_policy()
 
             period = request.user.userplan.days_left()
             price = policy.get_change_price(request.user.userplan.plan, plan, period)
@@ -366,6 +399,8 @@ class CreateOrderPlanChangeView(CreateOrderView):
 
 class OrderView(LoginRequired, DetailView):
     model = Order
+    #: Invoice fields used by the template, see ``Order.prefetch_all_invoices()``
+    invoice_fields = ("type", "full_number", "issued", "issued_duplicate")
 
     def get_queryset(self):
         return (
@@ -376,12 +411,15 @@ class OrderView(LoginRequired, DetailView):
                 "plan",
                 "pricing",
             )
+            .prefetch_related(Order.prefetch_all_invoices(self.invoice_fields))
         )
 
 
-class OrderListView(LoginRequired, ListView):
+class OrderListView(LoginRequired, KeysetPaginationMixin, ListView):
     model = Order
     paginate_by = 10
+    # Newest orders first; ``created`` is nullable, so it can't be a cursor
+    keyset_ordering = ("-pk",)
 
     def get_context_data(self, **kwargs):
         context = super(OrderListView, self).get_context_data(**kwargs)